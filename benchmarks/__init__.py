@@ -0,0 +1,4 @@
+"""Benchmarks for the planner hot paths. Run from the repo root, e.g.
+
+    python -m benchmarks.bench_progress
+"""
@@ -0,0 +1,50 @@
+"""state.json JSON vs the compact format: size and encode/decode time.
+
+    python -m benchmarks.bench_codec
+"""
+
+import json
+import time
+import zlib
+
+from benchmarks.treegen import make_tree
+from planner.codec import decode, encode, from_payload, to_payload
+from planner.model import dumps_goals, loads_goals
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def bench(n_nodes):
+    goals = make_tree(n_nodes)
+    text = dumps_goals(goals)
+    blob = encode(goals)
+    assert dumps_goals(decode(blob)) == text
+
+    json_size = len(text.encode("utf-8"))
+    json_zlib_size = len(zlib.compress(text.encode("utf-8")))
+    # what push_state sends: the payload serialized by the HTTP client
+    old_payload = len(json.dumps(to_payload(goals)))
+    new_payload = len(json.dumps(to_payload(goals, compact=True)))
+
+    enc_old = timed(dumps_goals, goals)
+    enc_new = timed(encode, goals)
+    dec_old = timed(loads_goals, text)
+    dec_new = timed(decode, blob)
+    pull_old = timed(from_payload, json.loads(json.dumps(to_payload(goals))))
+
+    print(f"{n_nodes:>7} nodes: file {json_size / 1024:8.0f} KiB -> {len(blob) / 1024:6.0f} KiB "
+          f"(json+zlib {json_zlib_size / 1024:.0f} KiB) | payload {old_payload / 1024:8.0f} -> {new_payload / 1024:6.0f} KiB")
+    print(f"{'':>14}encode {enc_old * 1e3:6.1f} -> {enc_new * 1e3:6.1f} ms | "
+          f"decode {dec_old * 1e3:6.1f} -> {dec_new * 1e3:6.1f} ms (from cloud payload {pull_old * 1e3:.1f} ms)")
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000):
+        bench(n)
@@ -0,0 +1,60 @@
+"""Due-soon / overdue queries: tree walk vs DeadlineIndex.
+
+    python -m benchmarks.bench_deadlines
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.treegen import leaves, make_tree
+from planner.deadlines import DeadlineIndex, soon_end
+from planner.tree import iter_goals
+
+
+def walk_due(goals, start, end):
+    return sorted((g.deadline, g.id) for g, _ in iter_goals(goals)
+                  if g.deadline is not None and start <= g.deadline < end)
+
+
+def timed(fn, *args, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def bench(n_nodes, edits=200):
+    goals = make_tree(n_nodes)
+    now = datetime(2025, 1, 1)
+    end = soon_end(now)
+
+    t = time.perf_counter()
+    index = DeadlineIndex(goals)
+    build = time.perf_counter() - t
+
+    expected = [goal_id for _, goal_id in walk_due(goals, now, end)]
+    assert list(index.between(now, end)) == expected
+
+    walk = timed(walk_due, goals, now, end)
+    query = timed(lambda: list(index.between(now, end)))
+
+    rnd = random.Random(5)
+    picks = rnd.sample(leaves(goals), edits)
+    t = time.perf_counter()
+    for leaf in picks:
+        leaf.deadline = now + timedelta(hours=rnd.randrange(-500, 500))
+        index.update(leaf)
+    update = (time.perf_counter() - t) / edits
+    assert list(index.between(now, end)) == [goal_id for _, goal_id in walk_due(goals, now, end)]
+
+    print(f"{n_nodes:>7} nodes, {len(index)} deadlines, {len(expected)} due soon: "
+          f"walk {walk * 1e3:7.2f} ms, index {query * 1e3:6.3f} ms | "
+          f"build {build * 1e3:6.1f} ms, update {update * 1e6:5.1f} us")
+
+
+if __name__ == "__main__":
+    for n in (1_000, 10_000, 100_000):
+        bench(n)
@@ -0,0 +1,63 @@
+"""Ancestor walk: old find_parent scan vs GoalIndex.
+
+    python -m benchmarks.bench_index
+"""
+
+import random
+import time
+
+from benchmarks.treegen import as_dicts, dict_leaves, leaves, make_tree
+from planner.index import GoalIndex
+
+
+def legacy_find_parent(goals, target, nodes=None):
+    if nodes is None:
+        nodes = goals
+    for g in nodes:
+        subs = g.get("subgoals", [])
+        if target in subs:
+            return g
+        parent = legacy_find_parent(goals, target, subs)
+        if parent:
+            return parent
+    return None
+
+
+def legacy_ancestors(goals, goal):
+    out = []
+    parent = legacy_find_parent(goals, goal)
+    while parent:
+        out.append(parent)
+        parent = legacy_find_parent(goals, parent)
+    return out
+
+
+def bench(n_nodes, walks):
+    goals = make_tree(n_nodes)
+    picks = random.Random(2).choices(leaves(goals), k=walks)
+
+    t = time.perf_counter()
+    index = GoalIndex(goals)
+    build = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for leaf in picks:
+        list(index.ancestors(leaf))
+    new = (time.perf_counter() - t) / walks
+
+    legacy_goals = as_dicts(goals)
+    legacy_leaves = {d["id"]: d for d in dict_leaves(legacy_goals)}
+    legacy_picks = picks[:5]
+    t = time.perf_counter()
+    for leaf in legacy_picks:
+        expected = legacy_ancestors(legacy_goals, legacy_leaves[leaf.id])
+        assert [g["id"] for g in expected] == [g.id for g in index.ancestors(leaf)]
+    old = (time.perf_counter() - t) / len(legacy_picks)
+
+    print(f"{n_nodes:>7} nodes: index build {build * 1e3:7.1f} ms | "
+          f"ancestor walk legacy {old * 1e3:9.2f} ms | index {new * 1e6:6.2f} us")
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000):
+        bench(n, 10_000)
@@ -0,0 +1,115 @@
+"""Goal model vs the old dict tree: save, load and memory per node.
+
+    python -m benchmarks.bench_model
+"""
+
+import gc
+import io
+import json
+import time
+import tracemalloc
+from datetime import datetime
+
+from benchmarks.treegen import as_dicts, make_tree
+from planner.model import dumps_goals, loads_goals
+
+
+class _Control:
+    """Stand-in for ft.Control (flet is not needed to run the benchmarks)."""
+
+
+def legacy_to_serializable(o):
+    if isinstance(o, dict):
+        out = {}
+        for k, v in o.items():
+            try:
+                if isinstance(v, _Control) or callable(v):
+                    continue
+            except Exception:
+                pass
+            out[k] = legacy_to_serializable(v)
+        return out
+    if isinstance(o, list):
+        return [legacy_to_serializable(x) for x in o]
+    if isinstance(o, datetime):
+        return o.isoformat()
+    if isinstance(o, (str, int, float, bool)) or o is None:
+        return o
+    return str(o)
+
+
+def legacy_from_serializable(o):
+    if isinstance(o, dict):
+        out = {}
+        for k, v in o.items():
+            if isinstance(v, str) and k in ("deadline", "last_modified"):
+                try:
+                    out[k] = datetime.fromisoformat(v)
+                    continue
+                except Exception:
+                    pass
+            out[k] = legacy_from_serializable(v)
+        return out
+    if isinstance(o, list):
+        return [legacy_from_serializable(x) for x in o]
+    return o
+
+
+def legacy_save(goals):
+    f = io.StringIO()
+    json.dump(legacy_to_serializable(goals), f, ensure_ascii=False, indent=2)
+    return f.getvalue()
+
+
+def legacy_load(text):
+    return legacy_from_serializable(json.loads(text))
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def tree_bytes(build, *args):
+    gc.collect()
+    tracemalloc.start()
+    tree = build(*args)
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del tree
+    return size
+
+
+def _drop_manual_false(d):
+    if d.get("manual_weights") is False:
+        del d["manual_weights"]
+    return d
+
+
+def bench(n_nodes):
+    goals = make_tree(n_nodes)
+    legacy_goals = as_dicts(goals)
+    text = legacy_save(legacy_goals)
+    # same content; the new dumper just leaves out `manual_weights: false`
+    legacy_data = json.loads(text, object_hook=_drop_manual_false)
+    assert legacy_data == json.loads(dumps_goals(loads_goals(text)))
+
+    save_old = timed(legacy_save, legacy_goals)
+    save_new = timed(dumps_goals, goals)
+    load_old = timed(legacy_load, text)
+    load_new = timed(loads_goals, text)
+    mem_old = tree_bytes(legacy_load, text) / n_nodes
+    mem_new = tree_bytes(loads_goals, text) / n_nodes
+
+    print(f"{n_nodes:>7} nodes: save {save_old * 1e3:7.1f} -> {save_new * 1e3:6.1f} ms | "
+          f"load {load_old * 1e3:7.1f} -> {load_new * 1e3:6.1f} ms | "
+          f"memory/node {mem_old:5.0f} -> {mem_new:4.0f} B")
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000):
+        bench(n)
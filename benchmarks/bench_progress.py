@@ -0,0 +1,80 @@
+"""Toggle latency: old recursive calculate_progress vs ProgressEngine.
+
+    python -m benchmarks.bench_progress
+"""
+
+import random
+import sys
+import time
+
+from benchmarks.treegen import as_dicts, dict_leaves, leaves, make_tree
+from planner.index import GoalIndex
+from planner.progress import ProgressEngine
+
+
+def legacy_calculate_progress(goal):
+    subgoals = goal.get("subgoals", [])
+    if subgoals:
+        total = 0.0
+        for s in subgoals:
+            w = max(0.01, s.get("weight", 1.0))
+            total += legacy_calculate_progress(s) * w
+        return min(total, 1.0)
+    return 1.0 if goal.get("completed", False) else 0.0
+
+
+def legacy_toggle(goals, leaf):
+    # what one checkbox click cost: recalc_all_progress + update_progress
+    leaf["completed"] = not leaf["completed"]
+
+    def update_goal(goal):
+        legacy_calculate_progress(goal)
+        for s in goal.get("subgoals", []):
+            update_goal(s)
+
+    for g in goals:
+        update_goal(g)
+    sum(1 for g in goals if legacy_calculate_progress(g) >= 0.999)
+
+
+def engine_toggle(engine, goals, leaf):
+    leaf.completed = not leaf.completed
+    engine.changed(leaf)
+    sum(1 for g in goals if engine.progress(g) >= 0.999)
+
+
+def bench(n_nodes, toggles):
+    goals = make_tree(n_nodes)
+    picks = random.Random(1).choices(leaves(goals), k=toggles)
+
+    t = time.perf_counter()
+    engine = ProgressEngine(GoalIndex(goals), goals)
+    build = time.perf_counter() - t
+
+    t = time.perf_counter()
+    for leaf in picks:
+        engine_toggle(engine, goals, leaf)
+    new = (time.perf_counter() - t) / toggles
+
+    # both must agree after the same toggles
+    legacy_goals = as_dicts(goals)
+    fresh = ProgressEngine(GoalIndex(goals), goals)
+    for g, d in zip(goals, legacy_goals):
+        assert abs(engine.progress(g) - legacy_calculate_progress(d)) < 1e-9
+        assert abs(fresh.progress(g) - engine.progress(g)) < 1e-9
+
+    legacy_picks = dict_leaves(legacy_goals)[: max(1, toggles // 100)]
+    t = time.perf_counter()
+    for leaf in legacy_picks:
+        legacy_toggle(legacy_goals, leaf)
+    old = (time.perf_counter() - t) / len(legacy_picks)
+
+    print(f"{n_nodes:>7} nodes: rebuild {build * 1e3:8.1f} ms | "
+          f"toggle legacy {old * 1e3:9.2f} ms | engine {new * 1e6:7.1f} us | "
+          f"x{old / new:,.0f}")
+
+
+if __name__ == "__main__":
+    sys.setrecursionlimit(10000)
+    for n in (10_000, 100_000):
+        bench(n, 1000)
@@ -0,0 +1,81 @@
+"""Goal name search: linear scan vs SearchIndex.
+
+    python -m benchmarks.bench_search
+"""
+
+import random
+import time
+
+from benchmarks.treegen import make_tree
+from planner.search import SearchIndex, words
+from planner.tree import iter_goals
+
+_SYLLABLES = ["ра", "бо", "та", "ку", "пи", "ть", "ре", "мо", "нт", "сп", "ор", "ён", "ки", "ни",
+              "га", "ле", "зу", "да", "чи", "ва", "лю", "ша", "ме", "ст", "ов", "ан", "гл"]
+
+
+def vocabulary(rnd, size=5000):
+    out = set()
+    while len(out) < size:
+        out.add("".join(rnd.choice(_SYLLABLES) for _ in range(rnd.randint(2, 4))))
+    return sorted(out)
+
+
+def rename(goals, rnd):
+    vocab = vocabulary(rnd)
+    for goal, _ in iter_goals(goals):
+        name = " ".join(rnd.choice(vocab) for _ in range(rnd.randint(1, 4)))
+        goal.name = name[0].upper() + name[1:]
+    return vocab
+
+
+def scan(goals, query):
+    """What the index must return, the slow way."""
+    wanted = words(query)
+    found = set()
+    for goal, _ in iter_goals(goals):
+        name_words = words(goal.name)
+        if all(any(w.startswith(p) for w in name_words) for p in wanted):
+            found.add(goal.id)
+    return found
+
+
+def bench(n_nodes, queries):
+    rnd = random.Random(7)
+    goals = make_tree(n_nodes)
+    vocab = rename(goals, rnd)
+    index = SearchIndex()
+    t = time.perf_counter()
+    index.rebuild((g.id, g.name) for g, _ in iter_goals(goals))
+    build = time.perf_counter() - t
+
+    samples = [rnd.choice(vocab)[:k] for k in (2, 3, 5) for _ in range(queries)]
+    samples += [rnd.choice(vocab)[:3].upper() + " " + rnd.choice(vocab)[:2] for _ in range(queries)]
+    for q in samples[::max(1, len(samples) // 8)]:
+        assert set(index.query(q, limit=n_nodes)) == scan(goals, q), q
+
+    t = time.perf_counter()
+    for q in samples:
+        index.query(q, limit=50)
+    per_query = (time.perf_counter() - t) / len(samples)
+    t = time.perf_counter()
+    scan(goals, samples[0])
+    per_scan = time.perf_counter() - t
+
+    # incremental updates: renames
+    picks = rnd.sample([g for g, _ in iter_goals(goals)], 1000)
+    t = time.perf_counter()
+    for g in picks:
+        g.name = rnd.choice(vocab)
+        index.update(g)
+    per_update = (time.perf_counter() - t) / len(picks)
+    q = picks[0].name[:3]
+    assert set(index.query(q, limit=n_nodes)) == scan(goals, q)
+
+    print(f"{n_nodes:>7} nodes: build {build * 1e3:6.0f} ms | query (50 results) {per_query * 1e3:6.3f} ms, "
+          f"scan {per_scan * 1e3:7.1f} ms | rename {per_update * 1e6:5.1f} us")
+
+
+if __name__ == "__main__":
+    for n in (10_000, 100_000):
+        bench(n, 50)
@@ -0,0 +1,72 @@
+"""Cold start: how long until the first screen can be drawn.
+
+    python -m benchmarks.bench_startup
+
+Every run is a fresh interpreter (so imports are cold) that opens a
+state.json of the given size the way main.py does and prints the phases:
+
+    import       planner.core and what it pulls in
+    load         get_planner: read state.json, index, progress
+    first_level  the data of the first screen (progress of the shown cards)
+    sync_client  Planner.connect: the supabase import and create_client
+
+The old startup ran all of them before the first paint; now the shell is
+drawn before `load` and the sync client is created after `first_level`.
+Without supabase installed (or SUPABASE_URL unset) `sync_client` is
+only the failed import.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from benchmarks.treegen import make_tree
+from planner.codec import dumps_state
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import json, sys, time
+from planner.metrics import Phases
+phases = Phases("startup")
+from planner.core import get_planner
+phases.mark("import")
+planner = get_planner(sys.argv[1])
+phases.mark("load")
+[planner.progress(g) for g in planner.goals[:50]]
+phases.mark("first_level")
+planner.connect()
+phases.mark("sync_client")
+planner.store.writer.close()
+print(json.dumps(dict(phases.steps)))
+"""
+
+
+def run_once(state_file):
+    out = subprocess.run([sys.executable, "-c", CHILD, state_file], capture_output=True, text=True,
+                         cwd=ROOT, check=True)
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+def bench(n_goals, workdir, runs=3):
+    path = os.path.join(workdir, f"state_{n_goals}.json")
+    with open(path, "wb") as f:
+        f.write(dumps_state(make_tree(n_goals)))
+    best = None
+    for _ in range(runs):
+        steps = run_once(path)
+        if best is None or sum(steps.values()) < sum(best.values()):
+            best = steps
+    old = sum(best.values())
+    cards = best["import"] + best["load"] + best["first_level"]
+    print(f"{n_goals:>7} goals: " + ", ".join(f"{k} {v * 1e3:6.1f} ms" for k, v in best.items())
+          + f" | first paint: old {old * 1e3:6.1f} ms, now shell {best['import'] * 1e3:5.1f} ms"
+          f", cards at {cards * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        for n in (1_000, 50_000, 200_000):
+            bench(n, d)
@@ -0,0 +1,74 @@
+"""state.json snapshot vs SQLite: startup (whole tree or, with LAZY_LOAD,
+the top level only), cost of saving one edit, opening one level.
+
+    python -m benchmarks.bench_storage
+"""
+
+import os
+import random
+import tempfile
+import time
+from datetime import datetime
+
+from benchmarks.treegen import leaves, make_tree
+from planner.codec import dumps_state, loads_state
+from planner.sqlite_store import SqliteStorage
+
+
+def timed(fn, *args, repeat=3):
+    best = float("inf")
+    for _ in range(repeat):
+        t = time.perf_counter()
+        fn(*args)
+        best = min(best, time.perf_counter() - t)
+    return best
+
+
+def save_snapshot(path, goals):
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(dumps_state(goals))
+    os.replace(tmp, path)
+
+
+def load_snapshot(path):
+    with open(path, "rb") as f:
+        return loads_state(f.read())
+
+
+def bench(n_nodes, edits, workdir):
+    goals = make_tree(n_nodes)
+    picks = random.Random(4).sample(leaves(goals), edits)
+    json_path = os.path.join(workdir, f"state_{n_nodes}.json")
+    save_snapshot(json_path, goals)
+    db = SqliteStorage(os.path.join(workdir, f"goals_{n_nodes}.db"))
+
+    t = time.perf_counter()
+    db.migrate_from(goals, json_path)
+    migrate = time.perf_counter() - t
+
+    start_json = timed(load_snapshot, json_path)
+    start_db = timed(db.load_all)
+    start_lazy = timed(db.load_level, None)
+    level_db = timed(db.load_level, goals[0].id)
+
+    # snapshot mode rewrites the whole file for an edit
+    save_json = timed(save_snapshot, json_path, goals)
+    t = time.perf_counter()
+    for leaf in picks:
+        db.apply({"op": "update", "id": leaf.id,
+                  "fields": {"completed": True, "last_modified": datetime.now()}})
+        db.apply({"op": "touch", "id": leaf.id, "at": datetime.now().isoformat()})
+    save_db = (time.perf_counter() - t) / edits
+    db.close()
+
+    print(f"{n_nodes:>7} nodes: startup json {start_json * 1e3:7.1f} ms, sqlite full {start_db * 1e3:7.1f} ms, "
+          f"lazy {start_lazy * 1e3:5.2f} ms ({len(goals)} goals), "
+          f"open one level {level_db * 1e3:5.2f} ms | save one edit json {save_json * 1e3:7.1f} ms, "
+          f"sqlite {save_db * 1e3:5.2f} ms | migration {migrate * 1e3:.0f} ms")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        for n in (10_000, 100_000):
+            bench(n, 100, d)
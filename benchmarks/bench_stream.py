@@ -0,0 +1,85 @@
+"""Loading state.json: the whole file at once vs one top-level goal at a time.
+
+    python -m benchmarks.bench_stream
+
+For every tree the file is loaded both ways (loads_state on the file's
+bytes, as SharedStore did, and codec.read_state) and compared: same
+goals, total time, time until the first top-level goal is available and
+the tracemalloc peak next to the size of the finished tree. The stream
+row runs the preview main.py shows while loading: subtree_progress of
+each of the first CARD_WINDOW goals, as on_goal_read does. Two shapes:
+many top-level goals, and everything under one goal (the streaming
+loader then holds that goal's text as a whole).
+"""
+
+import gc
+import os
+import tempfile
+import time
+import tracemalloc
+
+from benchmarks.treegen import make_tree
+from planner.codec import dumps_state, loads_state, read_state
+from planner.model import Goal, dumps_goals
+from planner.progress import subtree_progress
+
+CARD_WINDOW = 50
+
+
+def old_load(path):
+    with open(path, "rb") as f:
+        return loads_state(f.read())
+
+
+def new_load(path):
+    # SharedStore._load_file with main.py's on_goal_read
+    goals = []
+    for goal in read_state(path):
+        goals.append(goal)
+        if len(goals) <= CARD_WINDOW:
+            subtree_progress(goal)
+    return goals
+
+
+def first_goal(path):
+    t = time.perf_counter()
+    next(iter(read_state(path)))
+    return time.perf_counter() - t
+
+
+def memory(load, path):
+    gc.collect()
+    tracemalloc.start()
+    goals = load(path)
+    tree, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del goals
+    return tree, peak
+
+
+def bench(label, goals, workdir):
+    path = os.path.join(workdir, "state.json")
+    with open(path, "wb") as f:
+        f.write(dumps_state(goals))
+    size = os.path.getsize(path)
+    del goals
+    assert dumps_goals(old_load(path)) == dumps_goals(new_load(path))
+    row = [f"{label:<22} file {size / 2**20:6.1f} MiB"]
+    for name, load in (("whole", old_load), ("stream", new_load)):
+        t = time.perf_counter()
+        load(path)
+        total = time.perf_counter() - t
+        tree, peak = memory(load, path)
+        row.append(f"{name}: {total * 1e3:6.0f} ms, peak {peak / 2**20:6.1f} MiB "
+                   f"({peak / tree:4.2f}x tree {tree / 2**20:5.1f} MiB)")
+    row.append(f"first goal after {first_goal(path) * 1e3:6.1f} ms")
+    print(" | ".join(row))
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        for n in (50_000, 200_000):
+            # n / 50 top-level goals of about 50 goals each
+            wide = [g for i in range(n // 500) for g in make_tree(500, breadth=10, seed=i)]
+            bench(f"{n} goals, wide", wide, d)
+            bench(f"{n} goals, one root", [Goal("root", subgoals=make_tree(n - 1))], d)
@@ -0,0 +1,55 @@
+"""Full-state sync vs delta sync: bytes and time for a handful of edits.
+
+    python -m benchmarks.bench_sync
+"""
+
+import random
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.treegen import leaves, make_tree
+from planner.index import GoalIndex
+from planner.sync import DeltaSync, LocalBackend, SyncClient
+
+
+def edit(index, leaf, at):
+    leaf.completed = not leaf.completed
+    leaf.last_modified = at
+    for parent in index.ancestors(leaf):
+        parent.last_modified = at
+
+
+def bench(n_nodes, edits, meta_path):
+    goals = make_tree(n_nodes)
+    index = GoalIndex(goals)
+    picks = random.Random(3).sample(leaves(goals), edits)
+
+    full = SyncClient(LocalBackend())
+    delta = DeltaSync(SyncClient(LocalBackend()), meta_path)
+    delta.run(goals, index)  # first round uploads everything
+    delta.run(goals, index)  # ... and the second pulls our own upload back once
+
+    at = datetime.now() + timedelta(seconds=1)
+    for leaf in picks:
+        edit(index, leaf, at)
+
+    t = time.perf_counter()
+    full.push_state(goals)
+    full_time = time.perf_counter() - t
+
+    sent = delta.client.bytes_sent
+    t = time.perf_counter()
+    _, stats = delta.run(goals, index)
+    delta_time = time.perf_counter() - t
+    delta_bytes = delta.client.bytes_sent - sent
+
+    print(f"{n_nodes:>7} nodes, {edits} edits: full {full.bytes_sent / 1024:8.0f} KiB {full_time * 1e3:7.1f} ms | "
+          f"delta {delta_bytes / 1024:6.1f} KiB ({stats['pushed']} rows) {delta_time * 1e3:6.1f} ms")
+
+
+if __name__ == "__main__":
+    import os
+    import tempfile
+    with tempfile.TemporaryDirectory() as d:
+        for n in (10_000, 100_000):
+            bench(n, 10, os.path.join(d, f"meta_{n}.json"))
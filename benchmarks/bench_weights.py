@@ -0,0 +1,46 @@
+"""Sibling weights: the old eager rewrites vs implicit shares and running sums.
+
+    python -m benchmarks.bench_weights
+
+Adding thousands of subgoals to one goal is timed both ways: the old
+main.py rules (every add rewrites or re-sums the siblings, progress is
+summed again) and the Planner main.py runs. That both agree on weights
+and progress is checked by tests/test_weights.py.
+"""
+
+import tempfile
+import time
+
+from benchmarks.legacy_weights import legacy_add, legacy_progress, new_planner
+
+
+# --- timing -------------------------------------------------------------------
+
+def bench(n_children, workdir):
+    # old: every add re-sums (manual) or rewrites (auto) the siblings, and
+    # the parent's progress is summed over all of them again
+    for label, weight in (("auto", None), ("manual", 0.0)):
+        parent = {"completed": False, "weight": None, "manual_weights": weight is not None, "subgoals": []}
+        t = time.perf_counter()
+        for _ in range(n_children):
+            legacy_add(parent, weight)
+            legacy_progress(parent)
+        old = time.perf_counter() - t
+
+        model = new_planner(workdir)
+        root = model.add_goal("root")
+        root.manual_weights = weight is not None
+        t = time.perf_counter()
+        for _ in range(n_children):
+            model.add_subgoal(root, "x", weight=weight)
+            model.progress(root)
+        new = time.perf_counter() - t
+        model.store.writer.close()
+        print(f"{n_children:>6} subgoals ({label:>6}): legacy {old * 1e3:8.1f} ms | "
+              f"running sums {new * 1e3:6.1f} ms | per add {new / n_children * 1e6:5.1f} us")
+
+
+if __name__ == "__main__":
+    with tempfile.TemporaryDirectory() as d:
+        for n in (1_000, 5_000):
+            bench(n, d)
@@ -0,0 +1,82 @@
+"""The sibling weight rules main.py had before planner/core.py, on plain dicts.
+
+Shared by benchmarks/bench_weights.py (timing) and tests/test_weights.py
+(the Planner must agree with them). One rule differs on purpose: after a
+delete under an auto-weighted parent the old code kept the stale 1/n
+shares of the remaining siblings, `legacy_delete` gives them equal shares
+again, as the Planner does.
+"""
+
+import itertools
+import os
+
+from planner.core import Planner
+from planner.store import SharedStore
+
+
+# --- old rules, as main.py had them -----------------------------------------
+
+def legacy_progress(goal):
+    subs = goal["subgoals"]
+    if subs:
+        total = 0.0
+        for s in subs:
+            w = s["weight"] if s["weight"] is not None else 1.0
+            total += legacy_progress(s) * max(0.01, w)
+        return min(total, 1.0)
+    return 1.0 if goal["completed"] else 0.0
+
+
+def legacy_normalize(parent):
+    if parent["manual_weights"] or not parent["subgoals"]:
+        return
+    equal = 1.0 / len(parent["subgoals"])
+    for s in parent["subgoals"]:
+        s["weight"] = equal
+
+
+def legacy_adjust(parent, goal, w):
+    total_other = 0.0
+    for s in parent["subgoals"]:
+        if s is not goal:
+            total_other += float(s["weight"] or 0.0)
+    goal["weight"] = min(max(0.0, float(w)), max(0.0, 1.0 - total_other))
+    parent["manual_weights"] = True
+
+
+def legacy_add(parent, weight=None):
+    new = {"completed": False, "weight": 0.0, "manual_weights": False, "subgoals": []}
+    subs = parent["subgoals"]
+    if weight is not None:
+        subs.append(new)
+        legacy_adjust(parent, new, weight)
+    else:
+        if parent["manual_weights"]:
+            new["weight"] = max(0.0, 1.0 - sum(float(s["weight"] or 0.0) for s in subs))
+        subs.append(new)
+        legacy_normalize(parent)
+    return new
+
+
+def legacy_delete(parent, goal):
+    # by identity: equal dicts compare equal
+    parent["subgoals"] = [s for s in parent["subgoals"] if s is not goal]
+    # the one intended change: the remaining auto-weighted siblings share equally
+    legacy_normalize(parent)
+
+
+def iter_dicts(d):
+    yield d
+    for s in d["subgoals"]:
+        yield from iter_dicts(s)
+
+
+# --- the Planner main.py uses -------------------------------------------------
+
+_stores = itertools.count()
+
+
+def new_planner(workdir):
+    # snapshot mode, saved once by writer.close() at the end
+    store = SharedStore(os.path.join(workdir, f"state_{next(_stores)}.json"), save_delay=3600)
+    return Planner(store, workdir)
@@ -0,0 +1,336 @@
+"""The hot paths of the app on one synthetic tree, with machine-readable results.
+
+    python -m benchmarks.suite [--breadth 10] [--depth 4] [--deadlines 0.2]
+                               [--seed 0] [--out bench_results.json] [--compare OLD.json]
+
+Every case is timed `--repeat` times (min and median are kept) and run
+once more under tracemalloc for its peak memory. The results go to
+`--out` as JSON together with the commit and the tree parameters, so two
+runs on different commits can be put side by side with `--compare`.
+
+The cases, by the main.py function they stand for:
+
+    progress_rebuild   calculate_progress over the whole tree (ProgressEngine)
+    toggle             a checkbox click: progress of the ancestors + recalc_all_progress
+    ancestors          find_parent / update_parents_modified
+    to_serializable    the tree as plain JSON data, and goals_from_data back
+    set_completed      toggle_completed through the Planner (planner/core.py)
+    save_state         SharedStore.save / load, snapshot and SQLite
+    merge              the merge step of do_sync
+    render_view        one page of cards: progress, weights, deadline colors
+                       (and the Flet controls when flet is installed)
+    due / search       the "Сроки" view and the search field
+"""
+
+import argparse
+import gc
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+from benchmarks.treegen import leaves, shaped_tree
+from planner.deadlines import DeadlineIndex, soon_end, urgency
+from planner.index import GoalIndex
+from planner.merge import merge_trees
+from planner.core import Planner
+from planner.model import goals_from_data, to_serializable
+from planner.progress import ProgressEngine
+from planner.search import SearchIndex
+from planner.store import SharedStore
+from planner.tree import iter_goals
+from planner.weights import effective_weight
+
+try:
+    import flet as ft
+except ImportError:
+    ft = None
+
+# the tree's "now" (see shaped_tree) and the app's page size
+NOW = datetime(2025, 1, 1)
+CARD_WINDOW = 50
+
+
+class Case:
+    """One timed function; `setup` runs before every call and is not timed.
+    `ops` is how many operations one call does (times are per operation)."""
+
+    def __init__(self, name, run, setup=None, ops=1):
+        self.name = name
+        self.run = run
+        self.setup = setup
+        self.ops = ops
+
+    def once(self):
+        arg = self.setup() if self.setup is not None else None
+        t = time.perf_counter()
+        self.run(arg)
+        return time.perf_counter() - t
+
+    def measure(self, repeat):
+        times = []
+        for _ in range(repeat):
+            times.append(self.once() / self.ops)
+            gc.collect()
+        arg = self.setup() if self.setup is not None else None
+        gc.collect()
+        tracemalloc.start()
+        self.run(arg)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        return {
+            "min_ms": min(times) * 1e3,
+            "median_ms": statistics.median(times) * 1e3,
+            "runs": repeat,
+            "ops": self.ops,
+            "peak_kib": peak / 1024,
+        }
+
+
+def copy_tree(goals):
+    return goals_from_data(to_serializable(goals))
+
+
+def progress_cases(goals, rnd):
+    index = GoalIndex(goals)
+    engine = ProgressEngine(index, goals)
+    population = leaves(goals)
+    # small trees (--breadth 5 --depth 3) have fewer leaves than that
+    picks = rnd.sample(population, min(200, len(population)))
+    shown = goals[:CARD_WINDOW]
+
+    def toggle(_):
+        for leaf in picks:
+            leaf.completed = not leaf.completed
+            engine.changed(leaf)
+            # the shown cards and the "done" counter of update_progress
+            sum(1 for g in shown if engine.progress(g) >= 0.999)
+
+    def ancestors(_):
+        for leaf in picks:
+            index.parent(leaf)
+            for parent in index.ancestors(leaf):
+                parent.last_modified = NOW
+
+    return [
+        Case("progress_rebuild", lambda _: ProgressEngine(GoalIndex(goals), goals)),
+        Case("toggle", toggle, ops=len(picks)),
+        Case("ancestors", ancestors, ops=len(picks)),
+    ]
+
+
+def serialize_cases(goals):
+    data = to_serializable(goals)
+    return [
+        Case("to_serializable", lambda _: to_serializable(goals)),
+        Case("from_serializable", lambda _: goals_from_data(data)),
+    ]
+
+
+def storage_cases(goals, workdir, rnd, stores):
+    cases = []
+    for mode in ("snapshot", "sqlite"):
+        path = os.path.join(workdir, mode, "state.json")
+        os.makedirs(os.path.dirname(path))
+        store = SharedStore(path, storage_mode=mode, save_delay=3600)
+        stores.append(store)
+        store.goals[:] = copy_tree(goals)
+        store.rebuild()
+        store.save()
+        population = leaves(store.goals)
+        picks = rnd.sample(population, min(20, len(population)))
+        planner = Planner(store, os.path.dirname(path))
+
+        def set_completed(_, planner=planner, picks=picks):
+            for leaf in picks:
+                planner.set_completed(leaf, not leaf.completed)
+
+        def edit_and_save(_, store=store, picks=picks):
+            # what the writer does after a burst of (up to) 20 checkbox clicks
+            for leaf in picks:
+                leaf.completed = not leaf.completed
+                store.progress.changed(leaf)
+                store.record({"op": "update", "id": leaf.id,
+                              "fields": {"completed": leaf.completed, "last_modified": NOW}})
+            store.save()
+
+        cases.append(Case(f"set_completed[{mode}]", set_completed, ops=len(picks)))
+        cases.append(Case(f"save_state[{mode}]", edit_and_save))
+        cases.append(Case(f"load_state[{mode}]", lambda _, store=store: store.load()))
+    return cases
+
+
+def merge_case(goals, rnd):
+    base = to_serializable(goals)
+    n = sum(1 for _ in iter_goals(goals))
+    edits = rnd.sample(range(n), min(200, n))
+    half = len(edits) // 2
+
+    def setup():
+        # both sides edit half of the picks (100 goals each) since the last sync
+        base_goals, local, remote = (goals_from_data(base) for _ in range(3))
+        for side, chosen in ((local, edits[:half]), (remote, edits[half:])):
+            nodes = [g for g, _ in iter_goals(side)]
+            for i in chosen:
+                nodes[i].completed = not nodes[i].completed
+                nodes[i].last_modified = NOW + timedelta(minutes=1)
+        return base_goals, local, remote
+
+    return Case("merge", lambda args: merge_trees(*args), setup=setup)
+
+
+def render_case(goals):
+    index = GoalIndex(goals)
+    engine = ProgressEngine(index, goals)
+    # the busiest level: the subgoals of the first top-level goal
+    level = goals[0].subgoals or goals
+
+    def card(goal):
+        parent = index.parent(goal)
+        progress = engine.progress(goal)
+        weight = effective_weight(goal, parent)
+        color = urgency(goal.deadline, NOW) if goal.deadline else None
+        if ft is None:
+            return progress, weight, color
+        info = [ft.Text(goal.name, size=16)]
+        if weight is not None:
+            info.append(ft.Text(f"Вес: {weight:.2f}", size=12))
+        if goal.deadline:
+            info.append(ft.Text(f"Дедлайн: {goal.deadline.strftime('%d.%m.%Y %H:%M')}", size=12))
+        return ft.Container(
+            padding=16,
+            border_radius=12,
+            content=ft.Column([
+                ft.Row([
+                    ft.Container(ft.GestureDetector(content=ft.Column(info, expand=True)), expand=True),
+                    ft.Checkbox(value=goal.completed),
+                    ft.IconButton(icon=ft.Icons.EDIT),
+                    ft.IconButton(icon=ft.Icons.DELETE),
+                ], spacing=8),
+                ft.ProgressBar(value=progress, height=8),
+                ft.Text(f"Выполнено: {int(progress * 100)}%", size=12),
+            ], spacing=8),
+        )
+
+    def render(_):
+        return [card(g) for g in level[:CARD_WINDOW]]
+
+    return Case("render_view" if ft is not None else "render_view[no flet]", render)
+
+
+def query_cases(goals, rnd):
+    deadlines = DeadlineIndex(goals)
+    search = SearchIndex()
+    search.rebuild((g.id, g.name) for g, _ in iter_goals(goals))
+    queries = [str(rnd.randrange(1000)) for _ in range(50)]
+
+    def due(_):
+        # the "Сроки" view: overdue and soon, up to 50 each
+        overdue = deadlines.between(None, NOW, reverse=True)
+        soon = deadlines.between(NOW, soon_end(NOW))
+        for gen in (overdue, soon):
+            for _ in zip(range(50), gen):
+                pass
+
+    def find(_):
+        for q in queries:
+            search.query(q, limit=50)
+
+    return [Case("due", due), Case("search", find, ops=len(queries))]
+
+
+def git_commit():
+    try:
+        out = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True,
+                             cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        commit = out.stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True,
+                               text=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        return commit + ("-dirty" if dirty.stdout.strip() else "")
+    except Exception:
+        return None
+
+
+def run(args):
+    gc.collect()
+    tracemalloc.start()
+    t = time.perf_counter()
+    goals = shaped_tree(args.breadth, args.depth, args.deadlines, seed=args.seed, now=NOW)
+    build = time.perf_counter() - t
+    _, tree_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    n_goals = sum(1 for _ in iter_goals(goals))
+    rnd = random.Random(args.seed)
+
+    results = {}
+    stores = []
+    with tempfile.TemporaryDirectory() as workdir:
+        cases = (progress_cases(goals, rnd) + serialize_cases(goals) + storage_cases(goals, workdir, rnd, stores)
+                 + [merge_case(goals, rnd), render_case(goals)] + query_cases(goals, rnd))
+        for case in cases:
+            if args.only and not any(case.name.startswith(o) for o in args.only):
+                continue
+            results[case.name] = r = case.measure(args.repeat)
+            per = f"per op ({r['ops']})" if r["ops"] > 1 else ""
+            print(f"{case.name:<24} median {r['median_ms']:10.3f} ms  min {r['min_ms']:10.3f} ms  "
+                  f"peak {r['peak_kib']:9.0f} KiB  {per}")
+        for store in stores:
+            # the last background write has to land before workdir is removed
+            store.writer.close()
+
+    return {
+        "commit": git_commit(),
+        "at": datetime.now().isoformat(timespec="seconds"),
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "tree": {"breadth": args.breadth, "depth": args.depth, "deadline_density": args.deadlines,
+                 "seed": args.seed, "goals": n_goals, "build_ms": build * 1e3, "peak_kib": tree_peak / 1024},
+        "flet": ft is not None,
+        "cases": results,
+    }
+
+
+def compare(old, new):
+    keys = ("breadth", "depth", "deadline_density", "seed")
+    if any(old["tree"].get(k) != new["tree"].get(k) for k in keys):
+        print("DEBUG: the two runs used different trees, ratios are not comparable")
+    print(f"\n{'case':<24} {'old ms':>10} {'new ms':>10} {'ratio':>7}   ({old.get('commit')} -> {new.get('commit')})")
+    for name, r in new["cases"].items():
+        before = old["cases"].get(name)
+        if before is None:
+            print(f"{name:<24} {'-':>10} {r['median_ms']:10.3f}")
+            continue
+        ratio = r["median_ms"] / before["median_ms"] if before["median_ms"] else float("inf")
+        print(f"{name:<24} {before['median_ms']:10.3f} {r['median_ms']:10.3f} {ratio:6.2f}x")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--breadth", type=int, default=10)
+    parser.add_argument("--depth", type=int, default=4)
+    parser.add_argument("--deadlines", type=float, default=0.2, help="share of goals with a deadline")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--only", nargs="*", help="run the cases whose names start with these")
+    parser.add_argument("--out", default="bench_results.json")
+    parser.add_argument("--compare", help="results of an earlier run to compare with")
+    args = parser.parse_args(argv)
+
+    results = run(args)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump(results, f, ensure_ascii=False, indent=2)
+    print(f"{results['tree']['goals']} goals, results in {args.out}")
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(json.load(f), results)
+
+
+if __name__ == "__main__":
+    main()
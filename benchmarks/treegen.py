@@ -0,0 +1,118 @@
+"""Synthetic goal trees shaped like the ones main.py builds."""
+
+import random
+import uuid
+from datetime import datetime, timedelta
+
+from planner.model import Goal
+
+
+def make_tree(n_nodes, breadth=10, seed=0):
+    """Build a list of top-level goals with exactly `n_nodes` goals in total.
+
+    Nodes are filled level by level, each getting up to `breadth` children
+    with equal weights, like an auto-weighted parent in the app.
+    """
+    rnd = random.Random(seed)
+    now = datetime(2025, 1, 1)
+
+    def node(weight=None):
+        return Goal(
+            f"Цель {rnd.randrange(1_000_000)}",
+            id=uuid.UUID(int=rnd.getrandbits(128)).hex,
+            completed=rnd.random() < 0.3,
+            deadline=now + timedelta(days=rnd.randrange(-30, 90)) if rnd.random() < 0.2 else None,
+            weight=weight,
+            last_modified=now,
+        )
+
+    roots = [node() for _ in range(min(breadth, n_nodes))]
+    made = len(roots)
+    queue = list(roots)
+    head = 0
+    while made < n_nodes:
+        parent = queue[head]
+        head += 1
+        k = min(breadth, n_nodes - made)
+        parent.subgoals = [node(1.0 / k) for _ in range(k)]
+        made += k
+        queue.extend(parent.subgoals)
+    return roots
+
+
+def leaves(goals):
+    out = []
+    stack = list(goals)
+    while stack:
+        g = stack.pop()
+        if g.subgoals:
+            stack.extend(g.subgoals)
+        else:
+            out.append(g)
+    return out
+
+
+def dict_leaves(dict_goals):
+    out = []
+    stack = list(dict_goals)
+    while stack:
+        d = stack.pop()
+        if d["subgoals"]:
+            stack.extend(d["subgoals"])
+        else:
+            out.append(d)
+    return out
+
+
+def as_dicts(goals):
+    """The same tree in the old in-memory form: dicts with datetime values."""
+    out = []
+    stack = [(g, out) for g in reversed(goals)]
+    while stack:
+        g, target = stack.pop()
+        d = {
+            "id": g.id,
+            "name": g.name,
+            "completed": g.completed,
+            "deadline": g.deadline,
+            "subgoals": [],
+            "last_modified": g.last_modified,
+        }
+        if g.weight is not None:
+            d["weight"] = g.weight
+        else:
+            d["manual_weights"] = g.manual_weights
+        target.append(d)
+        stack.extend((s, d["subgoals"]) for s in reversed(g.subgoals))
+    return out
+
+
+def shaped_tree(breadth=10, depth=4, deadline_density=0.2, completed=0.3, seed=0, now=datetime(2025, 1, 1)):
+    """A full tree: `breadth` top-level goals, each goal above `depth`
+    levels with `breadth` subgoals (breadth + breadth**2 + ... goals).
+
+    `deadline_density` is the share of goals with a deadline (from 30 days
+    before `now` to 90 days after, so every urgency shows up), `completed`
+    the share of completed goals. The same arguments give the same tree.
+    """
+    rnd = random.Random(seed)
+
+    def node(weight=None):
+        return Goal(
+            f"Цель {rnd.randrange(1_000_000)}",
+            id=uuid.UUID(int=rnd.getrandbits(128)).hex,
+            completed=rnd.random() < completed,
+            deadline=now + timedelta(hours=rnd.randrange(-30 * 24, 90 * 24)) if rnd.random() < deadline_density else None,
+            weight=weight,
+            last_modified=now,
+        )
+
+    roots = [node() for _ in range(breadth)]
+    level = roots
+    for _ in range(depth - 1):
+        below = []
+        for parent in level:
+            parent.subgoals = [node(1.0 / breadth) for _ in range(breadth)]
+            below.extend(parent.subgoals)
+        level = below
+    return roots
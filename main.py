@@ -1,15 +1,22 @@
 import flet as ft
 from datetime import datetime, timedelta
 import asyncio
-import json
+import functools
 import os
-from pathlib import Path
-import uuid
 import time
-import traceback
+from pathlib import Path
+
+from planner.core import get_planner
+from planner.deadlines import SOON_DAYS, DeadlineWatch, soon_end, urgency
+from planner.metrics import Phases, metrics, timed
+from planner.progress import subtree_progress
+from planner.update_scheduler import UpdateScheduler
 
 
 def main(page: ft.Page):
+    # Время фаз запуска (оболочка на экране, загрузка целей, первая
+    # отрисовка, клиент облака): печатается в лог, с METRICS=1 ещё и в метрики.
+    startup = Phases("startup", metrics)
     current_goal = None
     navigation_stack = []
 
@@ -20,7 +27,12 @@ def main(page: ft.Page):
     page.horizontal_alignment = ft.CrossAxisAlignment.CENTER
     page.scroll = ft.ScrollMode.AUTO
 
-    goals = []
+    # Все page.update() идут через планировщик: внутри одного обработчика
+    # (или одного шага event loop) несколько запросов дают одну отправку.
+    update_scheduler = UpdateScheduler(metrics.wrap("page.update", page.update), loop=getattr(page, "loop", None))
+
+    def refresh():
+        update_scheduler.request()
 
     # --- Persistence helpers ------------------------------------------------
     def get_data_dir():
@@ -34,161 +46,248 @@ def main(page: ft.Page):
 
     STATE_FILE = get_data_dir() / "state.json"
 
-    def to_serializable(o):
-        # Convert known simple types and recursively convert dicts/lists.
-        if isinstance(o, dict):
-            out = {}
-            for k, v in o.items():
-                # skip UI controls and callables
-                try:
-                    if isinstance(v, ft.Control) or callable(v):
-                        continue
-                except Exception:
-                    pass
-                out[k] = to_serializable(v)
-            return out
-        if isinstance(o, list):
-            return [to_serializable(x) for x in o]
-        if isinstance(o, datetime):
-            return o.isoformat()
-        if isinstance(o, (str, int, float, bool)) or o is None:
-            return o
-        # fallback: for unsupported types, return string representation
-        return str(o)
-
-    def from_serializable(o):
-        if isinstance(o, dict):
-            out = {}
-            for k, v in o.items():
-                if isinstance(v, str) and k in ("deadline", "last_modified"):
-                    try:
-                        out[k] = datetime.fromisoformat(v)
-                        continue
-                    except Exception:
-                        pass
-                out[k] = from_serializable(v)
-            return out
-        if isinstance(o, list):
-            return [from_serializable(x) for x in o]
-        return o
-
-    def load_state():
-        if not STATE_FILE.exists():
-            return []
-        try:
-            with STATE_FILE.open("r", encoding="utf-8") as f:
-                data = json.load(f)
-            return from_serializable(data)
-        except Exception as ex:
-            print("DEBUG: load_state failed:", ex)
-            traceback.print_exc()
-            return []
-
-    def save_state():
-        try:
-            tmp = STATE_FILE.with_suffix('.tmp')
-            with tmp.open("w", encoding="utf-8") as f:
-                json.dump(to_serializable(goals), f, ensure_ascii=False, indent=2)
-            tmp.replace(STATE_FILE)
-        except Exception as ex:
-            print("DEBUG: save_state failed:", ex)
-            traceback.print_exc()
-
-    # load existing state (if any)
-    _saved = load_state()
-    if _saved:
-        goals = _saved
-
-
-        # --- Cloud sync with Supabase using Environment Variables ---------------
+    # METRICS=1: время обработчиков, сохранения, отрисовки и page.update()
+    # (planner/metrics.py). p50/p95/p99 видны в панели «Метрики» и раз в
+    # METRICS_INTERVAL секунд (по умолчанию 60) дописываются в METRICS_FILE
+    # (по умолчанию metrics.jsonl в папке данных). Без METRICS=1 замеров нет.
+    try:
+        metrics_interval = float(os.environ.get('METRICS_INTERVAL', '60'))
+    except ValueError:
+        metrics_interval = 60.0
+    metrics.start(os.environ.get('METRICS_FILE') or str(get_data_dir() / "metrics.jsonl"), metrics_interval)
+
+    # STORAGE_MODE=journal: мутации дописываются в state.journal, а state.json
+    # переписывается только при компакции (журнал больше JOURNAL_MAX_KB).
+    storage_mode = os.environ.get('STORAGE_MODE', 'snapshot')
+    try:
+        journal_max_kb = int(os.environ.get('JOURNAL_MAX_KB', '1024'))
+    except ValueError:
+        journal_max_kb = 1024
+
+    # STATE_FORMAT=compact: state.json и данные для облака пишутся в сжатом
+    # колоночном формате (planner/codec.py) — в разы меньше обычного JSON.
+    compact_state = os.environ.get('STATE_FORMAT', 'json') == 'compact'
+
+    # Сохранение в фоне: изменения помечают состояние "грязным", а запись
+    # идёт после паузы SAVE_DELAY секунд (по умолчанию 1 с) одним файлом.
+    try:
+        save_delay = float(os.environ.get('SAVE_DELAY', '1.0'))
+    except ValueError:
+        save_delay = 1.0
+
+    # LAZY_LOAD=1 (только с STORAGE_MODE=sqlite): при старте читается лишь
+    # верхний уровень, подцели — при открытии цели. В памяти остаются подцели
+    # не больше LAZY_CACHE открытых целей (по умолчанию 32), кроме показанных.
+    lazy_load = os.environ.get('LAZY_LOAD', '0') == '1'
+    try:
+        lazy_cache = int(os.environ.get('LAZY_CACHE', '32'))
+    except ValueError:
+        lazy_cache = 32
+
+    # --- Cloud sync with Supabase using Environment Variables ---------------
     # Теперь credentials берутся из переменных окружения:
     # SUPABASE_URL, SUPABASE_KEY, USER_ID
     # На Render.com задай их в Dashboard → Environment
     # Локально можно задать в терминале: export SUPABASE_URL="https://..." и т.д.
-    class SyncClient:
-        def __init__(self):
-            self.enabled = False
-            self.client = None
-            self.user_id = os.environ.get('USER_ID', 'default')
-            try:
-                from supabase import create_client
-                url = os.environ.get('SUPABASE_URL')
-                key = os.environ.get('SUPABASE_KEY')
-                if url and key:
-                    self.client = create_client(url, key)
-                    self.enabled = True
-                    print("DEBUG: Supabase подключён через ENV")
-                else:
-                    print("DEBUG: Supabase ENV не заданы")
-            except Exception as ex:
-                print('DEBUG: Supabase не доступен:', ex)
-
-        def push_state(self, user_id=None):
-            if not self.enabled or not self.client:
-                return False
-            uid = user_id or self.user_id
-            try:
-                state = to_serializable(goals)
-                self.client.table('user_states').upsert({
-                    'user_id': uid,
-                    'state': state,
-                    'updated_at': datetime.now().isoformat()
-                }).execute()
-                return True
-            except Exception as ex:
-                print('DEBUG: push_state error:', ex)
-                return False
-
-        def pull_state(self, user_id=None):
-            if not self.enabled or not self.client:
-                return None
-            uid = user_id or self.user_id
-            try:
-                r = self.client.table('user_states').select('state').eq('user_id', uid).execute()
-                if r.data:
-                    return from_serializable(r.data[0]['state'])
-            except Exception as ex:
-                print('DEBUG: pull_state error:', ex)
-            return None
-
-    sync_client = SyncClient()
+    # SYNC_BACKEND=local — "облако" в локальном файле (для проверки без сервера).
+    # SYNC_MODE=delta: по сети ходят только изменённые узлы (таблица goal_nodes),
+    # по умолчанию (full) — всё дерево одной строкой user_states.
+    sync_mode = os.environ.get('SYNC_MODE', 'full')
+
+    # Вся логика — дерево целей, прогресс, веса, сохранение и синхронизация —
+    # в planner/core.py; main() только показывает её. В веб-режиме main()
+    # вызывается для каждой вкладки, а Planner (и хранилище под ним,
+    # planner/store.py) один на процесс: state.json читается один раз, а
+    # остальные вкладки узнают об изменениях и перерисовываются.
+    # Planner создаётся в фоне уже после первой отрисовки (см. load_planner
+    # в конце main), до этого на экране только оболочка с индикатором.
+    planner = None
+    store = None
+    goals = None
+    goal_index = None
+    state_writer = None
+    session_token = None
+
+    def batched(fn):
+        """Обработчик целиком под замком хранилища и с одной отправкой
+        page.update(); если дерево изменилось, другие вкладки получают уведомление"""
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with update_scheduler.batch():
+                with store.lock:
+                    version = store.version
+                    result = fn(*args, **kwargs)
+                    changed = store.version != version
+            if changed:
+                store.broadcast(origin=session_token)
+                rearm_deadline_timer()
+            return result
+        return wrapper
+
+    def flush_state(e=None):
+        if state_writer is None:
+            # закрыли до окончания загрузки: сохранять нечего
+            return
+        state_writer.flush()
+        stats = update_scheduler.stats()
+        print(f"DEBUG: page updates: requested {stats['requested']}, sent {stats['flushed']}, merged {stats['merged']}")
+
+    def close_session(e=None):
+        nonlocal session_closed
+        session_closed = True
+        rearm_deadline_timer()
+        if store is not None:
+            store.unsubscribe(session_token)
+        cancel_sync()
+        flush_state(e)
+
+    page.on_disconnect = flush_state
+    page.on_close = close_session
 
     # UI sync controls
     sync_status = ft.Text('', size=12, color=ft.Colors.GREY_400)
 
-    def do_sync(e):
-        if not sync_client.enabled:
-            sync_status.value = 'Синхронизация не настроена.\nЗадайте на Render.com переменные:\nSUPABASE_URL, SUPABASE_KEY, USER_ID'
-            page.update()
-            return
+    # Сеть ходит в отдельном потоке (asyncio.to_thread), а дерево целей
+    # меняется только в корутине на event loop страницы — интерфейс не ждёт.
+    # store.sync_dirty — есть изменения, которых ещё нет в облаке
+    sync_job = None    # текущая синхронизация: {"cancelled": ..., "future": ...}
 
+    def fix_navigation():
+        """После синхронизации открытая цель могла быть удалена или заменена"""
+        nonlocal current_goal
+        stack = [goal_index.get(g.id) for g in navigation_stack if g is not None]
+        navigation_stack[:] = [g for g in stack if g is not None]
+        if current_goal is not None:
+            current_goal = goal_index.get(current_goal.id)
+
+    def sync_message(out):
+        """Текст для sync_status по итогу Planner.sync_once"""
+        status = out["status"]
+        if status in ("delta", "synced"):
+            return f"Получено: {out['stats']['pulled']}, отправлено: {out['stats']['pushed']}"
+        if status == "conflicts":
+            return f"Синхронизировано, конфликтов: {out['conflicts']} (см. {planner.conflicts_file.name})"
+        if status == "error":
+            return f"Ошибка слияния: {out.get('error', '')}"
+        return {
+            "pull_failed": 'Ошибка синхронизации',
+            "push_failed": 'Ошибка отправки',
+            "download_failed": 'Ошибка загрузки из облака',
+            "pulled": 'Данные загружены из облака',
+            "pushed": 'Данные отправлены в облако',
+            "unchanged": 'Изменений нет',
+        }.get(status, status)
+
+    async def sync_once(job):
+        """Один раунд синхронизации. True — успех, False — ошибка, None — отменена"""
+        out = await planner.sync_once(job)
+        if out["result"] is not None:
+            sync_status.value = sync_message(out)
+        return out["result"]
+
+    async def run_sync(job):
+        nonlocal sync_job
+        version = store.version
+        try:
+            job["result"] = await sync_once(job)
+        except asyncio.CancelledError:
+            job["result"] = None
+        finally:
+            if sync_job is job:
+                sync_job = None
+                store.sync_running = False
+            if job["result"] is None:
+                sync_status.value = 'Синхронизация отменена'
+            sync_btn.text = 'Синхронизировать'
+            sync_btn.icon = ft.Icons.REFRESH
+            with store.lock:
+                fix_navigation()
+                recalc_all_progress(())
+                render_view()
+                store.trim()
+            content_container.opacity = 1.0
+            refresh()
+            if store.version != version:
+                store.broadcast(origin=session_token)
+                rearm_deadline_timer()
+        return job["result"]
+
+    def start_sync():
+        """Запускает синхронизацию в фоне (если она ещё не идёт)"""
+        nonlocal sync_job
+        with store.lock:
+            # одна синхронизация на процесс, из какой бы вкладки её ни запустили
+            if sync_job is not None or store.sync_running:
+                return None
+            store.sync_running = True
+        job = {"cancelled": False, "future": None, "result": None}
+        sync_job = job
         sync_status.value = 'Синхронизация...'
-        page.update()
-
-        remote = sync_client.pull_state()
-        if remote is not None:
+        sync_btn.text = 'Отменить'
+        sync_btn.icon = ft.Icons.CLOSE
+        refresh()
+        return job
+
+    def cancel_sync():
+        job = sync_job
+        if job is None:
+            return
+        job["cancelled"] = True
+        future = job.get("future")
+        if future is not None:
             try:
-                remote_latest = max((g.get('last_modified') for g in remote if g.get('last_modified')), default=None)
-                local_latest = max((g.get('last_modified') for g in goals if g.get('last_modified')), default=None)
-
-                if remote_latest and (not local_latest or remote_latest > local_latest):
-                    goals.clear()
-                    goals.extend(remote)
-                    sync_status.value = 'Данные загружены из облака'
-                else:
-                    ok = sync_client.push_state()
-                    sync_status.value = 'Данные отправлены в облако' if ok else 'Ошибка отправки'
-            except Exception as ex:
-                sync_status.value = f'Ошибка слияния: {ex}'
-        else:
-            ok = sync_client.push_state()
-            sync_status.value = 'Данные отправлены в облако' if ok else 'Ошибка отправки'
+                future.cancel()
+            except Exception:
+                pass
 
-        save_state()
-        recalc_all_progress()
-        render_view()
-        content_container.opacity = 1.0
-        page.update()
+    @timed("do_sync")
+    @batched
+    def do_sync(e):
+        if not planner.connected:
+            # клиент облака ещё создаётся после запуска (см. load_planner)
+            sync_status.value = 'Подключение к облаку...'
+            refresh()
+            return
+        if not planner.sync_client.enabled:
+            sync_status.value = 'Синхронизация не настроена.\nЗадайте на Render.com переменные:\nSUPABASE_URL, SUPABASE_KEY, USER_ID'
+            refresh()
+            return
+        if sync_job is not None:
+            # повторное нажатие во время синхронизации отменяет её
+            cancel_sync()
+            return
+        job = start_sync()
+        if job is None:
+            sync_status.value = 'Синхронизация уже идёт в другой вкладке'
+            refresh()
+            return
+        job["future"] = page.run_task(run_sync, job)
+
+    # AUTO_SYNC_INTERVAL=N: раз в N секунд синхронизироваться в фоне, если есть
+    # несохранённые в облаке изменения. После ошибки пауза удваивается
+    # (до AUTO_SYNC_MAX_INTERVAL, по умолчанию 600 с).
+    try:
+        auto_sync_interval = float(os.environ.get('AUTO_SYNC_INTERVAL', '0'))
+        auto_sync_max = float(os.environ.get('AUTO_SYNC_MAX_INTERVAL', '600'))
+    except ValueError:
+        auto_sync_interval, auto_sync_max = 0.0, 600.0
+    session_closed = False
+
+    async def auto_sync_loop():
+        delay = auto_sync_interval
+        while not session_closed:
+            await asyncio.sleep(delay)
+            if not store.sync_dirty or sync_job is not None:
+                continue
+            job = start_sync()
+            if job is None:
+                continue
+            ok = await run_sync(job)
+            if ok:
+                delay = auto_sync_interval
+            elif ok is False:
+                delay = min(delay * 2, max(auto_sync_max, auto_sync_interval))
+                print(f"DEBUG: auto sync failed, next try in {delay:g} s")
 
     sync_btn = ft.ElevatedButton('Синхронизировать', icon=ft.Icons.REFRESH, on_click=do_sync)
 
@@ -204,8 +303,73 @@ def main(page: ft.Page):
         opacity=1.0,
     )
 
+    # Flet controls of the shown level, keyed by goal id. The goals
+    # themselves hold only data, so they can be dumped without filtering.
+    # Cards are reused by id: mutations insert, remove or patch single cards
+    # in cards_column instead of rebuilding the whole list.
+    card_controls = {}
+    header_controls = {}
+    cards_column = ft.Column(spacing=16)
+    shown_level = None
+
+    # Уровни с тысячами подцелей показываются страницами по CARD_WINDOW
+    # карточек: контролы существуют только для видимого окна.
+    try:
+        CARD_WINDOW = max(1, int(os.environ.get('CARD_WINDOW', '50')))
+    except ValueError:
+        CARD_WINDOW = 50
+    window_start = 0
+
+    @batched
+    def show_window(start):
+        nonlocal window_start
+        window_start = start
+        sync_cards()
+        refresh()
+
+    def make_pager():
+        prev_btn = ft.TextButton("← Предыдущие", on_click=lambda e: show_window(max(0, window_start - CARD_WINDOW)))
+        next_btn = ft.TextButton("Следующие →", on_click=lambda e: show_window(window_start + CARD_WINDOW))
+        label = ft.Text("", size=12, color=ft.Colors.GREY_400)
+        row = ft.Row([prev_btn, label, next_btn], alignment=ft.MainAxisAlignment.CENTER, visible=False)
+        return {"row": row, "prev": prev_btn, "next": next_btn, "label": label}
+
+    pagers = [make_pager(), make_pager()]
+
+    def update_pagers(total):
+        paged = total > CARD_WINDOW
+        for pager in pagers:
+            pager["row"].visible = paged
+            if not paged:
+                continue
+            end = min(window_start + CARD_WINDOW, total)
+            pager["label"].value = f"{window_start + 1}–{end} из {total}"
+            pager["prev"].disabled = window_start == 0
+            pager["next"].disabled = end >= total
+
+    def level_goals():
+        return goals if current_goal is None else current_goal.subgoals
+
+    @timed("render_view")
     def render_view():
+        nonlocal shown_level, window_start
+        # подцели открытой цели подгружаются здесь, если их нет в памяти
+        store.visit(session_token, current_goal, navigation_stack)
         content_column.controls.clear()
+        header_controls.clear()
+        if deadline_view:
+            render_deadlines()
+            return
+        if metrics_view:
+            render_metrics()
+            return
+        level = current_goal.id if current_goal is not None else None
+        if level != shown_level:
+            # another level: none of the cached cards can be reused
+            shown_level = level
+            window_start = 0
+            card_controls.clear()
+            cards_column.controls.clear()
 
         if current_goal is None:
             content_column.controls.extend([
@@ -214,15 +378,19 @@ def main(page: ft.Page):
                 ft.Container(height=16),
                 progress_text,
                 ft.Container(height=8),
-                ft.Row([sync_btn, sync_status], spacing=12),
+                ft.Row([sync_btn, deadlines_btn, *([metrics_btn] if metrics.enabled else []), sync_status], spacing=12),
                 ft.Container(height=8),
                 input_area,
-                ft.Container(height=16),
+                ft.Container(height=8),
+                search_field,
+                ft.Container(height=8),
             ])
-
-            for goal in goals:
-                content_column.controls.append(create_goal_card(goal))
-
+            if search_query:
+                content_column.controls.append(search_results)
+                fill_search_results()
+                return
+            content_column.controls.extend([pagers[0]["row"], cards_column, pagers[1]["row"]])
+            sync_cards()
             return
 
         content_column.controls.append(
@@ -234,7 +402,7 @@ def main(page: ft.Page):
                         tooltip="Назад",
                     ),
                     ft.Text(
-                        current_goal["name"],
+                        current_goal.name,
                         size=24,
                         weight=ft.FontWeight.BOLD,
                         text_align=ft.TextAlign.CENTER,
@@ -247,11 +415,11 @@ def main(page: ft.Page):
         )
 
         progress_val = calculate_progress(current_goal)
-        # header progress bar + percent (store on current_goal for live updates)
+        # header progress bar + percent (kept in header_controls for live updates)
         header_bar = ft.ProgressBar(value=progress_val, height=12, color=ft.Colors.GREEN_400, expand=True)
         header_label = ft.Text(f"{int(progress_val*100)}%", size=12, color=ft.Colors.GREY_400)
-        current_goal["header_progress_bar"] = header_bar
-        current_goal["header_progress_label"] = header_label
+        header_controls["progress_bar"] = header_bar
+        header_controls["progress_label"] = header_label
         content_column.controls.append(
             ft.Row([header_bar, ft.Container(width=12), header_label], vertical_alignment=ft.CrossAxisAlignment.CENTER)
         )
@@ -265,6 +433,7 @@ def main(page: ft.Page):
 
         selected_sub_deadline = None
 
+        @batched
         def handle_subgoal_deadline_change(ev):
             nonlocal selected_sub_deadline
             selected_sub_deadline = ev.control.value
@@ -272,7 +441,7 @@ def main(page: ft.Page):
                 sub_deadline_input.value = selected_sub_deadline.strftime("%d.%m.%Y %H:%M")
             else:
                 sub_deadline_input.value = "Не установлен"
-            page.update()
+            refresh()
 
         deadline_btn = ft.ElevatedButton(
             text="Выбрать дедлайн",
@@ -302,68 +471,179 @@ def main(page: ft.Page):
         content_column.controls.append(
             ft.Row([sub_deadline_input, deadline_btn], spacing=12)
         )
+        content_column.controls.extend([pagers[0]["row"], cards_column, pagers[1]["row"]])
+        sync_cards()
+
+    def sync_cards():
+        """Keyed reconciliation of cards_column with the shown window of the level."""
+        nonlocal window_start
+        level = level_goals()
+        if window_start >= len(level):
+            window_start = max(0, (len(level) - 1) // CARD_WINDOW * CARD_WINDOW)
+        update_pagers(len(level))
+        shown = []
+        seen = set()
+        for goal in level[window_start:window_start + CARD_WINDOW]:
+            refs = card_controls.get(goal.id)
+            if refs is None:
+                refs = create_goal_card(goal)
+            else:
+                refs["goal"] = goal
+                patch_card(goal)
+            shown.append(refs["card"])
+            seen.add(goal.id)
+        for gid in [gid for gid in card_controls if gid not in seen]:
+            del card_controls[gid]
+        # same control objects in the same order -> Flet sends nothing
+        if len(shown) != len(cards_column.controls) or any(a is not b for a, b in zip(shown, cards_column.controls)):
+            cards_column.controls[:] = shown
+
+    def insert_card(goal):
+        """Show a card for a goal that was just added to the shown level."""
+        nonlocal window_start
+        level = level_goals()
+        pos = len(level) - 1 if level and level[-1] is goal else next(
+            (i for i, g in enumerate(level) if g is goal), len(level) - 1)
+        if not window_start <= pos < window_start + CARD_WINDOW:
+            # jump to the page with the new goal
+            window_start = pos - pos % CARD_WINDOW
+            sync_cards()
+            return
+        refs = create_goal_card(goal)
+        cards_column.controls.insert(pos - window_start, refs["card"])
+        if len(cards_column.controls) > CARD_WINDOW:
+            dropped = cards_column.controls.pop()
+            for gid, r in list(card_controls.items()):
+                if r["card"] is dropped:
+                    del card_controls[gid]
+                    break
+        update_pagers(len(level))
+
+    def remove_card(goal):
+        refs = card_controls.pop(goal.id, None)
+        if refs is None:
+            return
+        try:
+            cards_column.controls.remove(refs["card"])
+        except ValueError:
+            pass
+        if len(level_goals()) > window_start + len(cards_column.controls) or not cards_column.controls:
+            # pull the next goal into the window (or step back from an empty page)
+            sync_cards()
+        else:
+            update_pagers(len(level_goals()))
+
+    def shown_weight(goal):
+        # у автоматических весов доля 1/n не хранится в подцелях
+        return planner.weight(goal)
+
+    def card_info_controls(goal):
+        info = [ft.Text(goal.name, size=16)]
+        weight = shown_weight(goal)
+        if weight is not None:
+            info.append(
+                ft.Text(f"Вес: {weight:.2f}", size=12, color=ft.Colors.CYAN_200)
+            )
+        if goal.deadline:
+            info.append(
+                ft.Text(
+                    f"Дедлайн: {goal.deadline.strftime('%d.%m.%Y %H:%M')}",
+                    size=12,
+                    color=deadline_color(goal.deadline, datetime.now())
+                )
+            )
+        return info
+
+    def deadline_color(deadline, now):
+        return {
+            "overdue": ft.Colors.RED_400,
+            "soon": ft.Colors.ORANGE_400,
+        }.get(urgency(deadline, now), ft.Colors.GREEN_400)
 
-        for sub in current_goal.get("subgoals", []):
-            content_column.controls.append(create_goal_card(sub))
+    def card_signature(goal):
+        return (goal.name, shown_weight(goal), goal.deadline, goal.completed)
+
+    def patch_card(goal):
+        """Bring an existing card in line with its goal; untouched cards cost nothing."""
+        refs = card_controls.get(goal.id)
+        if refs is None:
+            return
+        sig = card_signature(goal)
+        if refs["sig"] != sig:
+            refs["sig"] = sig
+            refs["info"].controls = card_info_controls(goal)
+            refs["checkbox"].value = goal.completed
+        progress = calculate_progress(goal)
+        if refs["progress_bar"].value != progress:
+            refs["progress_bar"].value = progress
+            refs["progress_label"].value = f"Выполнено: {int(progress * 100)}%"
 
     def create_goal_card(goal_data):
+        refs = {"goal": goal_data}
+
         def open_goal(e):
             async def transition():
                 nonlocal current_goal
                 content_container.opacity = 0
-                page.update()
+                refresh()
                 await asyncio.sleep(0.25)
 
-                navigation_stack.append(current_goal)
-                current_goal = goal_data
-                render_view()
-                page.update()
+                # дерево общее для всех вкладок: уровень строится под замком
+                with update_scheduler.batch():
+                    with store.lock:
+                        navigation_stack.append(current_goal)
+                        current_goal = refs["goal"]
+                        render_view()
+                    refresh()
 
                 await asyncio.sleep(0.05)
                 content_container.opacity = 1
-                page.update()
+                refresh()
 
             page.run_task(transition)
 
+        @timed("toggle_completed")
+        @batched
         def toggle_completed(e):
-            goal_data["completed"] = e.control.value
-            goal_data["last_modified"] = datetime.now()
-            update_parents_modified(goal_data)  # ← Добавь эту строку
-            recalc_all_progress()
+            goal = refs["goal"]
+            planner.set_completed(goal, e.control.value)
+            refs["sig"] = card_signature(goal)
+            recalc_all_progress([goal])
 
+        @timed("delete_goal")
+        @batched
         def delete_goal(e):
-            if current_goal and current_goal.get("subgoals"):
-                current_goal["subgoals"].remove(goal_data)
-            else:
-                goals.remove(goal_data)
-            render_view()
-            recalc_all_progress()
-            if current_goal and current_goal.get("subgoals"):
-                update_parents_modified(current_goal)  # ← Добавь
-            elif "progress_text" in globals():  # для топ-уровня
-                update_parents_modified(goal_data)  # если удалили топ-цель
+            goal = refs["goal"]
+            parent = planner.delete(goal)
+            remove_card(goal)
+            if parent is not None and not parent.manual_weights:
+                # the remaining siblings share the weight equally again
+                for sibling_refs in list(card_controls.values()):
+                    patch_card(sibling_refs["goal"])
+            recalc_all_progress(())
 
         def open_edit_goal_dialog(goal):
-            print(f"DEBUG: open_edit_goal_dialog called for {goal.get('name')}")
-            name_input = ft.TextField(value=goal["name"], label="Название цели")
+            print(f"DEBUG: open_edit_goal_dialog called for {goal.name}")
+            name_input = ft.TextField(value=goal.name, label="Название цели")
             # weight only for subgoals (not for top-level goals)
             weight_input = None
-            is_top_level = goal in goals
+            is_top_level = goal_index.parent(goal) is None
             if not is_top_level:
                 weight_input = ft.TextField(
-                    value=str(goal.get("weight", 1.0)),
+                    value=str(shown_weight(goal)),
                     label="Вес подцели (0 < w ≤ 1)",
                     keyboard_type=ft.KeyboardType.NUMBER,
                 )
             deadline_input = ft.TextField(
-                value=goal.get("deadline").strftime("%d.%m.%Y %H:%M") if goal.get("deadline") else "Не установлен",
+                value=goal.deadline.strftime("%d.%m.%Y %H:%M") if goal.deadline else "Не установлен",
                 label="Дедлайн (дд.мм.гггг чч:мм)",
                 read_only=True,
                 expand=True
             )
 
-            selected_deadline = goal.get("deadline")
+            selected_deadline = goal.deadline
 
+            @batched
             def handle_deadline_change(e):
                 nonlocal selected_deadline
                 selected_deadline = e.control.value
@@ -371,7 +651,7 @@ def main(page: ft.Page):
                     deadline_input.value = selected_deadline.strftime("%d.%m.%Y %H:%M")
                 else:
                     deadline_input.value = "Не установлен"
-                page.update()
+                refresh()
 
             deadline_btn = ft.ElevatedButton(
                 text="Выбрать дату",
@@ -388,38 +668,35 @@ def main(page: ft.Page):
                 ),
             )
 
+            @timed("save_edit")
+            @batched
             def save_edit(e):
-                print(f"DEBUG: saving edit for {goal.get('name')}")
-                goal["name"] = name_input.value.strip() or goal["name"]
+                print(f"DEBUG: saving edit for {goal.name}")
+                w = None
                 if weight_input is not None:
                     try:
+                        # capped so that the siblings sum to at most 1
                         w = float(weight_input.value)
-                        # adjust and cap to keep siblings sum <= 1
-                        assigned = adjust_weight_on_set(goal, w)
-                        if assigned is None:
-                            # fallback
-                            goal["weight"] = max(0.01, min(1.0, w))
-                        else:
-                            goal["weight"] = assigned
-                    except:
-                        goal["weight"] = goal.get("weight", 1.0)
-                # update deadline
-                goal["deadline"] = selected_deadline
-                # mark modified
-                goal["last_modified"] = datetime.now()
-                update_parents_modified(goal)
-                # normalize weights among siblings if this is a subgoal
-                parent = find_parent(goal)
-                if parent and parent.get("subgoals"):
-                        # if parent uses automatic equal weights, redistribute
-                        normalize_weights_in_parent(parent)
-                render_view()
-                recalc_all_progress()
+                    except ValueError:
+                        # not a number: the weight stays as it was
+                        w = None
+                planner.edit(goal, name_input.value.strip(), selected_deadline, w)
+                if weight_input is not None:
+                    # the parent may have switched to manual weights: the
+                    # sibling labels on screen may have changed
+                    for sibling_refs in list(card_controls.values()):
+                        patch_card(sibling_refs["goal"])
+                patch_card(goal)
+                recalc_all_progress([goal])
+                try:
+                    content_column.controls.remove(inline_panel)
+                except Exception:
+                    pass
                 try:
                     dialog.open = False
                 except Exception:
                     pass
-                page.update()
+                refresh()
 
             dialog = ft.AlertDialog(
                 title=ft.Text("Редактировать цель/подцель"),
@@ -430,7 +707,7 @@ def main(page: ft.Page):
                 ], spacing=12),
                 actions=[
                     ft.ElevatedButton("Принять", on_click=save_edit),
-                    ft.TextButton("Отмена", on_click=lambda e: setattr(dialog, "open", False) or page.update())
+                    ft.TextButton("Отмена", on_click=batched(lambda e: setattr(dialog, "open", False) or refresh()))
                 ],
                 actions_alignment=ft.MainAxisAlignment.END,
             )
@@ -438,7 +715,7 @@ def main(page: ft.Page):
             page.dialog = dialog
             dialog.open = True
             print("DEBUG: edit dialog opened")
-            page.update()
+            refresh()
 
             # Inline fallback for edit dialog (in case AlertDialog actions are not delivered)
             accept_btn = ft.ElevatedButton("Принять")
@@ -449,22 +726,24 @@ def main(page: ft.Page):
                     content_column.controls.remove(inline_panel)
                 except Exception:
                     pass
-                page.update()
+                refresh()
 
+            @batched
             def _inline_accept(ev):
-                print(f"DEBUG: inline edit accept for {goal.get('name')}")
+                print(f"DEBUG: inline edit accept for {goal.name}")
                 _remove_inline()
                 try:
                     save_edit(ev)
                 except Exception as ex:
                     print("DEBUG: error in save_edit from inline:", ex)
 
+            @batched
             def _inline_cancel(ev):
-                print(f"DEBUG: inline edit cancel for {goal.get('name')}")
+                print(f"DEBUG: inline edit cancel for {goal.name}")
                 _remove_inline()
                 try:
                     setattr(dialog, "open", False)
-                    page.update()
+                    refresh()
                 except Exception as ex:
                     print("DEBUG: error closing dialog from inline:", ex)
 
@@ -484,15 +763,16 @@ def main(page: ft.Page):
             )
 
             content_column.controls.append(inline_panel)
-            page.update()
+            refresh()
 
+        @batched
         def on_edit_click(e):
-            open_edit_goal_dialog(goal_data)
+            open_edit_goal_dialog(refs["goal"])
 
         edit_btn = ft.IconButton(
             icon=ft.Icons.EDIT,
             tooltip="Редактировать цель",
-            on_click=lambda e: open_edit_goal_dialog(goal_data),
+            on_click=on_edit_click,
         )
 
         delete_btn = ft.IconButton(
@@ -502,45 +782,21 @@ def main(page: ft.Page):
         )
 
         checkbox = ft.Checkbox(
-            value=goal_data.get("completed", False),
+            value=goal_data.completed,
             on_change=toggle_completed
         )
 
-        left_column_controls = [ft.Text(goal_data["name"], size=16)]
-        if "weight" in goal_data:
-            left_column_controls.append(
-                ft.Text(f"Вес: {goal_data['weight']:.2f}", size=12, color=ft.Colors.CYAN_200)
-            )
-        if goal_data.get("deadline"):
-            now = datetime.now()
-            days_left = (goal_data["deadline"] - now).days
-            if days_left < 0:
-                color = ft.Colors.RED_400
-            elif days_left <= 3:
-                color = ft.Colors.ORANGE_400
-            else:
-                color = ft.Colors.GREEN_400
-
-            left_column_controls.append(
-                ft.Text(
-                    f"Дедлайн: {goal_data['deadline'].strftime('%d.%m.%Y %H:%M')}",
-                    size=12,
-                    color=color
-                )
-            )
-
+        info = ft.Column(card_info_controls(goal_data), expand=True)
         left_column = ft.GestureDetector(
-            content=ft.Column(left_column_controls, expand=True),
+            content=info,
             on_tap=open_goal
         )
 
         progress = calculate_progress(goal_data)
         progress_bar = ft.ProgressBar(value=progress, height=8, color=ft.Colors.GREEN_400)
-        goal_data["progress_bar"] = progress_bar
         progress_label = ft.Text(f"Выполнено: {int(progress*100)}%", size=12, color=ft.Colors.GREY_400)
-        goal_data["progress_label"] = progress_label
 
-        return ft.Container(
+        card = ft.Container(
             padding=16,
             border_radius=12,
             bgcolor=ft.Colors.with_opacity(0.15, ft.Colors.BLUE_GREY_800),
@@ -562,156 +818,322 @@ def main(page: ft.Page):
                 spacing=6,
             )
         )
+        refs.update(
+            card=card,
+            info=info,
+            checkbox=checkbox,
+            progress_bar=progress_bar,
+            progress_label=progress_label,
+            sig=card_signature(goal_data),
+        )
+        card_controls[goal_data.id] = refs
+        return refs
 
     def go_back(e):
         async def transition():
             nonlocal current_goal
             content_container.opacity = 0
-            page.update()
+            refresh()
             await asyncio.sleep(0.25)
 
-            current_goal = navigation_stack.pop()
-            render_view()
-            page.update()
+            with update_scheduler.batch():
+                with store.lock:
+                    current_goal = navigation_stack.pop()
+                    render_view()
+                refresh()
 
             await asyncio.sleep(0.05)
             content_container.opacity = 1
-            page.update()
+            refresh()
 
         page.run_task(transition)
 
-    progress_text = ft.Text("Прогресс: 0 из 0", size=14, color=ft.Colors.GREY_300)
+    # Вид «Сроки»: просроченные и скоро истекающие открытые цели со всего
+    # дерева. Берутся из индекса дедлайнов (planner/deadlines.py), дерево
+    # не обходится; нажатие на цель открывает уровень с её карточкой.
+    deadline_view = False
+    DUE_LIMIT = 50
+
+    def jump_row(goal_id, info):
+        """Строка списка (сроки, поиск): нажатие открывает уровень с целью"""
+        goal = goal_index.get(goal_id)
+        if goal is not None:
+            # путь виден, только если цель в памяти (в ленивом режиме может не быть)
+            where = " › ".join(g.name for g in goal_index.path(goal)[:-1])
+            if where:
+                info.append(ft.Text(where, size=12, color=ft.Colors.GREY_400))
+        return ft.Container(
+            padding=12,
+            border_radius=12,
+            bgcolor=ft.Colors.with_opacity(0.15, ft.Colors.BLUE_GREY_800),
+            content=ft.GestureDetector(
+                content=ft.Column(info, spacing=4),
+                on_tap=lambda e: jump_to_goal(goal_id),
+            ),
+        )
 
-    def update_progress():
-        total = len(goals)
-        completed = sum(1 for g in goals if calculate_progress(g) >= 0.999)
-        progress_text.value = f"Прогресс: {completed} из {total}"
-        page.update()
+    def due_row(goal, now):
+        return jump_row(goal.id, [
+            ft.Text(goal.name, size=16),
+            ft.Text(
+                f"Дедлайн: {goal.deadline.strftime('%d.%m.%Y %H:%M')}",
+                size=12,
+                color=deadline_color(goal.deadline, now),
+            ),
+        ])
 
-    def calculate_progress(goal):
-        subgoals = goal.get("subgoals", [])
+    def render_deadlines():
+        now = datetime.now()
+        overdue = store.due(end=now, limit=DUE_LIMIT, latest_first=True)
+        upcoming = store.due(start=now, end=soon_end(now), limit=DUE_LIMIT)
+        content_column.controls.append(
+            ft.Row(
+                [
+                    ft.IconButton(icon=ft.Icons.ARROW_BACK, on_click=close_deadlines, tooltip="Назад"),
+                    ft.Text("Сроки", size=24, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER, expand=True),
+                    ft.Container(width=40),
+                ],
+                alignment=ft.MainAxisAlignment.CENTER,
+            )
+        )
+        sections = (
+            ("Просрочено", overdue, "Просроченных целей нет"),
+            (f"Скоро (до {SOON_DAYS} дн.)", upcoming, "В ближайшие дни сроков нет"),
+        )
+        for title, items, empty in sections:
+            content_column.controls.append(ft.Text(title, size=18, weight=ft.FontWeight.BOLD))
+            if not items:
+                content_column.controls.append(ft.Text(empty, size=12, color=ft.Colors.GREY_400))
+            content_column.controls.extend(due_row(g, now) for g in items)
+            if len(items) >= DUE_LIMIT:
+                content_column.controls.append(
+                    ft.Text(f"Показаны первые {DUE_LIMIT}", size=12, color=ft.Colors.GREY_400))
+
+    @batched
+    def show_deadlines(e):
+        nonlocal deadline_view
+        deadline_view = True
+        render_view()
+        refresh()
 
-        if subgoals:
-            total = 0.0
-            for s in subgoals:
-                w = max(0.01, s.get("weight", 1.0))
-                total += calculate_progress(s) * w
-            return min(total, 1.0)
+    @batched
+    def close_deadlines(e):
+        nonlocal deadline_view
+        deadline_view = False
+        render_view()
+        refresh()
 
-        return 1.0 if goal.get("completed", False) else 0.0
+    def jump_to_goal(goal_id):
+        """Открывает уровень с целью, восстанавливая navigation_stack по цепочке родителей"""
+        async def transition():
+            nonlocal current_goal, deadline_view, search_query, window_start
+            # путь от верхнего уровня до цели (в ленивом режиме уровни догружаются)
+            path = store.reveal(goal_id)
+            if not path:
+                # цель успели удалить (например, в другой вкладке)
+                with update_scheduler.batch():
+                    with store.lock:
+                        render_view()
+                return
+            content_container.opacity = 0
+            refresh()
+            await asyncio.sleep(0.25)
 
-    def recalc_all_progress():
-        def update_goal(goal):
-            progress = calculate_progress(goal)
+            with store.lock:
+                deadline_view = False
+                search_query = ""
+                search_field.value = ""
+                navigation_stack[:] = [None] + path[:-2] if len(path) > 1 else []
+                current_goal = path[-2] if len(path) > 1 else None
+                render_view()
+                # страница, на которой карточка цели
+                level = level_goals()
+                pos = next((i for i, g in enumerate(level) if g is path[-1]), 0)
+                window_start = pos - pos % CARD_WINDOW
+                sync_cards()
+            refresh()
+
+            await asyncio.sleep(0.05)
+            content_container.opacity = 1
+            refresh()
+
+        page.run_task(transition)
+
+    deadlines_btn = ft.ElevatedButton('Сроки', icon=ft.Icons.ALARM, on_click=show_deadlines)
+
+    # Панель «Метрики» (только с METRICS=1): задержки по обработчикам за
+    # последние вызовы, общие для всех вкладок процесса.
+    metrics_view = False
+
+    def render_metrics():
+        content_column.controls.append(
+            ft.Row(
+                [
+                    ft.IconButton(icon=ft.Icons.ARROW_BACK, on_click=close_metrics, tooltip="Назад"),
+                    ft.Text("Метрики", size=24, weight=ft.FontWeight.BOLD, text_align=ft.TextAlign.CENTER, expand=True),
+                    ft.IconButton(icon=ft.Icons.REFRESH, on_click=show_metrics, tooltip="Обновить"),
+                ],
+                alignment=ft.MainAxisAlignment.CENTER,
+            )
+        )
+        snapshot = metrics.snapshot()
+        if not snapshot:
+            content_column.controls.append(ft.Text("Замеров пока нет", size=12, color=ft.Colors.GREY_400))
+        for name, m in snapshot.items():
+            content_column.controls.append(ft.Column([
+                ft.Text(name, size=16),
+                ft.Text(
+                    f"вызовов {m['count']} · p50 {m['p50_ms']:.1f} мс · p95 {m['p95_ms']:.1f} мс · "
+                    f"p99 {m['p99_ms']:.1f} мс · макс {m['max_ms']:.1f} мс",
+                    size=12, color=ft.Colors.GREY_400,
+                ),
+            ], spacing=2))
+
+    @batched
+    def show_metrics(e):
+        nonlocal metrics_view
+        metrics_view = True
+        render_view()
+        refresh()
 
-            if "progress_bar" in goal:
-                goal["progress_bar"].value = progress
-                goal["progress_bar"].color = ft.Colors.GREEN_400
+    @batched
+    def close_metrics(e):
+        nonlocal metrics_view
+        metrics_view = False
+        render_view()
+        refresh()
+
+    metrics_btn = ft.ElevatedButton('Метрики', icon=ft.Icons.SPEED, on_click=show_metrics)
+
+    # Поиск по названиям всех целей (planner/search.py): слова запроса ищутся
+    # как начала слов названия, без учёта регистра, «ё» = «е». Пока в поле
+    # есть текст, вместо карточек верхнего уровня показываются результаты.
+    search_query = ""
+    SEARCH_LIMIT = 50
+    search_results = ft.Column(spacing=8)
+
+    def fill_search_results():
+        found = store.find(search_query, limit=SEARCH_LIMIT)
+        rows = [jump_row(goal_id, [ft.Text(name, size=16)]) for goal_id, name in found]
+        if not found:
+            rows.append(ft.Text("Ничего не найдено", size=12, color=ft.Colors.GREY_400))
+        elif len(found) >= SEARCH_LIMIT:
+            rows.append(ft.Text(f"Показаны первые {SEARCH_LIMIT}, уточните запрос", size=12, color=ft.Colors.GREY_400))
+        search_results.controls[:] = rows
+
+    @batched
+    def on_search_change(e):
+        nonlocal search_query
+        search_query = (search_field.value or "").strip()
+        render_view()
+        refresh()
+
+    search_field = ft.TextField(
+        hint_text="Поиск по целям...",
+        prefix_icon=ft.Icons.SEARCH,
+        border_radius=12,
+        height=48,
+        on_change=on_search_change,
+    )
+
+    # Уведомления о сроках: один таймер asyncio спит до ближайшей границы
+    # (цель становится «скоро» или «просроченной»), которую находит индекс
+    # дедлайнов. Периодического обхода дерева нет; любая правка дерева
+    # перезаводит таймер, а при срабатывании перекрашиваются только карточки
+    # целей, перешедших границу.
+    deadline_watch = None  # DeadlineWatch, когда хранилище загружено
+    deadline_rearm = asyncio.Event()
+
+    def rearm_deadline_timer():
+        update_scheduler.call_on_loop(deadline_rearm.set)
+
+    def short_list(names, limit=3):
+        text = ", ".join(names[:limit])
+        if len(names) > limit:
+            text += f" и ещё {len(names) - limit}"
+        return text
+
+    def on_deadlines_passed(events):
+        if not events:
+            return
+        overdue_ids = {goal.id for kind, goal in events if kind == "overdue"}
+        names = {"overdue": [], "soon": []}
+        for kind, goal in events:
+            refs = card_controls.get(goal.id)
+            if refs is not None:
+                # цвет дедлайна зависит от времени, данные карточки те же
+                refs["info"].controls = card_info_controls(refs["goal"])
+            if goal.completed or (kind == "soon" and goal.id in overdue_ids):
+                continue
+            names[kind].append(goal.name)
+        if deadline_view:
+            render_view()
+        lines = []
+        if names["overdue"]:
+            lines.append(f"Дедлайн прошёл: {short_list(names['overdue'])}")
+        if names["soon"]:
+            lines.append(f"Скоро дедлайн: {short_list(names['soon'])}")
+        if lines:
+            page.open(ft.SnackBar(ft.Text("\n".join(lines))))
+        refresh()
+
+    async def deadline_timer():
+        while not session_closed:
+            # сбрасываем до расчёта: правка во время расчёта снова разбудит таймер
+            deadline_rearm.clear()
+            wake = deadline_watch.next_wakeup()
+            timeout = None
+            if wake is not None:
+                # чуть позже границы и не дольше часа (сон компьютера, перевод часов)
+                timeout = min(max(0.0, (wake - datetime.now()).total_seconds()) + 0.01, 3600.0)
+            try:
+                await asyncio.wait_for(deadline_rearm.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+            if session_closed:
+                break
+            with update_scheduler.batch():
+                with store.lock:
+                    on_deadlines_passed(deadline_watch.advance(datetime.now()))
 
-            if "progress_label" in goal:
-                goal["progress_label"].value = f"Выполнено: {int(progress * 100)}%"
+    progress_text = ft.Text("Прогресс: 0 из 0", size=14, color=ft.Colors.GREY_300)
 
-            for s in goal.get("subgoals", []):
-                update_goal(s)
+    def update_progress():
+        total = len(goals)
+        completed = planner.done_count()
+        progress_text.value = f"Прогресс: {completed} из {total}"
+        refresh()
 
-        for g in goals:
-            update_goal(g)
+    def calculate_progress(goal):
+        # cached value, kept current by the planner's mutations
+        return planner.progress(goal)
+
+    def recalc_all_progress(changed=None):
+        """Refresh progress on screen. `changed` limits the cards to patch
+        (goals whose own progress moved); None means every shown card."""
+        if changed is None:
+            changed = [refs["goal"] for refs in card_controls.values()]
+        # only the cards of the shown level exist on screen
+        for goal in changed:
+            refs = card_controls.get(goal.id)
+            if refs is None:
+                continue
+            progress = calculate_progress(goal)
+            refs["progress_bar"].value = progress
+            refs["progress_bar"].color = ft.Colors.GREEN_400
+            refs["progress_label"].value = f"Выполнено: {int(progress * 100)}%"
 
         # update header progress for currently opened goal (if any)
-        if current_goal is not None:
+        if current_goal is not None and header_controls:
             try:
                 hp = calculate_progress(current_goal)
-                if "header_progress_bar" in current_goal:
-                    current_goal["header_progress_bar"].value = hp
-                if "header_progress_label" in current_goal:
-                    current_goal["header_progress_label"].value = f"{int(hp*100)}%"
+                header_controls["progress_bar"].value = hp
+                header_controls["progress_label"].value = f"{int(hp*100)}%"
             except Exception:
                 pass
 
         update_progress()
-        # persist state on every recalculation
-        try:
-            save_state()
-        except Exception:
-            pass
-        page.update()
-
-    def normalize_weights(subs):
-        # Legacy compatibility: keep equal distribution behavior if no parent provided
-        if not subs:
-            return
-        # If parent is provided and has manual_weights flag, do nothing here
-        total = 0.0
-        for s in subs:
-            w = float(s.get("weight", 1.0))
-            total += w
-        # If total is <= 0, distribute equally
-        if total <= 0:
-            n = len(subs)
-            for s in subs:
-                s["weight"] = 1.0 / n
-            return
-        # normalize existing weights to sum to 1.0
-        for s in subs:
-            w = float(s.get("weight", 1.0))
-            s["weight"] = w / total
-
-    def normalize_weights_in_parent(parent):
-        """Normalize weights among parent's subgoals equally if parent.manual_weights is False.
-        If manual_weights is True, do not change existing weights.
-        """
-        subs = parent.get("subgoals", [])
-        if not subs:
-            return
-        if parent.get("manual_weights", False):
-            # do not redistribute automatically
-            return
-        # distribute equally
-        n = len(subs)
-        if n == 0:
-            return
-        equal = 1.0 / n
-        for s in subs:
-            s["weight"] = equal
-
-    def find_parent(target, nodes=None):
-        if nodes is None:
-            nodes = goals
-        for g in nodes:
-            subs = g.get("subgoals", [])
-            if target in subs:
-                return g
-            parent = find_parent(target, subs)
-            if parent:
-                return parent
-        return None
-    
-
-    def update_parents_modified(goal):
-        """Обновляет last_modified у всех родителей цели (вплоть до топ-уровня)"""
-        parent = find_parent(goal)
-        while parent:
-            parent["last_modified"] = datetime.now()
-            parent = find_parent(parent)
-    
-
-    def adjust_weight_on_set(goal, new_weight):
-        """Set goal weight capped so siblings sum <= 1. Marks parent.manual_weights = True."""
-        parent = find_parent(goal)
-        if parent is None:
-            # top-level goal: ignore weight
-            return None
-        subs = parent.get("subgoals", [])
-        total_other = 0.0
-        for s in subs:
-            if s is goal:
-                continue
-            total_other += float(s.get("weight", 0.0))
-        allowed = max(0.0, 1.0 - total_other)
-        assigned = min(max(0.0, float(new_weight)), allowed)
-        goal["weight"] = assigned
-        parent["manual_weights"] = True
-        return assigned
+        refresh()
 
     new_goal_input = ft.TextField(
         hint_text="Введите название большой цели...",
@@ -735,11 +1157,12 @@ def main(page: ft.Page):
         height=48,
     )
 
+    @batched
     def add_subgoal(e):
         # Inline creation panel: name, optional weight, optional deadline
         try:
             print("DEBUG: add_subgoal clicked")
-            print(f"DEBUG: current_goal is {current_goal.get('name') if current_goal else None}")
+            print(f"DEBUG: current_goal is {current_goal.name if current_goal else None}")
         except Exception as ex:
             print("DEBUG: error printing current_goal:", ex)
 
@@ -754,6 +1177,7 @@ def main(page: ft.Page):
 
         sub_deadline_input = ft.TextField(value="Не установлен", read_only=True, expand=True)
 
+        @batched
         def handle_subgoal_deadline_change(ev):
             nonlocal selected_subgoal_deadline
             selected_subgoal_deadline = ev.control.value
@@ -761,7 +1185,7 @@ def main(page: ft.Page):
                 sub_deadline_input.value = selected_subgoal_deadline.strftime("%d.%m.%Y %H:%M")
             else:
                 sub_deadline_input.value = "Не установлен"
-            page.update()
+            refresh()
 
         deadline_btn = ft.ElevatedButton(
             text="Выбрать дедлайн",
@@ -778,6 +1202,7 @@ def main(page: ft.Page):
             ),
         )
 
+        @batched
         def _final_add(ev):
             nm = sub_name_input.value.strip() or text
             w = None
@@ -787,13 +1212,15 @@ def main(page: ft.Page):
             except Exception:
                 w = None
             add_subgoal_to_goal(None, nm, selected_subgoal_deadline, w)
+            _cancel(ev)
 
+        @batched
         def _cancel(ev):
             try:
                 content_column.controls.remove(inline_panel)
             except Exception:
                 pass
-            page.update()
+            refresh()
 
         add_btn_inline = ft.ElevatedButton("Добавить", on_click=_final_add)
         cancel_btn_inline = ft.TextButton("Отмена", on_click=_cancel)
@@ -811,7 +1238,7 @@ def main(page: ft.Page):
         )
 
         content_column.controls.append(inline_panel)
-        page.update()
+        refresh()
         new_subgoal_input.value = ""
         # focus the inline input (safer) and fall back to top-level input on error
         try:
@@ -822,48 +1249,16 @@ def main(page: ft.Page):
             except Exception:
                 pass
 
+    @timed("add_subgoal_to_goal")
     def add_subgoal_to_goal(dialog, text, selected_subgoal_deadline, weight=None):
         try:
-            print(f"DEBUG: add_subgoal_to_goal: adding '{text}' to {current_goal.get('name') if current_goal else None}")
+            print(f"DEBUG: add_subgoal_to_goal: adding '{text}' to {current_goal.name if current_goal else None}")
         except Exception:
             print("DEBUG: add_subgoal_to_goal: current_goal is None")
 
         parent = current_goal
-        subs = parent.setdefault("subgoals", [])
-        # if user specified a weight on creation, apply it (cap by siblings)
-        if weight is not None:
-            # append with provisional 0 then adjust
-            new = {"id": uuid.uuid4().hex, "name": text, "completed": False, "deadline": selected_subgoal_deadline, "subgoals": [], "weight": 0.0, "last_modified": datetime.now()}
-            subs.append(new)
-            assigned = adjust_weight_on_set(new, weight)
-            # if assigned was 0 and parent was manual, it's allowed
-        else:
-            # decide initial weight
-            if parent.get("manual_weights", False):
-                # give remaining weight to new subgoal (could be 0)
-                remaining = max(0.0, 1.0 - sum(float(s.get("weight", 0.0)) for s in subs))
-                w = remaining
-                subs.append({
-                    "id": uuid.uuid4().hex,
-                    "name": text,
-                    "completed": False,
-                    "deadline": selected_subgoal_deadline,
-                    "subgoals": [],
-                    "weight": w,
-                    "last_modified": datetime.now(),
-                })
-            else:
-                # automatic equal redistribution among all subgoals
-                subs.append({
-                    "id": uuid.uuid4().hex,
-                    "name": text,
-                    "completed": False,
-                    "deadline": selected_subgoal_deadline,
-                    "subgoals": [],
-                    "weight": 0.0,
-                    "last_modified": datetime.now(),
-                })
-                normalize_weights_in_parent(parent)
+        # with a weight the parent switches to manual weights (capped by the siblings)
+        new = planner.add_subgoal(parent, text, selected_subgoal_deadline, weight)
 
         # close dialog if provided (None when using inline fallback)
         try:
@@ -872,10 +1267,13 @@ def main(page: ft.Page):
         except Exception:
             pass
         new_subgoal_input.value = ""
-        render_view()
-        recalc_all_progress()
-        update_parents_modified(new) if weight is not None else update_parents_modified(subs[-1])
-        page.update()
+        insert_card(new)
+        if not parent.manual_weights:
+            # the equal share changed for every sibling on screen
+            for sibling_refs in list(card_controls.values()):
+                patch_card(sibling_refs["goal"])
+        recalc_all_progress(())
+        refresh()
 
     add_subgoal_btn.on_click = add_subgoal
 
@@ -890,11 +1288,12 @@ def main(page: ft.Page):
         height=48,
     )
 
+    @batched
     def handle_deadline_change(e):
         nonlocal selected_deadline
         selected_deadline = e.control.value
         deadline_input.value = selected_deadline.strftime("%d.%m.%Y %H:%M")
-        page.update()
+        refresh()
 
     deadline_btn = ft.ElevatedButton(
         text="Выбрать дату и время",
@@ -911,29 +1310,20 @@ def main(page: ft.Page):
         ),
     )
 
+    @batched
     def add_new_goal(e):
         nonlocal selected_deadline
         text = new_goal_input.value.strip()
         if not text:
             return
 
-        goals.append(
-            {
-                "id": uuid.uuid4().hex,
-                "name": text,
-                "completed": False,
-                "deadline": selected_deadline,
-                "subgoals": [],
-                "manual_weights": False,
-                "last_modified": datetime.now(),
-            }
-        )
+        goal = planner.add_goal(text, selected_deadline)
 
         new_goal_input.value = ""
         selected_deadline = None
         deadline_input.value = "Не установлен"
-        render_view()
-        page.update()
+        insert_card(goal)
+        refresh()
         new_goal_input.focus()
 
     add_btn = ft.ElevatedButton(
@@ -959,9 +1349,114 @@ def main(page: ft.Page):
         padding=20,
     )
 
+    def on_store_change():
+        """Другая вкладка изменила дерево: перерисовать свой уровень"""
+        def rerender():
+            with update_scheduler.batch():
+                with store.lock:
+                    fix_navigation()
+                    render_view()
+                    recalc_all_progress()
+            rearm_deadline_timer()
+        update_scheduler.call_on_loop(rerender)
+
+    # Быстрый старт: сначала на экран идёт оболочка с индикатором загрузки,
+    # state.json читается в отдельном потоке, а клиент облака (импорт
+    # supabase и create_client) создаётся уже после отрисовки целей. Лишнего
+    # сохранения при старте нет: прогресс считается в памяти, а не пишется.
+    loading_text = ft.Text("Загрузка целей...", size=14, color=ft.Colors.GREY_400)
+
+    # Пока state.json читается (по одной цели верхнего уровня, см.
+    # stream_goals в planner/model.py), первые CARD_WINDOW целей сразу
+    # появляются на экране — только название и прогресс, без кнопок.
+    # on_goal_read вызывается в потоке загрузки, экран меняется на event loop.
+    preview_column = ft.Column(spacing=16)
+    preview_count = 0
+    preview_shown_at = 0.0
+
+    def on_goal_read(goal):
+        nonlocal preview_count, preview_shown_at
+        preview_count += 1
+        count = preview_count
+        if count == 1:
+            startup.mark("first_goal")
+        row = None
+        if count <= CARD_WINDOW:
+            progress = subtree_progress(goal)
+            row = ft.Container(
+                padding=16,
+                border_radius=12,
+                bgcolor=ft.Colors.with_opacity(0.15, ft.Colors.BLUE_GREY_800),
+                content=ft.Column([
+                    ft.Text(goal.name, size=16),
+                    ft.ProgressBar(value=progress, height=8, color=ft.Colors.GREEN_400),
+                    ft.Text(f"Выполнено: {int(progress * 100)}%", size=12, color=ft.Colors.GREY_400),
+                ], spacing=6),
+            )
+        else:
+            # дальше только счётчик, не чаще 4 раз в секунду
+            now = time.monotonic()
+            if now - preview_shown_at < 0.25:
+                return
+            preview_shown_at = now
+
+        def show():
+            if planner is not None:
+                # цели уже показаны полностью
+                return
+            if row is not None:
+                preview_column.controls.append(row)
+            loading_text.value = f"Загрузка целей... {count}"
+            refresh()
+        update_scheduler.call_on_loop(show)
+    content_column.controls.extend([
+        ft.Text("Планировщик целей", size=28, weight=ft.FontWeight.BOLD),
+        ft.Text("Разбивайте большие задачи на маленькие шаги", size=14, color=ft.Colors.GREY_400),
+        ft.Container(height=16),
+        ft.Row([ft.ProgressRing(width=16, height=16, stroke_width=2), loading_text], spacing=12),
+        ft.Container(height=8),
+        preview_column,
+    ])
     page.add(main_container)
-    render_view()
-    recalc_all_progress()
+    startup.mark("shell")
+
+    async def load_planner():
+        nonlocal planner, store, goals, goal_index, state_writer, session_token, deadline_watch
+        try:
+            loaded = await asyncio.to_thread(
+                get_planner, STATE_FILE, sync_mode=sync_mode, storage_mode=storage_mode,
+                compact=compact_state, save_delay=save_delay,
+                journal_max_kb=journal_max_kb, lazy=lazy_load, cache_levels=lazy_cache,
+                on_goal=on_goal_read)
+        except Exception as ex:
+            print("DEBUG: startup: loading failed:", ex)
+            loading_text.value = f"Не удалось загрузить цели: {ex}"
+            refresh()
+            return
+        startup.mark("load")
+        if session_closed:
+            return
+        planner = loaded
+        store = planner.store
+        goals = planner.goals
+        goal_index = planner.index
+        state_writer = store.writer
+        deadline_watch = DeadlineWatch(store, datetime.now())
+        session_token = store.subscribe(on_store_change)
+        with update_scheduler.batch():
+            with store.lock:
+                render_view()
+                update_progress()
+        startup.mark("first_render")
+        page.run_task(deadline_timer)
+
+        await asyncio.to_thread(planner.connect)
+        startup.mark("sync_client")
+        print("DEBUG:", startup.report())
+        if auto_sync_interval > 0 and planner.sync_client.enabled and not session_closed:
+            page.run_task(auto_sync_loop)
+
+    page.run_task(load_planner)
 
 
 if __name__ == "__main__":
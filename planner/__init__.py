@@ -0,0 +1 @@
+"""UI-independent helpers for the goal planner (no Flet imports here)."""
@@ -0,0 +1,172 @@
+"""Compact binary encoding of the goal tree (STATE_FORMAT=compact).
+
+Layout: the 4-byte header `GPC1` followed by a zlib-compressed JSON
+object with one array per field, goals in pre-order:
+
+    {"roots": <number of top-level goals>,
+     "ids": <base64 of packed 16-byte uuids> or [<id>, ...],
+     "name": [...], "completed": "0101...", "manual": "00...",
+     "weight": [...], "deadline": [...], "modified": [...],
+     "subgoals": [<number of children of each goal>, ...]}
+
+Datetimes are microseconds since 1970-01-01 (naive, like the app's own
+timestamps). Keys are written once instead of on every node. Data
+without the header is read as the old state.json JSON.
+"""
+
+import base64
+import binascii
+import json
+import zlib
+from datetime import datetime, timedelta
+
+from planner.model import (Goal, dumps_goals, goals_from_data, loads_goals, parse_datetime, stream_goals,
+                           to_serializable)
+from planner.tree import iter_goals
+
+MAGIC = b"GPC1"
+PAYLOAD_FORMAT = "gpc1"  # marks a compact cloud payload: {"format": ..., "data": base64}
+_EPOCH = datetime(1970, 1, 1)
+_US = timedelta(microseconds=1)
+
+
+def _pack_time(dt):
+    if dt is None:
+        return None
+    if dt.tzinfo is not None:
+        return dt.isoformat()
+    return (dt - _EPOCH) // _US
+
+
+def _unpack_time(v):
+    if v is None:
+        return None
+    if isinstance(v, str):
+        return parse_datetime(v)
+    return _EPOCH + timedelta(microseconds=v)
+
+
+def _pack_ids(ids):
+    """uuid4().hex ids as one base64 blob (16 bytes each); other ids stay a list."""
+    if any(not isinstance(i, str) or len(i) != 32 or i != i.lower() for i in ids):
+        return ids
+    try:
+        packed = b"".join(bytes.fromhex(i) for i in ids)
+    except (TypeError, ValueError):
+        return ids
+    if len(packed) != 16 * len(ids):
+        return ids
+    return base64.b64encode(packed).decode("ascii")
+
+
+def _unpack_ids(ids):
+    if isinstance(ids, list):
+        return ids
+    raw = base64.b64decode(ids)
+    return [raw[i:i + 16].hex() for i in range(0, len(raw), 16)]
+
+
+def encode(goals, level=6):
+    """Compact bytes for the tree (header + zlib)."""
+    ids, names, completed, manual, weights, deadlines, modified, counts = [], [], [], [], [], [], [], []
+    for goal, _ in iter_goals(goals):
+        ids.append(goal.id)
+        names.append(goal.name)
+        completed.append("1" if goal.completed else "0")
+        manual.append("1" if goal.manual_weights else "0")
+        weights.append(goal.weight)
+        deadlines.append(_pack_time(goal.deadline))
+        modified.append(_pack_time(goal.last_modified))
+        counts.append(len(goal.subgoals))
+    doc = {
+        "roots": len(goals),
+        "ids": _pack_ids(ids),
+        "name": names,
+        "completed": "".join(completed),
+        "manual": "".join(manual),
+        "weight": weights,
+        "deadline": deadlines,
+        "modified": modified,
+        "subgoals": counts,
+    }
+    text = json.dumps(doc, ensure_ascii=False, separators=(",", ":"))
+    return MAGIC + zlib.compress(text.encode("utf-8"), level)
+
+
+def decode(data):
+    """Goals from bytes written by `encode`."""
+    doc = json.loads(zlib.decompress(data[len(MAGIC):]).decode("utf-8"))
+    ids = _unpack_ids(doc["ids"])
+    names, weights = doc["name"], doc["weight"]
+    completed, manual = doc["completed"], doc["manual"]
+    deadlines, modified, counts = doc["deadline"], doc["modified"], doc["subgoals"]
+    roots = []
+    # [target list, goals still expected in it]
+    stack = [[roots, doc["roots"]]]
+    for i in range(len(names)):
+        while stack[-1][1] == 0:
+            stack.pop()
+        top = stack[-1]
+        top[1] -= 1
+        w = weights[i]
+        goal = Goal(
+            names[i],
+            id=ids[i],
+            completed=completed[i] == "1",
+            deadline=_unpack_time(deadlines[i]),
+            weight=float(w) if w is not None else None,
+            manual_weights=manual[i] == "1",
+            last_modified=_unpack_time(modified[i]),
+        )
+        top[0].append(goal)
+        if counts[i]:
+            stack.append([goal.subgoals, counts[i]])
+    return roots
+
+
+def is_compact(data):
+    return data[:len(MAGIC)] == MAGIC
+
+
+def dumps_state(goals, compact=False):
+    """Snapshot file contents (bytes) in the chosen format."""
+    if compact:
+        return encode(goals)
+    return dumps_goals(goals).encode("utf-8")
+
+
+def loads_state(data):
+    """Goals from snapshot bytes in either format."""
+    if is_compact(data):
+        return decode(data)
+    return loads_goals(data.decode("utf-8"))
+
+
+def read_state(path, chunk_size=1 << 20):
+    """Top-level goals of a snapshot file, yielded as they are read. JSON is
+    parsed one top-level goal at a time (model.stream_goals); the compact
+    format is a single zlib stream and is decoded at once."""
+    with open(path, "rb") as f:
+        if is_compact(f.read(len(MAGIC))):
+            f.seek(0)
+            yield from decode(f.read())
+            return
+        f.seek(0)
+        yield from stream_goals(f, chunk_size)
+
+
+def to_payload(goals, compact=False):
+    """JSON-compatible cloud payload: the plain goal list or a wrapped compact blob."""
+    if compact:
+        return {"format": PAYLOAD_FORMAT, "data": base64.b64encode(encode(goals)).decode("ascii")}
+    return to_serializable(goals)
+
+
+def from_payload(state):
+    """Goals from a payload made by `to_payload` (either format)."""
+    if isinstance(state, dict) and state.get("format") == PAYLOAD_FORMAT:
+        try:
+            return decode(base64.b64decode(state["data"]))
+        except (binascii.Error, zlib.error, ValueError, KeyError) as ex:
+            raise ValueError(f"broken compact payload: {ex}")
+    return goals_from_data(state)
@@ -0,0 +1,403 @@
+"""The planner without a UI: tree operations, progress, persistence and sync.
+
+main.py is a view over a Planner: its handlers call the methods below
+and redraw what they return. Everything here works without Flet, so it
+can be imported by benchmarks, run in a worker thread or driven by a
+script. One Planner per state file per process (`get_planner`); in web
+mode all sessions share it, like they share the SharedStore under it.
+
+Mutations take `store.lock`, record themselves (journal, SQLite, cloud
+and other sessions, see SharedStore.record) and ask the StateWriter for a
+background save. They keep GoalIndex, ProgressEngine, DeadlineIndex and
+SearchIndex current, so queries never walk the tree.
+"""
+
+import asyncio
+import json
+import threading
+import traceback
+from datetime import datetime
+from pathlib import Path
+
+from planner.codec import from_payload, to_payload
+from planner.merge import merge_trees
+from planner.metrics import timed
+from planner.model import Goal, json_default
+from planner.store import get_store
+from planner.sync import DeltaSync, create_sync_client
+from planner.tree import iter_goals
+from planner.weights import cap_weight, effective_weight
+
+
+class Planner:
+    def __init__(self, store, data_dir, sync_mode="full", compact=False):
+        self.store = store
+        self.data_dir = Path(data_dir)
+        self.compact = compact
+        self.goals = store.goals
+        self.index = store.index
+        self.engine = store.progress
+        self.deadlines = store.deadlines
+        self.search = store.search
+        # created on first use (connect): importing supabase and create_client
+        # take longer than loading a typical tree, so startup does not wait
+        self._sync_client = None
+        self._connect_lock = threading.Lock()
+        self.delta_sync = None
+        if sync_mode == "delta":
+            # tombstones are recorded before the client exists
+            self.delta_sync = DeltaSync(None, self.data_dir / "sync_meta.json")
+        # full sync merges against the last common version; conflicts are kept for the user
+        self.sync_base_file = self.data_dir / "sync_base.json"
+        self.conflicts_file = self.data_dir / "sync_conflicts.json"
+
+    @property
+    def lock(self):
+        return self.store.lock
+
+    @property
+    def sync_client(self):
+        return self.connect()
+
+    @property
+    def connected(self):
+        """True once the sync client exists (`sync_client` will not block)."""
+        return self._sync_client is not None
+
+    def connect(self):
+        """Create the sync client from the environment, once; safe to call
+        from a worker thread. Returns it."""
+        with self._connect_lock:
+            if self._sync_client is None:
+                client = create_sync_client(self.data_dir, compact=self.compact)
+                if self.delta_sync is not None:
+                    self.delta_sync.client = client
+                self._sync_client = client
+            return self._sync_client
+
+    # --- queries ---------------------------------------------------------
+
+    def progress(self, goal):
+        """Weighted progress of `goal` in [0, 1], from the cache."""
+        return self.engine.progress(goal)
+
+    def parent(self, goal):
+        return self.index.parent(goal)
+
+    def weight(self, goal):
+        """The weight `goal` counts with in its parent (None for a top-level goal)."""
+        return effective_weight(goal, self.index.parent(goal))
+
+    def level(self, goal):
+        """The goals shown under `goal` (None: the top level)."""
+        return self.goals if goal is None else goal.subgoals
+
+    def done_count(self):
+        """Top-level goals that are complete."""
+        return sum(1 for g in self.goals if self.engine.progress(g) >= 0.999)
+
+    # --- mutations -------------------------------------------------------
+
+    def _saved(self):
+        # bursts of changes end up in one background write
+        self.store.writer.mark_dirty()
+
+    def touch_ancestors(self, goal):
+        """`last_modified` of every ancestor of `goal` is now (sync compares it)."""
+        now = datetime.now()
+        for parent in self.index.ancestors(goal):
+            parent.last_modified = now
+        self.store.record({"op": "touch", "id": goal.id, "at": now})
+
+    def add_goal(self, name, deadline=None):
+        with self.lock:
+            goal = Goal(name, deadline=deadline, last_modified=datetime.now())
+            self.goals.append(goal)
+            self.index.add(goal)
+            self.engine.attach(goal)
+            self.deadlines.add(goal)
+            self.search.add(goal)
+            self.store.record({"op": "add", "parent": None, "goal": goal})
+            self._saved()
+            return goal
+
+    def add_subgoal(self, parent, name, deadline=None, weight=None):
+        """Add a subgoal; with `weight` the parent switches to manual weights
+        and the weight is capped by the siblings'."""
+        with self.lock:
+            subs = parent.subgoals
+            new = Goal(name, deadline=deadline, weight=0.0, last_modified=datetime.now())
+            if weight is not None:
+                # the siblings keep their current equal shares
+                self.switch_to_manual(parent)
+                subs.append(new)
+                self.index.add(new, parent)
+                self.store.record({"op": "add", "parent": parent.id, "goal": new})
+                self.engine.attach(new)
+                self.set_weight(new, weight)
+                self.engine.changed(new)
+            else:
+                if parent.manual_weights:
+                    # give remaining weight to new subgoal (could be 0)
+                    new.weight = max(0.0, 1.0 - self.engine.weight_total(parent))
+                subs.append(new)
+                if not parent.manual_weights:
+                    # equal shares are implicit (1/n); the stored value is only
+                    # a hint for older copies of the data
+                    new.weight = 1.0 / len(subs)
+                self.index.add(new, parent)
+                self.store.record({"op": "add", "parent": parent.id, "goal": new})
+                self.engine.attach(new)
+            self.deadlines.add(new)
+            self.search.add(new)
+            self.touch_ancestors(new)
+            self._saved()
+            return new
+
+    def set_completed(self, goal, completed):
+        with self.lock:
+            goal.completed = completed
+            goal.last_modified = datetime.now()
+            self.store.record({"op": "update", "id": goal.id, "fields": {
+                "completed": goal.completed, "last_modified": goal.last_modified}})
+            self.touch_ancestors(goal)
+            self.engine.changed(goal)
+            self._saved()
+
+    def edit(self, goal, name, deadline, weight=None):
+        """Rename, set the deadline and (for a subgoal, if given) the weight."""
+        with self.lock:
+            goal.name = name or goal.name
+            if weight is not None and self.index.parent(goal) is not None:
+                self.set_weight(goal, weight)
+            goal.deadline = deadline
+            goal.last_modified = datetime.now()
+            fields = {"name": goal.name, "deadline": goal.deadline, "last_modified": goal.last_modified}
+            if goal.weight is not None:
+                fields["weight"] = goal.weight
+            self.store.record({"op": "update", "id": goal.id, "fields": fields})
+            self.touch_ancestors(goal)
+            self.engine.changed(goal)
+            self.deadlines.update(goal)
+            self.search.update(goal)
+            self._saved()
+
+    def set_weight(self, goal, weight):
+        """Set a subgoal's weight capped so the siblings sum to at most 1.
+        Returns the assigned weight (None for a top-level goal)."""
+        with self.lock:
+            parent = self.index.parent(goal)
+            if parent is None:
+                return None
+            self.switch_to_manual(parent)
+            # running sum of the siblings' weights, no walk over them
+            assigned = cap_weight(weight, self.engine.weight_total(parent, excluding=goal))
+            goal.weight = assigned
+            self.store.record({"op": "update", "id": goal.id, "fields": {"weight": assigned}})
+            return assigned
+
+    def switch_to_manual(self, parent):
+        """Store the implicit equal shares of an auto-weighted parent in its
+        subgoals and mark it manual; later edits cap against those values."""
+        if parent.manual_weights:
+            return
+        subs = parent.subgoals
+        if subs:
+            equal = 1.0 / len(subs)
+            now = datetime.now()
+            changed = []
+            for s in subs:
+                if s.weight != equal:
+                    s.weight = equal
+                    # the weight is part of the node: the delta sync has to send it
+                    s.last_modified = now
+                    changed.append(s.id)
+            self.store.record({"op": "normalize", "id": parent.id, "at": now,
+                               "weight": equal, "ids": changed})
+        parent.manual_weights = True
+        self.store.record({"op": "update", "id": parent.id, "fields": {"manual_weights": True}})
+        self.engine.recount(parent)
+
+    def delete(self, goal):
+        """Remove `goal` with its subtree; returns its parent (None: top level)."""
+        with self.lock:
+            self.touch_ancestors(goal)
+            parent = self.index.parent(goal)
+            siblings = parent.subgoals if parent is not None else self.goals
+            for i, s in enumerate(siblings):
+                if s is goal:
+                    del siblings[i]
+                    break
+            self.index.remove(goal)
+            self.engine.detach(goal, parent)
+            self.deadlines.remove(goal)
+            self.search.remove(goal)
+            self.store.record({"op": "delete", "id": goal.id})
+            if self.delta_sync is not None:
+                # one tombstone per goal: a revived parent must not bring back the rest
+                self.delta_sync.note_deleted([g.id for g, _ in iter_goals([goal])])
+            self._saved()
+            return parent
+
+    def apply_sync_events(self, events):
+        """Carry changes merged in from the cloud into the indexes and the journal."""
+        for kind, goal, parent in events:
+            if kind == "add":
+                self.engine.attach(goal)
+                self.deadlines.add(goal)
+                self.search.add(goal)
+                self.store.record({"op": "add", "parent": parent.id if parent is not None else None, "goal": goal})
+            elif kind == "update":
+                self.engine.changed(goal)
+                self.deadlines.update(goal)
+                self.search.update(goal)
+                self.store.record({"op": "update", "id": goal.id, "fields": {
+                    "name": goal.name, "completed": goal.completed, "deadline": goal.deadline,
+                    "weight": goal.weight, "manual_weights": goal.manual_weights,
+                    "last_modified": goal.last_modified}})
+            elif kind == "delete":
+                self.engine.detach(goal, parent)
+                self.deadlines.remove(goal)
+                self.search.remove(goal)
+                self.store.record({"op": "delete", "id": goal.id})
+        if events:
+            self._saved()
+
+    # --- sync ------------------------------------------------------------
+
+    def load_sync_base(self):
+        try:
+            if self.sync_base_file.exists():
+                with self.sync_base_file.open("r", encoding="utf-8") as f:
+                    return from_payload(json.load(f))
+        except Exception as ex:
+            print("DEBUG: load_sync_base failed:", ex)
+        return []
+
+    def save_sync_base(self, state):
+        try:
+            tmp = self.sync_base_file.with_suffix('.tmp')
+            with tmp.open("w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+            tmp.replace(self.sync_base_file)
+        except Exception as ex:
+            print("DEBUG: save_sync_base failed:", ex)
+
+    def save_conflicts(self, conflicts):
+        try:
+            with self.conflicts_file.open("w", encoding="utf-8") as f:
+                json.dump({"at": datetime.now(), "conflicts": conflicts}, f,
+                          ensure_ascii=False, indent=2, default=json_default)
+        except Exception as ex:
+            print("DEBUG: save_conflicts failed:", ex)
+
+    @timed("sync")
+    async def sync_once(self, job):
+        """One sync round. Network calls run in threads (asyncio.to_thread),
+        the tree changes only under the lock on the calling loop.
+
+        Returns a dict: "result" is True (done), False (failed) or None
+        (`job["cancelled"]` was set); "status" says what happened
+        ("pull_failed", "push_failed", "download_failed", "delta",
+        "conflicts", "synced", "pulled", "pushed", "unchanged", "error").
+        "delta" and "synced" (both directions in one round) come with
+        "stats": goals taken from the cloud ("pulled") and sent ("pushed").
+        """
+        store = self.store
+        store.sync_dirty = False
+        out = {"result": False, "status": "error"}
+        try:
+            await asyncio.to_thread(self.connect)
+            # sync compares the whole tree: load what is not in memory
+            await asyncio.to_thread(store.materialize)
+            delta_sync = self.delta_sync
+            if delta_sync is not None:
+                with self.lock:
+                    rnd = delta_sync.begin(self.goals)
+                if not await asyncio.to_thread(delta_sync.pull, rnd):
+                    out["status"] = "pull_failed"
+                    return out
+                if job["cancelled"]:
+                    out["result"] = None
+                    return out
+                with self.lock:
+                    # changes from the cloud do not make the state dirty for the cloud
+                    was_dirty = store.sync_dirty
+                    self.apply_sync_events(delta_sync.merge(rnd, self.goals, self.index))
+                    store.sync_dirty = was_dirty
+                if not await asyncio.to_thread(delta_sync.push, rnd):
+                    out["status"] = "push_failed"
+                    return out
+                if job["cancelled"]:
+                    out["result"] = None
+                    return out
+                out["stats"] = stats = delta_sync.finish(rnd)
+                print(f"DEBUG: delta sync: {stats}, bytes sent {self.sync_client.bytes_sent}, "
+                      f"received {self.sync_client.bytes_received}")
+                out.update(result=True, status="delta")
+                return out
+
+            base = await asyncio.to_thread(self.load_sync_base)
+            remote = await asyncio.to_thread(self.sync_client.pull_state)
+            if job["cancelled"]:
+                out["result"] = None
+                return out
+            if remote is None:
+                out["status"] = "download_failed"
+                return out
+            with self.lock:
+                report = merge_trees(base, self.goals, remote)
+                if report.remote_changes:
+                    store.rebuild()
+                    self._saved()
+                # snapshot taken here, so the thread does not read the tree during edits
+                state = to_payload(self.goals, self.compact)
+            ok = True
+            if report.local_changes:
+                ok = await asyncio.to_thread(self.sync_client.push_payload, state)
+            if ok:
+                # the common version for the next merge
+                await asyncio.to_thread(self.save_sync_base, state)
+            print(f"DEBUG: merge: {report.summary()}")
+            out["stats"] = {"pulled": report.remote_changes, "pushed": report.local_changes if ok else 0}
+            if not ok:
+                out["status"] = "push_failed"
+            elif report.conflicts:
+                self.save_conflicts(report.conflicts)
+                out.update(status="conflicts", conflicts=len(report.conflicts))
+            elif report.remote_changes and report.local_changes:
+                # pulled and pushed in the same round
+                out["status"] = "synced"
+            elif report.remote_changes:
+                out["status"] = "pulled"
+            elif report.local_changes:
+                out["status"] = "pushed"
+            else:
+                out["status"] = "unchanged"
+            out["result"] = ok
+            return out
+        except Exception as ex:
+            print("DEBUG: sync failed:", ex)
+            traceback.print_exc()
+            out.update(status="error", error=str(ex))
+            return out
+        finally:
+            if out["result"] is not True:
+                # failed: the changes stay for the next attempt
+                store.sync_dirty = True
+
+
+_planners = {}
+_planners_lock = threading.Lock()
+
+
+def get_planner(state_file, sync_mode="full", **options):
+    """The Planner for `state_file`, created on first use. `options` go to
+    get_store; the data dir is the directory of the state file."""
+    store = get_store(state_file, **options)
+    with _planners_lock:
+        planner = _planners.get(id(store))
+        if planner is None:
+            planner = _planners[id(store)] = Planner(
+                store, Path(state_file).parent, sync_mode, options.get("compact", False))
+        return planner
@@ -0,0 +1,140 @@
+"""Goals ordered by deadline, for due-soon and overdue queries."""
+
+from bisect import bisect_left, insort
+from datetime import timedelta
+
+from planner.tree import iter_goals
+
+# a deadline is "soon" while (deadline - now).days <= SOON_DAYS, the same
+# rule the cards use for their orange color, i.e. less than SOON ahead
+SOON_DAYS = 3
+SOON = timedelta(days=SOON_DAYS + 1)
+
+
+def deadline_key(dt):
+    """Naive datetime for ordering; aware values are converted to local time."""
+    if dt is not None and dt.tzinfo is not None:
+        return dt.astimezone().replace(tzinfo=None)
+    return dt
+
+
+def urgency(deadline, now):
+    """"overdue", "soon" or "later" for a deadline as seen at `now`."""
+    days_left = (deadline_key(deadline) - now).days
+    if days_left < 0:
+        return "overdue"
+    if days_left <= SOON_DAYS:
+        return "soon"
+    return "later"
+
+
+def soon_end(now):
+    """End of the "soon" window that starts at `now` (exclusive)."""
+    return now + SOON
+
+
+class DeadlineIndex:
+    """Sorted (deadline, id) pairs of every goal that has a deadline.
+
+    Range queries bisect into the list, so k results cost O(log n + k)
+    instead of a walk over the tree. Like GoalIndex it is rebuilt when
+    the whole tree is replaced and patched by add/update/remove on edits.
+    """
+
+    def __init__(self, goals=None):
+        self._keys = []
+        self._deadline = {}
+        if goals is not None:
+            self.rebuild(goals)
+
+    def rebuild(self, goals):
+        self._deadline = {g.id: deadline_key(g.deadline) for g, _ in iter_goals(goals) if g.deadline is not None}
+        self._keys = sorted((d, goal_id) for goal_id, d in self._deadline.items())
+
+    def add(self, goal):
+        """Index `goal` and its subtree."""
+        for g, _ in iter_goals([goal]):
+            self.update(g)
+
+    def update(self, goal):
+        """Re-index one goal after its deadline was set, changed or cleared."""
+        new = deadline_key(goal.deadline)
+        old = self._deadline.get(goal.id)
+        if old == new:
+            return
+        if old is not None:
+            self._discard(old, goal.id)
+        if new is None:
+            self._deadline.pop(goal.id, None)
+        else:
+            self._deadline[goal.id] = new
+            insort(self._keys, (new, goal.id))
+
+    def remove(self, goal):
+        """Forget `goal` and its subtree."""
+        for g, _ in iter_goals([goal]):
+            old = self._deadline.pop(g.id, None)
+            if old is not None:
+                self._discard(old, g.id)
+
+    def _discard(self, deadline, goal_id):
+        keys = self._keys
+        i = bisect_left(keys, (deadline, goal_id))
+        if i < len(keys) and keys[i] == (deadline, goal_id):
+            del keys[i]
+
+    def __len__(self):
+        return len(self._keys)
+
+    def first(self, start):
+        """(deadline, id) of the earliest deadline >= `start`, or None."""
+        keys = self._keys
+        i = bisect_left(keys, (deadline_key(start),))
+        return keys[i] if i < len(keys) else None
+
+    def between(self, start=None, end=None, reverse=False):
+        """Ids of goals with start <= deadline < end (None: unbounded),
+        earliest first (latest first with `reverse`). A generator: stop
+        reading once you have enough."""
+        keys = self._keys
+        lo = 0 if start is None else bisect_left(keys, (deadline_key(start),))
+        hi = len(keys) if end is None else bisect_left(keys, (deadline_key(end),))
+        steps = range(hi - 1, lo - 1, -1) if reverse else range(lo, hi)
+        for i in steps:
+            yield keys[i][1]
+
+
+class DeadlineWatch:
+    """Finds the moment the next goal changes urgency and which goals did.
+
+    A goal turns "soon" at deadline - SOON and "overdue" at its deadline.
+    `source` (the SharedStore) answers `next_deadline(after)` and
+    `due(start, end, ...)` from a deadline index, so arming a timer or
+    handling one costs O(log n + k) no matter how many deadlines exist.
+    """
+
+    def __init__(self, source, now):
+        self.source = source
+        # every boundary before this moment is already handled
+        self.last = now
+
+    def next_wakeup(self):
+        """When the next boundary after `last` is reached (None: no deadlines ahead)."""
+        times = []
+        due = self.source.next_deadline(self.last)
+        if due is not None:
+            times.append(due)
+        due = self.source.next_deadline(self.last + SOON)
+        if due is not None:
+            times.append(due - SOON)
+        return min(times) if times else None
+
+    def advance(self, now, limit=1000):
+        """(kind, goal) for the goals that turned "overdue" or "soon" since
+        the last call; completed goals are included (their color changes too)."""
+        if now <= self.last:
+            return []
+        overdue = self.source.due(self.last, now, limit=limit, open_only=False)
+        soon = self.source.due(self.last + SOON, now + SOON, limit=limit, open_only=False)
+        self.last = now
+        return [("overdue", g) for g in overdue] + [("soon", g) for g in soon]
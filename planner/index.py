@@ -0,0 +1,65 @@
+"""id -> goal and id -> parent lookups for the goal tree."""
+
+from planner.tree import iter_goals
+
+
+class GoalIndex:
+    """Maps goal `id` to the Goal and to its parent (None for top-level).
+
+    Lookups go by id, so finding a parent is O(1) and walking up to the
+    top level is O(depth). Rebuild it whenever the whole tree is replaced
+    (load, sync) and call add/remove on edits.
+    """
+
+    def __init__(self, goals=None):
+        self._nodes = {}
+        self._parent = {}
+        if goals is not None:
+            self.rebuild(goals)
+
+    def rebuild(self, goals):
+        self._nodes.clear()
+        self._parent.clear()
+        self._add_all(goals, None)
+
+    def _add_all(self, goals, parent):
+        nodes, parents = self._nodes, self._parent
+        for goal, par in iter_goals(goals, parent):
+            nodes[goal.id] = goal
+            parents[goal.id] = par
+
+    def add(self, goal, parent=None):
+        """Register `goal` and its subtree under `parent`."""
+        self._add_all([goal], parent)
+
+    def remove(self, goal):
+        """Forget `goal` and its subtree."""
+        for g, _ in iter_goals([goal]):
+            self._nodes.pop(g.id, None)
+            self._parent.pop(g.id, None)
+
+    def get(self, goal_id):
+        return self._nodes.get(goal_id)
+
+    def __contains__(self, goal_id):
+        return goal_id in self._nodes
+
+    def __len__(self):
+        return len(self._nodes)
+
+    def parent(self, goal):
+        return self._parent.get(goal.id)
+
+    def ancestors(self, goal):
+        """Yield the parent, grandparent, ... up to the top-level goal."""
+        parent = self._parent.get(goal.id)
+        while parent is not None:
+            yield parent
+            parent = self._parent.get(parent.id)
+
+    def path(self, goal):
+        """Goals from the top level down to `goal` itself."""
+        chain = [goal]
+        chain.extend(self.ancestors(goal))
+        chain.reverse()
+        return chain
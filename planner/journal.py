@@ -0,0 +1,183 @@
+"""Append-only journal of goal mutations (JSON lines next to state.json).
+
+Every mutation is one small record:
+
+    {"op": "add", "parent": <id or null>, "goal": {...}}
+    {"op": "update", "id": ..., "fields": {"completed": true, ...}}
+    {"op": "delete", "id": ...}
+    {"op": "touch", "id": ..., "at": ...}     # last_modified of all ancestors
+    {"op": "normalize", "id": <parent id>, "at": ..., "weight": ..., "ids": [...]}
+                                              # equal weight for the subgoals that differed
+
+Loading replays the journal over the last snapshot. Once the journal grows
+past `max_bytes` a fresh snapshot is written and the journal is emptied.
+All ops are idempotent, so a crash between those two steps is harmless.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from planner.model import Goal, decode_field, goals_from_data, json_default
+
+
+def apply_op(goals, index, op):
+    """Apply one journal record to the tree. Unknown ids are skipped."""
+    kind = op.get("op")
+    if kind == "add":
+        goal = goals_from_data([op["goal"]])[0]
+        if goal.id in index:
+            return
+        parent = index.get(op["parent"]) if op.get("parent") else None
+        if op.get("parent") and parent is None:
+            return
+        siblings = parent.subgoals if parent is not None else goals
+        siblings.append(goal)
+        index.add(goal, parent)
+    elif kind == "update":
+        goal = index.get(op["id"])
+        if goal is not None:
+            for key, value in op["fields"].items():
+                if key in Goal.__slots__ and key not in ("id", "subgoals"):
+                    setattr(goal, key, decode_field(key, value))
+    elif kind == "delete":
+        goal = index.get(op["id"])
+        if goal is None:
+            return
+        parent = index.parent(goal)
+        siblings = parent.subgoals if parent is not None else goals
+        for i, s in enumerate(siblings):
+            if s is goal:
+                del siblings[i]
+                break
+        index.remove(goal)
+    elif kind == "touch":
+        goal = index.get(op["id"])
+        if goal is not None:
+            at = datetime.fromisoformat(op["at"])
+            for parent in index.ancestors(goal):
+                parent.last_modified = at
+    elif kind == "normalize":
+        if "ids" in op:
+            # only the subgoals it changed: replayed over a later tree, it
+            # must not touch weights set after it
+            at = datetime.fromisoformat(op["at"])
+            for goal_id in op["ids"]:
+                goal = index.get(goal_id)
+                if goal is not None:
+                    goal.weight = op["weight"]
+                    goal.last_modified = at
+            return
+        # older records: every subgoal that differs from the equal share
+        parent = index.get(op["id"])
+        subs = parent.subgoals if parent is not None else None
+        if subs:
+            equal = 1.0 / len(subs)
+            at = datetime.fromisoformat(op["at"]) if op.get("at") else None
+            for s in subs:
+                if s.weight != equal:
+                    s.weight = equal
+                    if at is not None:
+                        s.last_modified = at
+
+
+class Journal:
+    def __init__(self, path, max_bytes=1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._f = None
+        self._compact_requested = False
+
+    def _file(self):
+        if self._f is None:
+            torn = self._torn()
+            self._f = open(self.path, "a", encoding="utf-8")
+            if torn:
+                # end the torn line of a crash, or the next record joins it
+                self._f.write("\n")
+        return self._f
+
+    def _torn(self):
+        try:
+            with open(self.path, "rb") as f:
+                f.seek(-1, os.SEEK_END)
+                return f.read(1) != b"\n"
+        except OSError:
+            # missing or empty file
+            return False
+
+    def size(self):
+        try:
+            return os.path.getsize(self.path)
+        except OSError:
+            return 0
+
+    def append(self, op):
+        line = json.dumps(op, ensure_ascii=False, default=json_default, separators=(",", ":"))
+        with self._lock:
+            f = self._file()
+            f.write(line + "\n")
+            # the OS has it now: survives an app crash, fsync happens in sync()
+            f.flush()
+
+    def sync(self):
+        with self._lock:
+            if self._f is not None:
+                os.fsync(self._f.fileno())
+
+    def request_compaction(self):
+        """Ask for a snapshot on the next checkpoint (e.g. the whole tree was replaced)."""
+        self._compact_requested = True
+
+    def compaction_due(self):
+        return self._compact_requested or self.size() >= self.max_bytes
+
+    def checkpoint(self, write_snapshot):
+        """Make appended ops durable; compact into a snapshot when the journal is big.
+
+        `write_snapshot()` writes the full state and returns True on success.
+        The caller must hold the lock its mutations hold while appending
+        (SharedStore.lock) around a compaction, and take it before this
+        one: then no op can fall between the snapshot and the truncation,
+        and the two locks are always taken in the same order.
+        """
+        if not self.compaction_due():
+            self.sync()
+            return True
+        with self._lock:
+            if not write_snapshot():
+                return False
+            if self._f is not None:
+                self._f.close()
+                self._f = None
+            open(self.path, "w").close()
+            self._compact_requested = False
+        return True
+
+    def replay(self, goals, index):
+        """Apply all journaled ops to `goals`. Returns how many were applied."""
+        if not os.path.exists(self.path):
+            return 0
+        count = 0
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    op = json.loads(line)
+                except ValueError:
+                    # torn last line after a crash
+                    print("DEBUG: journal: skipping broken record")
+                    continue
+                apply_op(goals, index, op)
+                count += 1
+        return count
+
+    def close(self):
+        with self._lock:
+            if self._f is not None:
+                self._f.close()
+                self._f = None
@@ -0,0 +1,206 @@
+"""Three-way merge of goal trees by id, used by the full-state sync.
+
+`base` is the tree both sides agreed on after the last successful sync,
+`local` and `remote` are the current copies. Every goal is matched by
+`id` and merged field by field: a field changed on one side only takes
+that side's value, a field changed on both sides to different values is
+a conflict that the later `last_modified` wins. Each tree is walked a
+constant number of times, so the merge is linear in the number of goals.
+
+Fields have no timestamps of their own: a goal stores one `last_modified`,
+and that is all the cloud copy, the journal, SQLite and the compact format
+carry. So a two-sided conflict on one field is decided by the goal's
+latest edit of any field - a later rename on one device wins a
+`completed` conflict for that device. One-sided changes never depend on
+it, and every two-sided conflict is reported (sync_conflicts.json).
+"""
+
+import gc
+
+from planner.tree import iter_goals
+
+FIELDS = ("name", "completed", "deadline", "weight", "manual_weights", "parent")
+_MISSING = object()
+
+
+class MergeReport:
+    """What the merge did. `local_changes` > 0 means the remote copy is
+    behind the merged tree (it has to be pushed), `remote_changes` > 0
+    means the local tree took something from the remote one."""
+
+    def __init__(self):
+        self.conflicts = []
+        self.local_changes = 0
+        self.remote_changes = 0
+
+    def conflict(self, goal, field, local, remote, kept):
+        self.conflicts.append({
+            "id": goal.id, "name": goal.name, "field": field,
+            "local": local, "remote": remote, "kept": kept,
+        })
+
+    def summary(self):
+        return {"conflicts": len(self.conflicts), "local_changes": self.local_changes,
+                "remote_changes": self.remote_changes}
+
+
+def _flatten(goals):
+    """id -> (goal, parent id, values of FIELDS) plus ids in pre-order."""
+    nodes = {}
+    order = []
+    for goal, parent in iter_goals(goals or []):
+        parent_id = parent.id if parent is not None else None
+        values = (goal.name, goal.completed, goal.deadline, goal.weight, goal.manual_weights, parent_id)
+        nodes[goal.id] = (goal, parent_id, values)
+        order.append(goal.id)
+    return nodes, order
+
+
+def _remote_wins(local, remote):
+    """Conflict tie-break by node `last_modified` (local wins a tie); the
+    node's time, not the field's: see the module docstring."""
+    lm, rm = local.last_modified, remote.last_modified
+    if rm is None:
+        return False
+    return lm is None or rm > lm
+
+
+def merge_trees(base, local, remote):
+    """Merge `remote` into the `local` list in place and return a MergeReport.
+
+    Local Goal objects are kept (and updated), goals that only exist on
+    the remote side are moved over from `remote`. A goal deleted on one
+    side and edited on the other is kept and reported; so are the deleted
+    parents of goals that survive the merge.
+    """
+    # millions of short-lived tuples: cyclic GC passes would double the time
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _merge(base, local, remote)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+
+def _merge(base, local, remote):
+    report = MergeReport()
+    b_nodes, _ = _flatten(base)
+    l_nodes, l_order = _flatten(local)
+    r_nodes, r_order = _flatten(remote)
+
+    merged = {}  # id -> (goal, parent id)
+    order = []
+
+    def keep(goal_id, goal, parent_id):
+        merged[goal_id] = (goal, parent_id)
+        order.append(goal_id)
+
+    for goal_id in l_order:
+        l = l_nodes[goal_id]
+        r = r_nodes.get(goal_id)
+        b = b_nodes.get(goal_id)
+        goal = l[0]
+        if r is None:
+            if b is None:
+                keep(goal_id, goal, l[1])  # added locally
+                report.local_changes += 1
+            elif l[2] != b[2]:
+                keep(goal_id, goal, l[1])
+                report.local_changes += 1
+                report.conflict(goal, "deleted", "edited", "deleted", "local")
+            else:
+                report.remote_changes += 1  # deleted remotely
+            continue
+        parent_id = l[1]
+        rg = r[0]
+        if l[2] == r[2]:
+            if _remote_wins(goal, rg):
+                goal.last_modified = rg.last_modified
+            keep(goal_id, goal, parent_id)
+            continue
+        for i, field in enumerate(FIELDS):
+            lv, rv = l[2][i], r[2][i]
+            if lv == rv:
+                continue
+            bv = b[2][i] if b is not None else _MISSING
+            if lv == bv:
+                take_remote = True
+            elif rv == bv:
+                take_remote = False
+            else:
+                take_remote = _remote_wins(goal, rg)
+                report.conflict(goal, field, lv, rv, "remote" if take_remote else "local")
+            if take_remote:
+                report.remote_changes += 1
+                if field == "parent":
+                    parent_id = rv
+                else:
+                    setattr(goal, field, rv)
+            else:
+                report.local_changes += 1
+        if _remote_wins(goal, rg):
+            goal.last_modified = rg.last_modified
+        keep(goal_id, goal, parent_id)
+
+    for goal_id in r_order:
+        if goal_id in l_nodes:
+            continue
+        r = r_nodes[goal_id]
+        b = b_nodes.get(goal_id)
+        goal = r[0]
+        if b is None:
+            keep(goal_id, goal, r[1])  # added remotely
+            report.remote_changes += 1
+        elif r[2] != b[2]:
+            keep(goal_id, goal, r[1])
+            report.remote_changes += 1
+            report.conflict(goal, "deleted", "deleted", "edited", "remote")
+        else:
+            report.local_changes += 1  # deleted locally
+
+    # goals that survived under a deleted parent bring the parent back
+    for goal_id in list(order):
+        parent_id = merged[goal_id][1]
+        while parent_id is not None and parent_id not in merged:
+            entry = l_nodes.get(parent_id) or r_nodes.get(parent_id)
+            if entry is None:
+                # parent unknown on both sides: make it top-level
+                merged[goal_id] = (merged[goal_id][0], None)
+                break
+            keep(parent_id, entry[0], entry[1])
+            report.local_changes += 1
+            report.remote_changes += 1
+            report.conflict(entry[0], "deleted", "restored", "restored", "both")
+            goal_id, parent_id = parent_id, entry[1]
+
+    children = {}
+    for goal_id in order:
+        goal, parent_id = merged[goal_id]
+        children.setdefault(parent_id, []).append(goal)
+
+    for goal_id in order:
+        goal = merged[goal_id][0]
+        subs = children.get(goal_id, [])
+        if not goal.manual_weights and subs and _mixed(subs, goal_id, l_nodes, r_nodes):
+            # children from both sides under an auto-weighted parent
+            equal = 1.0 / len(subs)
+            for s in subs:
+                s.weight = equal
+        goal.subgoals = subs
+
+    local[:] = children.get(None, [])
+    return report
+
+
+def _mixed(subs, parent_id, l_nodes, r_nodes):
+    """True when the merged children include goals added on each side."""
+    only_local = only_remote = False
+    for s in subs:
+        l = l_nodes.get(s.id)
+        r = r_nodes.get(s.id)
+        in_local = l is not None and l[1] == parent_id
+        in_remote = r is not None and r[1] == parent_id
+        only_local = only_local or not in_remote
+        only_remote = only_remote or not in_local
+    return only_local and only_remote
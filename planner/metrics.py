@@ -0,0 +1,187 @@
+"""Latency of event handlers and hot paths: rolling percentiles, JSON lines.
+
+Off unless METRICS=1. Disabled, `timed` returns the function itself, so
+instrumented code runs exactly as before. Enabled, every call adds one
+duration to the histogram of its name; `snapshot()` gives p50/p95/p99
+over the last WINDOW calls, and `start()` appends them to a JSON-lines
+file every few seconds (one line per name that had calls since the last
+line):
+
+    {"at": "...", "name": "toggle_completed", "count": 12, "window": 12,
+     "p50_ms": 1.9, "p95_ms": 4.2, "p99_ms": 4.8, "max_ms": 4.8, "mean_ms": 2.1}
+"""
+
+import atexit
+import functools
+import inspect
+import json
+import os
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+# percentiles are taken over this many latest calls of a name
+WINDOW = 1024
+
+
+class Histogram:
+    """The last WINDOW durations of one name (a ring buffer) plus totals."""
+
+    __slots__ = ("samples", "count", "total", "new")
+
+    def __init__(self):
+        self.samples = deque(maxlen=WINDOW)
+        self.count = 0
+        self.total = 0.0
+        # calls since the last dump
+        self.new = 0
+
+    def add(self, seconds):
+        self.samples.append(seconds)
+        self.count += 1
+        self.total += seconds
+        self.new += 1
+
+    def summary(self):
+        window = sorted(self.samples)
+        n = len(window)
+
+        def ms(seconds):
+            return round(seconds * 1e3, 3)
+
+        def pct(q):
+            return ms(window[min(n - 1, int(q * n))]) if n else 0.0
+
+        return {
+            "count": self.count,
+            "window": n,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": ms(window[-1]) if n else 0.0,
+            "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+        }
+
+
+class Metrics:
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self._lock = threading.Lock()
+        self._hist = {}
+        self._path = None
+        self._thread = None
+
+    def record(self, name, seconds):
+        with self._lock:
+            hist = self._hist.get(name)
+            if hist is None:
+                hist = self._hist[name] = Histogram()
+            hist.add(seconds)
+
+    def timed(self, name=None):
+        """Decorator: time every call under `name` (default: the function's
+        name). Works for coroutine functions too."""
+        def decorate(fn):
+            if not self.enabled:
+                return fn
+            label = name or fn.__name__
+            record = self.record
+            clock = time.perf_counter
+            if inspect.iscoroutinefunction(fn):
+                @functools.wraps(fn)
+                async def async_wrapper(*args, **kwargs):
+                    t = clock()
+                    try:
+                        return await fn(*args, **kwargs)
+                    finally:
+                        record(label, clock() - t)
+                return async_wrapper
+
+            @functools.wraps(fn)
+            def wrapper(*args, **kwargs):
+                t = clock()
+                try:
+                    return fn(*args, **kwargs)
+                finally:
+                    record(label, clock() - t)
+            return wrapper
+        return decorate
+
+    def wrap(self, name, fn):
+        """`fn` timed under `name` (e.g. a bound method such as page.update)."""
+        return self.timed(name)(fn)
+
+    def snapshot(self):
+        """name -> summary dict, sorted by name."""
+        with self._lock:
+            return {name: self._hist[name].summary() for name in sorted(self._hist)}
+
+    def dump(self, path=None):
+        """Append a line per name with calls since the last dump; returns how many."""
+        path = path or self._path
+        if path is None:
+            return 0
+        at = datetime.now().isoformat(timespec="seconds")
+        with self._lock:
+            lines = []
+            for name in sorted(self._hist):
+                hist = self._hist[name]
+                if not hist.new:
+                    continue
+                hist.new = 0
+                lines.append(json.dumps({"at": at, "name": name, **hist.summary()}, ensure_ascii=False))
+        if not lines:
+            return 0
+        try:
+            with open(path, "a", encoding="utf-8") as f:
+                f.write("\n".join(lines) + "\n")
+        except Exception as ex:
+            print("DEBUG: metrics dump failed:", ex)
+        return len(lines)
+
+    def start(self, path, interval=60.0):
+        """Dump to `path` every `interval` seconds and at exit (once per process)."""
+        with self._lock:
+            if not self.enabled or self._thread is not None:
+                return
+            self._path = path
+            self._thread = threading.Thread(target=self._run, args=(interval,), name="metrics", daemon=True)
+        self._thread.start()
+        atexit.register(self.dump)
+
+    def _run(self, interval):
+        while True:
+            time.sleep(interval)
+            self.dump()
+
+
+class Phases:
+    """Durations of consecutive steps of one run (e.g. startup): each `mark`
+    closes the step that began at the previous mark (or at creation)."""
+
+    def __init__(self, prefix, sink=None):
+        self.prefix = prefix
+        # a Metrics: every step is also recorded as "<prefix>.<step>"
+        self.sink = sink
+        self.started = self.last = time.perf_counter()
+        self.steps = []
+
+    def mark(self, step):
+        now = time.perf_counter()
+        seconds = now - self.last
+        self.last = now
+        self.steps.append((step, seconds))
+        if self.sink is not None and self.sink.enabled:
+            self.sink.record(f"{self.prefix}.{step}", seconds)
+        return seconds
+
+    def report(self):
+        """One line: every step and the total, in ms."""
+        parts = [f"{step} {seconds * 1e3:.0f} ms" for step, seconds in self.steps]
+        parts.append(f"total {(self.last - self.started) * 1e3:.0f} ms")
+        return f"{self.prefix}: " + ", ".join(parts)
+
+
+metrics = Metrics(enabled=os.environ.get("METRICS", "0") == "1")
+timed = metrics.timed
@@ -0,0 +1,218 @@
+"""Goal node model and its (de)serialization to the state.json schema.
+
+The JSON layout is unchanged: a list of goal objects with `id`, `name`,
+`completed`, `deadline`, `subgoals`, `last_modified` and optionally
+`weight` and `manual_weights`; datetimes are ISO strings.
+"""
+
+import codecs
+import json
+import re
+import uuid
+from datetime import datetime
+from itertools import accumulate
+
+DATE_FIELDS = ("deadline", "last_modified")
+
+
+class Goal:
+    """One goal or subgoal. `weight` is None for goals that never got one
+    (top-level goals); progress then counts it as 1.0."""
+
+    __slots__ = ("id", "name", "completed", "deadline", "subgoals",
+                 "weight", "manual_weights", "last_modified")
+
+    def __init__(self, name="", id=None, completed=False, deadline=None, subgoals=None,
+                 weight=None, manual_weights=False, last_modified=None):
+        self.id = id or uuid.uuid4().hex
+        self.name = name
+        self.completed = completed
+        self.deadline = deadline
+        self.subgoals = subgoals if subgoals is not None else []
+        self.weight = weight
+        self.manual_weights = manual_weights
+        self.last_modified = last_modified
+
+    def __repr__(self):
+        return f"Goal({self.name!r}, id={self.id!r}, subgoals={len(self.subgoals)})"
+
+    def to_dict(self):
+        """Shallow JSON-ready dict; `subgoals` still holds Goal objects."""
+        d = {
+            "id": self.id,
+            "name": self.name,
+            "completed": self.completed,
+            "deadline": self.deadline.isoformat() if self.deadline is not None else None,
+            "subgoals": self.subgoals,
+            "last_modified": self.last_modified.isoformat() if self.last_modified is not None else None,
+        }
+        if self.weight is not None:
+            d["weight"] = self.weight
+        if self.manual_weights:
+            d["manual_weights"] = True
+        return d
+
+
+def parse_datetime(v):
+    if v is None or isinstance(v, datetime):
+        return v
+    try:
+        return datetime.fromisoformat(v)
+    except (TypeError, ValueError):
+        return None
+
+
+def decode_field(key, value):
+    """Convert one JSON field value to what Goal stores."""
+    if key in DATE_FIELDS:
+        return parse_datetime(value)
+    return value
+
+
+def goal_from_dict(d, subgoals=None):
+    """Build a Goal from one JSON object. `subgoals` overrides d["subgoals"]."""
+    if subgoals is None:
+        subgoals = d.get("subgoals") or []
+    w = d.get("weight")
+    return Goal(
+        name=d.get("name", ""),
+        id=d.get("id"),
+        completed=bool(d.get("completed", False)),
+        deadline=parse_datetime(d.get("deadline")),
+        subgoals=subgoals,
+        weight=float(w) if w is not None else None,
+        manual_weights=bool(d.get("manual_weights", False)),
+        last_modified=parse_datetime(d.get("last_modified")),
+    )
+
+
+def goals_from_data(data):
+    """Goals from already parsed JSON (a list of dicts), without recursion."""
+    out = []
+    stack = [(d, out) for d in reversed(data or [])]
+    while stack:
+        d, target = stack.pop()
+        goal = goal_from_dict(d, subgoals=[])
+        target.append(goal)
+        subs = d.get("subgoals")
+        if subs:
+            stack.extend((s, goal.subgoals) for s in reversed(subs))
+    return out
+
+
+def json_default(o):
+    if isinstance(o, Goal):
+        return o.to_dict()
+    if isinstance(o, datetime):
+        return o.isoformat()
+    # fallback: for unsupported types, return string representation
+    return str(o)
+
+
+def dumps_goals(goals):
+    """state.json text for the tree: one json.dumps pass, Goal -> dict on the fly."""
+    return json.dumps(goals, ensure_ascii=False, default=json_default)
+
+
+def to_serializable(goals):
+    """JSON-compatible copy of the tree (plain dicts, ISO datetimes), e.g. for Supabase."""
+    return json.loads(dumps_goals(goals))
+
+
+def loads_goals(text):
+    """Parse state.json text straight into Goal objects (no second walk)."""
+    data = json.loads(text, object_hook=_goal_hook)
+    return [g for g in data if isinstance(g, Goal)] if isinstance(data, list) else []
+
+
+def _goal_hook(d):
+    # json calls this bottom-up, so d["subgoals"] already holds Goals
+    return goal_from_dict(d)
+
+
+_WS = re.compile(r"[ \t\n\r]*")
+_BRACKETS = re.compile(r"[\[\]{}]")
+_BRACKET_STEP = {"[": 1, "{": 1, "]": -1, "}": -1}
+
+
+def stream_goals(f, chunk_size=1 << 20):
+    """Top-level goals of state.json read from the binary file `f`, one at
+    a time as soon as each is complete.
+
+    The text is decoded chunk by chunk and every top-level element goes
+    through the same object_hook as `loads_goals`, so only the goals built
+    so far and the text of the element being read are in memory, never
+    the whole file. An element that does not fit in the buffer is read on
+    (each read twice the last) until its brackets close, and parsed again
+    only then; brackets inside names can make that guess early, which costs
+    another parse, never a wrong result. Raises ValueError on broken JSON
+    (the goals before it are yielded already).
+    """
+    decoder = json.JSONDecoder(object_hook=_goal_hook)
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    buf = ""
+    pos = 0
+    eof = False
+
+    def more(size):
+        nonlocal buf, pos, eof
+        data = f.read(size)
+        eof = not data
+        buf = buf[pos:] + utf8.decode(data, final=eof)
+        pos = 0
+
+    def peek():
+        # the next non-whitespace character, None at the end of the file
+        nonlocal pos
+        while True:
+            pos = _WS.match(buf, pos).end()
+            if pos < len(buf):
+                return buf[pos]
+            if eof:
+                return None
+            more(chunk_size)
+
+    if peek() != "[":
+        # not a list of goals: nothing to load (as in loads_goals)
+        return
+    pos += 1
+    if peek() == "]":
+        return
+    while True:
+        peek()
+        size = chunk_size
+        while True:
+            try:
+                value, end = decoder.raw_decode(buf, pos)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                # the element goes on past the buffer: read on until its
+                # brackets close instead of parsing it again after every read
+                more(size)
+                depth = 0
+                start = 0
+                while not eof:
+                    # running bracket depth over the new text, in C
+                    sums = list(accumulate(map(_BRACKET_STEP.__getitem__, _BRACKETS.findall(buf, start))))
+                    if sums and depth + min(sums) <= 0:
+                        break
+                    depth += sums[-1] if sums else 0
+                    start = len(buf)
+                    size *= 2
+                    more(size)
+                continue
+            if end == len(buf) and not eof and not isinstance(value, Goal):
+                # a number or literal may go on in the next chunk
+                more(size)
+                continue
+            break
+        pos = end
+        if isinstance(value, Goal):
+            yield value
+        c = peek()
+        if c == "]":
+            return
+        if c != ",":
+            raise ValueError(f"state.json: expected ',' or ']' at {pos}, got {c!r}")
+        pos += 1
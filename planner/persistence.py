@@ -0,0 +1,95 @@
+"""Background (write-behind) saving of the planner state."""
+
+import threading
+import time
+
+
+class StateWriter:
+    """Coalesces saves: the UI only calls `mark_dirty()`, a worker thread
+    calls `save()` once nothing changed for `delay` seconds (but at least
+    every `max_wait` seconds while changes keep coming).
+
+    `save` must return a falsy value when the write failed; the state then
+    stays dirty and is retried. `flush()` writes synchronously and is what
+    shutdown / disconnect handlers should call.
+    """
+
+    def __init__(self, save, delay=1.0, max_wait=10.0):
+        self._save = save
+        self.delay = delay
+        self.max_wait = max(max_wait, delay)
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._dirty = False
+        self._first_change = 0.0
+        self._last_change = 0.0
+        self._closed = False
+        self.writes = 0
+        self.requests = 0
+        self._thread = threading.Thread(target=self._run, name="state-writer", daemon=True)
+        self._thread.start()
+
+    @property
+    def dirty(self):
+        return self._dirty
+
+    def mark_dirty(self):
+        with self._cond:
+            now = time.monotonic()
+            if not self._dirty:
+                self._first_change = now
+            self._dirty = True
+            self._last_change = now
+            self.requests += 1
+            self._cond.notify()
+
+    def flush(self):
+        """Write now if there are unsaved changes."""
+        with self._cond:
+            if not self._dirty:
+                return
+            self._dirty = False
+        self._write()
+
+    def close(self):
+        self.flush()
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                while not self._dirty and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                while self._dirty and not self._closed:
+                    now = time.monotonic()
+                    due = min(self._last_change + self.delay, self._first_change + self.max_wait)
+                    if now >= due:
+                        break
+                    self._cond.wait(due - now)
+                if not self._dirty or self._closed:
+                    # flushed meanwhile, or close() does the final write
+                    continue
+                self._dirty = False
+            self._write()
+
+    def _write(self):
+        with self._write_lock:
+            try:
+                ok = self._save()
+            except Exception as ex:
+                print("DEBUG: StateWriter save failed:", ex)
+                ok = False
+            if ok:
+                self.writes += 1
+                return
+        # keep the changes for the next attempt
+        with self._cond:
+            if not self._dirty:
+                self._first_change = time.monotonic()
+            self._dirty = True
+            self._last_change = time.monotonic()
+            self._cond.notify()
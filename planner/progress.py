@@ -0,0 +1,262 @@
+"""Cached goal progress that is updated along the ancestor path only."""
+
+from planner.tree import iter_goals
+from planner.weights import MIN_WEIGHT
+
+
+class ProgressEngine:
+    """Keeps the weighted progress of every goal, keyed by goal `id`.
+
+    A leaf counts as 1.0 when completed, a goal with subgoals as
+    min(sum(progress(s) * max(0.01, weight(s))), 1.0), where weight(s) is
+    1/n under an auto-weighted parent and the stored weight under a manual
+    one (planner/weights.py). Every parent keeps running sums over its
+    children - progress, progress * weight and stored weight - so a change
+    costs O(1) per ancestor no matter how many siblings there are, and
+    `weight_total` answers the capping question without a sibling walk.
+    Parents come from the shared GoalIndex, so it has to be updated before
+    attach/changed.
+
+    With lazy loading some goals are in memory without their subgoals:
+    their ids are in `opaque` and their progress is whatever `seed` set
+    (the value stored with the goal). With `track` on, values set by
+    changed/attach are collected in `dirty` so they can be stored.
+    """
+
+    def __init__(self, index, goals=None):
+        self.index = index
+        self._progress = {}
+        # parent id -> [sum of progress, sum of progress * weight, sum of stored weights]
+        self._sums = {}
+        # child id -> (progress, stored weight) as added to its parent's sums
+        self._counted = {}
+        self.opaque = set()
+        self.track = False
+        self.dirty = {}
+        if goals is not None:
+            self.rebuild(goals)
+
+    def rebuild(self, goals):
+        self._progress.clear()
+        self._sums.clear()
+        self._counted.clear()
+        self._fill(goals)
+
+    def _fill(self, goals):
+        order = [goal for goal, _ in iter_goals(goals)]
+        # children come after their parent in pre-order, so walk backwards
+        for goal in reversed(order):
+            if goal.subgoals:
+                self._count_all(goal)
+            self._progress[goal.id] = self._compute(goal)
+
+    def _count_all(self, parent):
+        """Sums of `parent` from scratch (children without a value are filled)."""
+        cache = self._progress
+        counted = self._counted
+        psum = wsum = wtotal = 0.0
+        for s in parent.subgoals:
+            p = cache.get(s.id)
+            if p is None:
+                self._fill([s])
+                p = cache[s.id]
+            w = s.weight
+            counted[s.id] = (p, w)
+            psum += p
+            wsum += p * max(MIN_WEIGHT, w if w is not None else 1.0)
+            wtotal += w or 0.0
+        self._sums[parent.id] = [psum, wsum, wtotal]
+
+    def _compute(self, goal):
+        n = len(goal.subgoals)
+        if n:
+            sums = self._sums.get(goal.id)
+            if sums is None:
+                self._count_all(goal)
+                sums = self._sums[goal.id]
+            return _combine(goal, n, sums[0], sums[1])
+        if goal.id in self.opaque:
+            # subgoals not loaded: keep the stored value
+            return self._progress.get(goal.id, 0.0)
+        return 1.0 if goal.completed else 0.0
+
+    def _recount(self, parent, child):
+        """Bring `parent`'s sums in line with `child`'s progress and stored
+        weight. False when nothing the parent depends on changed."""
+        sums = self._sums.get(parent.id)
+        if sums is None:
+            self._count_all(parent)
+            return True
+        p = self._progress.get(child.id, 0.0)
+        new = (p, child.weight)
+        old = self._counted.get(child.id)
+        if old == new:
+            return False
+        self._counted[child.id] = new
+        if old is not None:
+            self._add(sums, old, -1.0)
+        self._add(sums, new, 1.0)
+        return True
+
+    @staticmethod
+    def _add(sums, entry, sign):
+        p, w = entry
+        sums[0] += sign * p
+        sums[1] += sign * p * max(MIN_WEIGHT, w if w is not None else 1.0)
+        sums[2] += sign * (w or 0.0)
+        # running sums pick up rounding noise; keep it from showing as 99%
+        sums[0] = round(sums[0], 12)
+        sums[1] = round(sums[1], 12)
+        sums[2] = round(sums[2], 12)
+
+    def _uncount(self, parent, child):
+        old = self._counted.pop(child.id, None)
+        sums = self._sums.get(parent.id)
+        if old is not None and sums is not None:
+            self._add(sums, old, -1.0)
+
+    def _set(self, goal_id, value):
+        if self.track and self._progress.get(goal_id) != value:
+            self.dirty[goal_id] = value
+        self._progress[goal_id] = value
+
+    def progress(self, goal):
+        p = self._progress.get(goal.id)
+        if p is None:
+            self._fill([goal])
+            p = self._progress[goal.id]
+        return p
+
+    def weight_total(self, parent, excluding=None):
+        """Sum of the stored weights (None as 0) of `parent`'s children,
+        without `excluding`; O(1) once the parent is counted."""
+        sums = self._sums.get(parent.id)
+        if sums is None:
+            self._count_all(parent)
+            sums = self._sums[parent.id]
+        total = sums[2]
+        if excluding is not None:
+            counted = self._counted.get(excluding.id)
+            if counted is not None:
+                total -= counted[1] or 0.0
+        return total
+
+    def values(self):
+        """id -> progress of every goal computed so far."""
+        return self._progress
+
+    def seed(self, goal_id, value):
+        """Use a stored value for a goal whose subgoals are not loaded."""
+        self._progress[goal_id] = value
+
+    def forget(self, goal_id):
+        """Drop a goal that was unloaded from memory (not deleted)."""
+        self._progress.pop(goal_id, None)
+        self._sums.pop(goal_id, None)
+        self._counted.pop(goal_id, None)
+        self.opaque.discard(goal_id)
+
+    def unload(self, goal):
+        """`goal`'s subgoals leave memory: keep its value, forget theirs."""
+        for s in goal.subgoals:
+            for g, _ in iter_goals([s]):
+                self.forget(g.id)
+        self._sums.pop(goal.id, None)
+        self.opaque.add(goal.id)
+
+    def loaded(self, goal):
+        """`goal`'s subgoals were loaded: count them."""
+        self.opaque.discard(goal.id)
+        if goal.subgoals:
+            self._count_all(goal)
+
+    def recount(self, parent):
+        """Recount `parent` after many children changed at once (e.g. all weights)."""
+        self._count_all(parent)
+        self.changed(parent)
+
+    def changed(self, goal):
+        """Recompute `goal` (completed, weight or subgoals changed) and its ancestors."""
+        self._set(goal.id, self._compute(goal))
+        child = goal
+        parent = self.index.parent(goal)
+        # the parent always needs a pass: goal's weight may have changed
+        while parent is not None:
+            if not self._recount(parent, child):
+                break
+            pid = parent.id
+            old = self._progress.get(pid)
+            new = self._compute(parent)
+            self._set(pid, new)
+            if new == old:
+                break
+            child = parent
+            parent = self.index.parent(parent)
+
+    def attach(self, goal):
+        """Account for a newly added goal (already in the index)."""
+        self._fill([goal])
+        if self.track:
+            for g, _ in iter_goals([goal]):
+                self.dirty[g.id] = self._progress[g.id]
+        parent = self.index.parent(goal)
+        if parent is not None:
+            self._recount(parent, goal)
+            self.changed(parent)
+
+    def detach(self, goal, parent):
+        """Forget a goal removed from `parent` (None for a top-level goal)."""
+        if parent is not None:
+            self._uncount(parent, goal)
+        for g, _ in iter_goals([goal]):
+            self._progress.pop(g.id, None)
+            self._sums.pop(g.id, None)
+            self._counted.pop(g.id, None)
+            self.dirty.pop(g.id, None)
+            self.opaque.discard(g.id)
+        if parent is not None:
+            self.changed(parent)
+
+
+def _combine(goal, n, psum, wsum):
+    """Progress of `goal` with `n` subgoals from the sum of their progress
+    and the sum of progress * max(0.01, stored weight)."""
+    if goal.manual_weights:
+        total = wsum
+    elif n * MIN_WEIGHT <= 1.0:
+        # implicit equal shares: sum(p * 1/n), divided once so that
+        # n completed children give exactly 1.0
+        total = psum / n
+    else:
+        total = psum * MIN_WEIGHT
+    return min(total, 1.0)
+
+
+def subtree_progress(goal):
+    """Progress of `goal` from scratch, without an index or an engine (e.g.
+    for a goal that was just read while the store is still loading).
+
+    One post-order pass; only the path to the current goal is kept, each
+    entry with the running sums of the children seen so far."""
+    if not goal.subgoals:
+        return 1.0 if goal.completed else 0.0
+    # [goal, iterator over its subgoals, sum of progress, sum of progress * weight]
+    stack = [[goal, iter(goal.subgoals), 0.0, 0.0]]
+    while True:
+        top = stack[-1]
+        child = next(top[1], None)
+        if child is not None and child.subgoals:
+            stack.append([child, iter(child.subgoals), 0.0, 0.0])
+            continue
+        if child is not None:
+            p = 1.0 if child.completed else 0.0
+        else:
+            stack.pop()
+            child = top[0]
+            p = _combine(child, len(child.subgoals), top[2], top[3])
+            if not stack:
+                return p
+            top = stack[-1]
+        w = child.weight
+        top[2] += p
+        top[3] += p * max(MIN_WEIGHT, w if w is not None else 1.0)
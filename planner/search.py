@@ -0,0 +1,158 @@
+"""Search over goal names: an inverted index of words with prefix lookup."""
+
+import re
+from bisect import bisect_left, insort
+
+from planner.tree import iter_goals
+
+_WORD = re.compile(r"\w+")
+
+
+def fold(text):
+    """Case-insensitive form of `text`; "ё" matches "е" as Russian readers expect."""
+    return text.casefold().replace("ё", "е")
+
+
+def words(text):
+    return _WORD.findall(fold(text or ""))
+
+
+class SearchIndex:
+    """word -> ids of the goals whose name contains it, plus the sorted list
+    of words, so all words starting with a prefix are one bisect away.
+
+    A query matches goals that have, for every query word, a name word
+    starting with it. Like DeadlineIndex it is patched by add/update/remove
+    on edits; an index that was never built ignores those and is built
+    from scratch (`rebuild`) by its owner before the first query.
+    """
+
+    def __init__(self):
+        self._postings = {}
+        self._words = []
+        self._names = {}
+        self.built = False
+
+    def rebuild(self, pairs):
+        """Index (id, name) pairs from scratch."""
+        postings = {}
+        names = {}
+        for goal_id, name in pairs:
+            names[goal_id] = name
+            for w in set(words(name)):
+                ids = postings.get(w)
+                if ids is None:
+                    postings[w] = {goal_id}
+                else:
+                    ids.add(goal_id)
+        self._postings = postings
+        self._names = names
+        self._words = sorted(postings)
+        self.built = True
+
+    def clear(self):
+        """Drop everything; the owner rebuilds before the next query."""
+        self._postings = {}
+        self._words = []
+        self._names = {}
+        self.built = False
+
+    def add(self, goal):
+        """Index `goal` and its subtree."""
+        if not self.built:
+            return
+        for g, _ in iter_goals([goal]):
+            self._set(g.id, g.name)
+
+    def update(self, goal):
+        """Re-index one goal after a rename."""
+        if self.built:
+            self._set(goal.id, goal.name)
+
+    def remove(self, goal):
+        """Forget `goal` and its subtree."""
+        if not self.built:
+            return
+        for g, _ in iter_goals([goal]):
+            self.discard(g.id)
+
+    def discard(self, goal_id):
+        name = self._names.pop(goal_id, None)
+        if name is None:
+            return
+        for w in set(words(name)):
+            self._unlink(w, goal_id)
+
+    def _set(self, goal_id, name):
+        old = self._names.get(goal_id)
+        if old == name:
+            return
+        old_words = set(words(old)) if old is not None else set()
+        new_words = set(words(name))
+        for w in old_words - new_words:
+            self._unlink(w, goal_id)
+        for w in new_words - old_words:
+            ids = self._postings.get(w)
+            if ids is None:
+                self._postings[w] = {goal_id}
+                insort(self._words, w)
+            else:
+                ids.add(goal_id)
+        self._names[goal_id] = name
+
+    def _unlink(self, word, goal_id):
+        ids = self._postings.get(word)
+        if ids is None:
+            return
+        ids.discard(goal_id)
+        if not ids:
+            del self._postings[word]
+            i = bisect_left(self._words, word)
+            if i < len(self._words) and self._words[i] == word:
+                del self._words[i]
+
+    def _starting_with(self, prefix):
+        all_words = self._words
+        i = bisect_left(all_words, prefix)
+        while i < len(all_words) and all_words[i].startswith(prefix):
+            yield all_words[i]
+            i += 1
+
+    def name(self, goal_id):
+        return self._names.get(goal_id)
+
+    def __len__(self):
+        return len(self._names)
+
+    def query(self, text, limit=50):
+        """Ids of up to `limit` goals matching every word of `text` as a
+        prefix; goals with the whole word come before longer words."""
+        wanted = words(text)
+        if not wanted:
+            return []
+        # the word with the fewest matching goals picks the candidates, the
+        # others are checked against each candidate's name
+        sizes = {}
+        for w in wanted:
+            sizes[w] = sum(len(self._postings[v]) for v in self._starting_with(w))
+            if not sizes[w]:
+                return []
+        wanted.sort(key=sizes.get)
+        first, rest = wanted[0], wanted[1:]
+        found = []
+        seen = set()
+        for w in self._starting_with(first):
+            for goal_id in self._postings[w]:
+                if goal_id in seen:
+                    continue
+                seen.add(goal_id)
+                if rest and not self._matches(goal_id, rest):
+                    continue
+                found.append(goal_id)
+                if len(found) >= limit:
+                    return found
+        return found
+
+    def _matches(self, goal_id, prefixes):
+        name_words = words(self._names.get(goal_id))
+        return all(any(w.startswith(p) for w in name_words) for p in prefixes)
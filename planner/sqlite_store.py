@@ -0,0 +1,331 @@
+"""SQLite storage for goals (STORAGE_MODE=sqlite).
+
+One row per goal in `goals.db` next to state.json:
+
+    goals(id, parent_id, position, name, completed, weight, deadline,
+          last_modified, manual_weights, progress)
+
+with indexes on `parent_id` (children of one goal, in order) and
+`deadline`. `progress` is the goal's aggregated progress as the
+ProgressEngine computed it, so one level can be shown without reading
+the levels below it (LAZY_LOAD). Mutations arrive as the same records the journal uses
+(planner/journal.py) and each one is its own small transaction, so an
+edit touches one row (or the rows of one subtree) instead of rewriting
+the whole file. Datetimes are stored as ISO strings.
+"""
+
+import sqlite3
+import threading
+
+from planner.model import Goal, decode_field, goals_from_data, parse_datetime
+from planner.tree import iter_goals
+
+SCHEMA = """
+create table if not exists goals (
+    id text primary key,
+    parent_id text,
+    position integer not null default 0,
+    name text not null default '',
+    completed integer not null default 0,
+    weight real,
+    deadline text,
+    last_modified text,
+    manual_weights integer not null default 0,
+    progress real
+);
+create index if not exists goals_parent on goals (parent_id, position);
+create index if not exists goals_deadline on goals (deadline) where deadline is not null;
+create table if not exists meta (key text primary key, value text);
+"""
+
+COLUMNS = ("id", "parent_id", "position", "name", "completed", "weight",
+           "deadline", "last_modified", "manual_weights")
+_INSERT = "insert or replace into goals (%s, progress) values (%s)" % (
+    ", ".join(COLUMNS), ", ".join("?" * (len(COLUMNS) + 1)))
+# journal "update" fields that map to a column
+UPDATABLE = ("name", "completed", "weight", "deadline", "last_modified", "manual_weights")
+
+_SUBTREE = """
+with recursive sub(id) as (
+    select ? union all select g.id from goals g join sub on g.parent_id = sub.id
+)
+"""
+_ANCESTORS = """
+with recursive up(id, parent_id) as (
+    select id, parent_id from goals where id = ?
+    union all select g.id, g.parent_id from goals g join up on g.id = up.parent_id
+)
+"""
+
+
+def _iso(dt):
+    return dt.isoformat() if dt is not None else None
+
+
+def _db_value(key, value):
+    """A journal field value (datetime, bool or ISO string) as stored in a column."""
+    if key in ("deadline", "last_modified"):
+        return _iso(parse_datetime(value))
+    if key in ("completed", "manual_weights"):
+        return 1 if value else 0
+    return value
+
+
+def _row(goal, parent_id, position, progress=None):
+    return (goal.id, parent_id, position, goal.name, 1 if goal.completed else 0, goal.weight,
+            _iso(goal.deadline), _iso(goal.last_modified), 1 if goal.manual_weights else 0, progress)
+
+
+def _goal(row):
+    # row: COLUMNS order
+    w = row[5]
+    return Goal(
+        row[3],
+        id=row[0],
+        completed=bool(row[4]),
+        deadline=parse_datetime(row[6]),
+        weight=float(w) if w is not None else None,
+        manual_weights=bool(row[8]),
+        last_modified=parse_datetime(row[7]),
+    )
+
+
+class SqliteStorage:
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        # handlers, the writer thread and sync all use the one connection
+        self.conn = sqlite3.connect(str(path), check_same_thread=False, isolation_level=None)
+        self.conn.execute("pragma journal_mode=wal")
+        self.conn.execute("pragma synchronous=normal")
+        self.conn.executescript(SCHEMA)
+        columns = [row[1] for row in self.conn.execute("pragma table_info(goals)")]
+        if "progress" not in columns:
+            # goals.db from before the progress column
+            self.conn.execute("alter table goals add column progress real")
+
+    def close(self):
+        with self._lock:
+            self.conn.close()
+
+    def _tx(self, fn, *args):
+        with self._lock:
+            cur = self.conn.cursor()
+            cur.execute("begin")
+            try:
+                result = fn(cur, *args)
+            except Exception:
+                cur.execute("rollback")
+                raise
+            cur.execute("commit")
+            return result
+
+    # --- meta / migration -------------------------------------------------
+
+    def get_meta(self, key):
+        with self._lock:
+            row = self.conn.execute("select value from meta where key = ?", (key,)).fetchone()
+        return row[0] if row else None
+
+    def set_meta(self, key, value):
+        with self._lock:
+            self.conn.execute("insert or replace into meta (key, value) values (?, ?)", (key, value))
+
+    def migrate_from(self, goals, source):
+        """One-shot import of a loaded state.json tree; later calls do nothing."""
+        if self.get_meta("migrated_from") is not None:
+            return False
+        def run(cur):
+            cur.execute("delete from goals")
+            cur.executemany(_INSERT, self._rows(goals))
+            cur.execute("insert or replace into meta (key, value) values ('migrated_from', ?)", (str(source),))
+        self._tx(run)
+        return True
+
+    # --- reading ----------------------------------------------------------
+
+    def count(self):
+        with self._lock:
+            return self.conn.execute("select count(*) from goals").fetchone()[0]
+
+    def load_all(self):
+        """The whole tree, children in `position` order."""
+        with self._lock:
+            rows = self.conn.execute(
+                "select %s from goals order by parent_id, position" % ", ".join(COLUMNS)).fetchall()
+        nodes = {}
+        children = {}
+        for row in rows:
+            goal = _goal(row)
+            nodes[goal.id] = goal
+            children.setdefault(row[1], []).append(goal)
+        for goal_id, subs in children.items():
+            parent = nodes.get(goal_id)
+            if parent is not None:
+                parent.subgoals = subs
+        return children.get(None, [])
+
+    def load_children(self, parent_id):
+        """Goals directly under `parent_id` (None: top level), without their subgoals."""
+        with self._lock:
+            if parent_id is None:
+                rows = self.conn.execute(
+                    "select %s from goals where parent_id is null order by position" % ", ".join(COLUMNS)).fetchall()
+            else:
+                rows = self.conn.execute(
+                    "select %s from goals where parent_id = ? order by position" % ", ".join(COLUMNS),
+                    (parent_id,)).fetchall()
+        return [_goal(row) for row in rows]
+
+    def load_level(self, parent_id):
+        """(goal, stored progress, has subgoals) for the goals directly under `parent_id`."""
+        sql = ("select %s, progress, exists(select 1 from goals c where c.parent_id = g.id) "
+               "from goals g where g.parent_id %s order by g.position"
+               % (", ".join("g." + c for c in COLUMNS), "is null" if parent_id is None else "= ?"))
+        with self._lock:
+            rows = self.conn.execute(sql, () if parent_id is None else (parent_id,)).fetchall()
+        n = len(COLUMNS)
+        return [(_goal(row), row[n], bool(row[n + 1])) for row in rows]
+
+    # --- writing ----------------------------------------------------------
+
+    @staticmethod
+    def _rows(goals, start=0, progress=None):
+        """Rows for `goals` and their subtrees; `goals` get positions from `start`.
+        `progress` (id -> value) fills the progress column."""
+        position = {id(g): start + i for i, g in enumerate(goals)}
+        rows = []
+        # pre-order: a goal's position is known before it is reached
+        for goal, parent in iter_goals(goals):
+            for i, s in enumerate(goal.subgoals):
+                position[id(s)] = i
+            rows.append(_row(goal, parent.id if parent is not None else None, position[id(goal)],
+                             progress.get(goal.id) if progress is not None else None))
+        return rows
+
+    def save_all(self, goals, progress=None):
+        """Replace every row (after the whole tree was replaced, e.g. by sync)."""
+        def run(cur):
+            cur.execute("delete from goals")
+            cur.executemany(_INSERT, self._rows(goals, progress=progress))
+        self._tx(run)
+        return True
+
+    def save_progress(self, items):
+        """Store aggregated progress: `items` are (id, progress) pairs."""
+        self._tx(lambda cur: cur.executemany(
+            "update goals set progress = ? where id = ?", [(p, goal_id) for goal_id, p in items]))
+
+    def apply(self, op):
+        """Store one journal record in its own transaction."""
+        kind = op.get("op")
+        if kind == "add":
+            self._tx(self._add, op)
+        elif kind == "update":
+            fields = [(k, _db_value(k, v)) for k, v in op["fields"].items() if k in UPDATABLE]
+            if fields:
+                sql = "update goals set %s where id = ?" % ", ".join(f"{k} = ?" for k, _ in fields)
+                self._tx(lambda cur: cur.execute(sql, [v for _, v in fields] + [op["id"]]))
+        elif kind == "delete":
+            self._tx(lambda cur: cur.execute(
+                _SUBTREE + "delete from goals where id in (select id from sub)", (op["id"],)))
+        elif kind == "touch":
+            at = _db_value("last_modified", op["at"])
+            self._tx(lambda cur: cur.execute(
+                _ANCESTORS + "update goals set last_modified = ? "
+                "where id in (select parent_id from up where parent_id is not null)",
+                (op["id"], at)))
+        elif kind == "normalize":
+            self._tx(self._normalize, op)
+
+    def _add(self, cur, op):
+        goal = op["goal"]
+        if not isinstance(goal, Goal):
+            goal = goals_from_data([goal])[0]
+        parent_id = op.get("parent")
+        if parent_id is None:
+            cur.execute("select coalesce(max(position) + 1, 0) from goals where parent_id is null")
+        else:
+            cur.execute("select coalesce(max(position) + 1, 0) from goals where parent_id = ?", (parent_id,))
+        start = cur.fetchone()[0]
+        rows = []
+        for row in self._rows([goal], start=start):
+            if row[0] == goal.id:
+                row = (row[0], parent_id) + row[2:]
+            rows.append(row)
+        cur.executemany(_INSERT, rows)
+
+    def _normalize(self, cur, op):
+        if "ids" in op:
+            at = _db_value("last_modified", op["at"])
+            cur.executemany("update goals set weight = ?, last_modified = ? where id = ?",
+                            [(op["weight"], at, goal_id) for goal_id in op["ids"]])
+            return
+        cur.execute("select count(*) from goals where parent_id = ?", (op["id"],))
+        n = cur.fetchone()[0]
+        if not n:
+            return
+        equal = 1.0 / n
+        if op.get("at"):
+            at = _db_value("last_modified", op["at"])
+            cur.execute("update goals set weight = ?, last_modified = ? "
+                        "where parent_id = ? and (weight is null or weight != ?)",
+                        (equal, at, op["id"], equal))
+        else:
+            cur.execute("update goals set weight = ? where parent_id = ?", (equal, op["id"]))
+
+    # --- queries ----------------------------------------------------------
+
+    def deadlines_between(self, start, end):
+        """(id, deadline) of goals due in [start, end), by the deadline index."""
+        with self._lock:
+            rows = self.conn.execute(
+                "select id, deadline from goals where deadline >= ? and deadline < ? order by deadline",
+                (_iso(start), _iso(end))).fetchall()
+        return [(goal_id, decode_field("deadline", d)) for goal_id, d in rows]
+
+    def goals_due(self, start=None, end=None, limit=50, latest_first=False, open_only=True):
+        """Goals due in [start, end) (not completed ones with `open_only`), without subgoals."""
+        where = ["deadline is not null"]
+        if open_only:
+            where.append("completed = 0")
+        args = []
+        if start is not None:
+            where.append("deadline >= ?")
+            args.append(_iso(start))
+        if end is not None:
+            where.append("deadline < ?")
+            args.append(_iso(end))
+        sql = "select %s from goals where %s order by deadline %s limit ?" % (
+            ", ".join(COLUMNS), " and ".join(where), "desc" if latest_first else "asc")
+        with self._lock:
+            rows = self.conn.execute(sql, args + [limit]).fetchall()
+        return [_goal(row) for row in rows]
+
+    def next_deadline(self, after):
+        """The earliest deadline >= `after`, or None."""
+        with self._lock:
+            row = self.conn.execute("select min(deadline) from goals where deadline >= ?",
+                                    (_iso(after),)).fetchone()
+        return decode_field("deadline", row[0]) if row and row[0] else None
+
+    def names(self):
+        """(id, name) of every goal, for the search index."""
+        with self._lock:
+            return self.conn.execute("select id, name from goals").fetchall()
+
+    def existing(self, ids):
+        """The subset of `ids` that still has a row."""
+        ids = list(ids)
+        if not ids:
+            return set()
+        with self._lock:
+            rows = self.conn.execute("select id from goals where id in (%s)" % ", ".join("?" * len(ids)),
+                                     ids).fetchall()
+        return {row[0] for row in rows}
+
+    def path_ids(self, goal_id):
+        """Ids from the top level down to `goal_id` ([] if it does not exist)."""
+        with self._lock:
+            rows = self.conn.execute(_ANCESTORS + "select id from up", (goal_id,)).fetchall()
+        return [row[0] for row in reversed(rows)]
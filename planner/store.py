@@ -0,0 +1,434 @@
+"""Process-wide goal state shared by all sessions.
+
+In web mode Flet calls main(page) once per browser tab. Every tab gets
+the same SharedStore for a given state file, so the tree is loaded once,
+kept in memory once and written by a single StateWriter. Mutations run
+under `store.lock`; afterwards `broadcast` tells the other sessions to
+redraw what they show.
+
+With `lazy` (SQLite only) the store starts with the top level and loads
+the subgoals of a goal when a session opens it (`visit`). Goals that no
+session shows are unloaded again once more than `cache_levels` opened
+goals are in memory. Progress of a goal whose subgoals are not loaded
+comes from the `progress` column, which the store keeps up to date.
+"""
+
+import atexit
+import threading
+import traceback
+from collections import OrderedDict
+from pathlib import Path
+
+from planner.codec import dumps_state, read_state
+from planner.deadlines import DeadlineIndex
+from planner.index import GoalIndex
+from planner.journal import Journal
+from planner.metrics import timed
+from planner.persistence import StateWriter
+from planner.progress import ProgressEngine
+from planner.search import SearchIndex
+from planner.sqlite_store import SqliteStorage
+from planner.tree import iter_goals
+
+
+class SharedStore:
+    def __init__(self, state_file, storage_mode="snapshot", compact=False,
+                 save_delay=1.0, journal_max_kb=1024, lazy=False, cache_levels=32, on_goal=None):
+        self.state_file = Path(state_file)
+        # called (in the loading thread) with each top-level goal read from
+        # state.json, before the store is ready: a preview for the first screen
+        self.on_goal = on_goal
+        self.compact = compact
+        self.lock = threading.RLock()
+        self.journal = None
+        self.db = None
+        # the db only needs a full rewrite after the whole tree was replaced
+        self._db_replace = False
+        if storage_mode == "journal":
+            self.journal = Journal(self.state_file.with_suffix('.journal'), max_bytes=journal_max_kb * 1024)
+        elif storage_mode == "sqlite":
+            self.db = SqliteStorage(self.state_file.with_name("goals.db"))
+        elif lazy:
+            print("DEBUG: LAZY_LOAD needs STORAGE_MODE=sqlite, loading the whole tree")
+        self.lazy = lazy and self.db is not None
+        self.cache_levels = max(1, cache_levels)
+        # ids of goals whose subgoals were loaded on demand, least recent first
+        self._expanded = OrderedDict()
+        # session token -> ids of the goals on its navigation path
+        self._paths = {}
+        self.goals = self.load()
+        # only for the first load: it belongs to the session that started it
+        self.on_goal = None
+        self.index = GoalIndex(self.goals)
+        if self.lazy:
+            self.progress = ProgressEngine(self.index)
+            self.goals[:] = self._load_level(None)
+            self.index.rebuild(self.goals)
+        else:
+            self.progress = ProgressEngine(self.index, self.goals)
+        # lazy mode asks the db's deadline index instead (see `due`)
+        self.deadlines = DeadlineIndex(self.goals)
+        # built on the first search, not at startup
+        self.search = SearchIndex()
+        self._progress_clean = False
+        if self.db is not None:
+            # store progress changes with the next save
+            self.progress.track = True
+            self._progress_clean = self.db.get_meta("progress_clean") == "1"
+            if not self._progress_clean:
+                self.progress.dirty.update(self.progress.values())
+        if self.journal is not None:
+            self.writer = StateWriter(self._checkpoint, delay=save_delay)
+        else:
+            self.writer = StateWriter(self.save, delay=save_delay)
+        atexit.register(self.writer.close)
+        if self.progress.dirty:
+            self.writer.mark_dirty()
+        # bumped by every recorded mutation; sessions compare it to see changes
+        self.version = 0
+        # local changes that are not in the cloud yet (see main.do_sync)
+        self.sync_dirty = False
+        self.sync_running = False
+        self._subscribers = {}
+        self._next_token = 0
+
+    def load(self):
+        if self.db is not None:
+            return self._load_db()
+        return self._load_file()
+
+    def _load_db(self):
+        if self.db.get_meta("migrated_from") is None:
+            # first start with SQLite: import state.json (and a leftover journal) once
+            legacy = self._load_file()
+            journal_path = self.state_file.with_suffix('.journal')
+            if journal_path.exists():
+                try:
+                    Journal(journal_path).replay(legacy, GoalIndex(legacy))
+                except Exception as ex:
+                    print("DEBUG: journal replay failed:", ex)
+            self.db.migrate_from(legacy, self.state_file)
+            print(f"DEBUG: migrated {self.db.count()} goals from {self.state_file.name} to SQLite")
+        if self.db.get_meta("progress_clean") != "1":
+            # new database or progress not stored after the last edits
+            goals = self.db.load_all()
+            if self.lazy:
+                values = ProgressEngine(GoalIndex(goals), goals).values()
+                self.db.save_progress(values.items())
+                self.db.set_meta("progress_clean", "1")
+                return []
+            return goals
+        if self.lazy:
+            return []
+        return self.db.load_all()
+
+    def _load_level(self, parent):
+        """Goals under `parent` (None: top level) read from the db; the ones
+        with subgoals stay opaque with their stored progress."""
+        goals = []
+        for goal, progress, has_subgoals in self.db.load_level(parent.id if parent is not None else None):
+            goals.append(goal)
+            if has_subgoals:
+                self.progress.opaque.add(goal.id)
+                self.progress.seed(goal.id, progress or 0.0)
+        return goals
+
+    def visit(self, token, goal, path=()):
+        """A session shows `goal` (None: top level) reached through `path`:
+        load its subgoals if needed and keep the path in memory."""
+        with self.lock:
+            self._paths[token] = {g.id for g in path if g is not None}
+            if goal is None:
+                return
+            self._paths[token].add(goal.id)
+            if self.lazy:
+                self._expand(goal)
+                self.trim()
+
+    def _expand(self, goal):
+        """Load the subgoals of `goal` if they are not in memory."""
+        if goal.id in self.progress.opaque:
+            goal.subgoals = self._load_level(goal)
+            for s in goal.subgoals:
+                self.index.add(s, goal)
+                self.deadlines.add(s)
+            self.progress.loaded(goal)
+        self._expanded[goal.id] = True
+        self._expanded.move_to_end(goal.id)
+
+    def reveal(self, goal_id):
+        """Goals from the top level down to `goal_id` (None if it is gone);
+        in lazy mode the levels on the way are loaded."""
+        with self.lock:
+            goal = self.index.get(goal_id)
+            if goal is None and self.lazy:
+                for ancestor_id in self.db.path_ids(goal_id)[:-1]:
+                    ancestor = self.index.get(ancestor_id)
+                    if ancestor is None:
+                        return None
+                    self._expand(ancestor)
+                goal = self.index.get(goal_id)
+            return self.index.path(goal) if goal is not None else None
+
+    def due(self, start=None, end=None, limit=50, latest_first=False, open_only=True):
+        """Goals with start <= deadline < end, earliest first (latest first
+        with `latest_first`), at most `limit` of them; completed ones are
+        skipped unless `open_only` is off."""
+        with self.lock:
+            if self.lazy:
+                # most goals are not in memory: the db has a deadline index
+                return self.db.goals_due(start, end, limit, latest_first, open_only)
+            found = []
+            for goal_id in self.deadlines.between(start, end, reverse=latest_first):
+                goal = self.index.get(goal_id)
+                if goal is not None and not (open_only and goal.completed):
+                    found.append(goal)
+                    if len(found) >= limit:
+                        break
+            return found
+
+    def find(self, query, limit=50):
+        """(id, name) of up to `limit` goals whose name has a word starting
+        with each word of `query` (case-insensitive, ё = е)."""
+        with self.lock:
+            if not self.search.built:
+                if self.lazy:
+                    # names only: the goals themselves stay on disk
+                    self.search.rebuild(self.db.names())
+                else:
+                    self.search.rebuild((g.id, g.name) for g, _ in iter_goals(self.goals))
+            ids = self.search.query(query, limit)
+            if self.lazy and ids:
+                # subgoals deleted with an unloaded parent are still indexed
+                alive = self.db.existing(ids)
+                for goal_id in ids:
+                    if goal_id not in alive:
+                        self.search.discard(goal_id)
+                ids = [goal_id for goal_id in ids if goal_id in alive]
+            return [(goal_id, self.search.name(goal_id)) for goal_id in ids]
+
+    def next_deadline(self, after):
+        """The earliest deadline >= `after` of any goal, or None."""
+        with self.lock:
+            if self.lazy:
+                return self.db.next_deadline(after)
+            first = self.deadlines.first(after)
+            return first[0] if first is not None else None
+
+    def trim(self):
+        """Unload the least recently opened goals no session shows."""
+        with self.lock:
+            if not self.lazy or self.sync_running:
+                return
+            pinned = set()
+            for ids in self._paths.values():
+                pinned |= ids
+            for goal_id in list(self._expanded):
+                if len(self._expanded) <= self.cache_levels:
+                    break
+                if goal_id in pinned or goal_id not in self._expanded:
+                    # pinned, or unloaded with an ancestor in this loop
+                    continue
+                del self._expanded[goal_id]
+                goal = self.index.get(goal_id)
+                if goal is not None and goal.subgoals:
+                    self._unload(goal)
+
+    def _unload(self, goal):
+        self.progress.unload(goal)
+        for s in goal.subgoals:
+            for g, _ in iter_goals([s]):
+                self._expanded.pop(g.id, None)
+            self.index.remove(s)
+            self.deadlines.remove(s)
+        goal.subgoals = []
+
+    def materialize(self):
+        """Load every goal that is not in memory yet (sync needs the whole tree)."""
+        with self.lock:
+            if not self.progress.opaque:
+                return
+            nodes = {g.id: g for g, _ in iter_goals(self.db.load_all())}
+            for goal_id in list(self.progress.opaque):
+                goal = self.index.get(goal_id)
+                stored = nodes.get(goal_id)
+                if goal is None or stored is None:
+                    continue
+                goal.subgoals = stored.subgoals
+                for s in goal.subgoals:
+                    self.index.add(s, goal)
+                    self.deadlines.add(s)
+                # loaded in bulk: first in line to be unloaded again
+                self._expanded[goal_id] = True
+                self._expanded.move_to_end(goal_id, last=False)
+            self.progress.opaque.clear()
+            self.progress.rebuild(self.goals)
+
+    def _load_file(self):
+        data = []
+        try:
+            if self.state_file.exists():
+                # the format is told by the header: JSON and compact both load;
+                # JSON one top-level goal at a time, never the whole file in memory
+                for goal in read_state(self.state_file):
+                    data.append(goal)
+                    if self.on_goal is not None:
+                        try:
+                            self.on_goal(goal)
+                        except Exception as ex:
+                            # a broken preview must not cut the tree short
+                            print("DEBUG: on_goal failed:", ex)
+                            self.on_goal = None
+        except Exception as ex:
+            # the goals before the broken place are kept
+            print(f"DEBUG: load_state failed after {len(data)} goals:", ex)
+            traceback.print_exc()
+        if self.journal is not None:
+            try:
+                replayed = self.journal.replay(data, GoalIndex(data))
+                if replayed:
+                    print(f"DEBUG: load_state: replayed {replayed} journal ops")
+            except Exception as ex:
+                print("DEBUG: journal replay failed:", ex)
+                traceback.print_exc()
+        return data
+
+    def _checkpoint(self):
+        journal = self.journal
+        if not journal.compaction_due():
+            # only an fsync: no need to stop the sessions for it
+            journal.sync()
+            return True
+        # store.lock before the journal's lock, the order of every mutation
+        # (record -> append); the snapshot is serialized and written under it
+        with self.lock:
+            return journal.checkpoint(self.save)
+
+    @timed("save_state")
+    def save(self):
+        if self.db is not None:
+            return self._save_db()
+        try:
+            # serialize under the lock (sessions may be editing), write outside it
+            with self.lock:
+                data = dumps_state(self.goals, self.compact)
+            tmp = self.state_file.with_suffix('.tmp')
+            with tmp.open("wb") as f:
+                f.write(data)
+            tmp.replace(self.state_file)
+            return True
+        except Exception as ex:
+            print("DEBUG: save_state failed:", ex)
+            traceback.print_exc()
+            return False
+
+    def _save_db(self):
+        # every mutation is already its own transaction; what is left is the
+        # progress column (or all rows after the whole tree was replaced)
+        try:
+            with self.lock:
+                if self._db_replace:
+                    self._db_replace = False
+                    self.db.save_all(self.goals, self.progress.values())
+                    self.progress.dirty.clear()
+                    self._progress_clean = False
+                self._flush_progress()
+            return True
+        except Exception as ex:
+            print("DEBUG: save_state failed:", ex)
+            traceback.print_exc()
+            self._db_replace = True
+            return False
+
+    def _flush_progress(self):
+        if self.progress.dirty:
+            dirty = self.progress.dirty
+            self.progress.dirty = {}
+            try:
+                self.db.save_progress(dirty.items())
+            except Exception:
+                dirty.update(self.progress.dirty)
+                self.progress.dirty = dirty
+                raise
+        if not self._progress_clean:
+            self.db.set_meta("progress_clean", "1")
+            self._progress_clean = True
+
+    def record(self, op):
+        """Count a mutation and store it (journal append or SQLite transaction)."""
+        self.version += 1
+        self.sync_dirty = True
+        if self.db is not None:
+            if self._progress_clean:
+                # until the new progress values are stored (see _flush_progress)
+                self._progress_clean = False
+                self.db.set_meta("progress_clean", "0")
+            try:
+                self.db.apply(op)
+            except Exception as ex:
+                print("DEBUG: sqlite apply failed:", ex)
+                # rewrite all rows on the next save instead
+                self.materialize()
+                self._db_replace = True
+            return
+        if self.journal is None:
+            return
+        try:
+            self.journal.append(op)
+        except Exception as ex:
+            print("DEBUG: journal append failed:", ex)
+            # the next checkpoint writes a full snapshot instead
+            self.journal.request_compaction()
+
+    def rebuild(self):
+        """Refresh index and progress after the whole tree was replaced."""
+        self.version += 1
+        self.index.rebuild(self.goals)
+        self.progress.rebuild(self.goals)
+        self.deadlines.rebuild(self.goals)
+        self.search.clear()
+        if self.journal is not None:
+            self.journal.request_compaction()
+        if self.db is not None:
+            self._db_replace = True
+
+    def subscribe(self, callback):
+        """Call `callback()` after other sessions change the tree. Returns a token."""
+        with self.lock:
+            self._next_token += 1
+            token = self._next_token
+            self._subscribers[token] = callback
+        return token
+
+    def unsubscribe(self, token):
+        with self.lock:
+            self._subscribers.pop(token, None)
+            self._paths.pop(token, None)
+
+    def broadcast(self, origin=None):
+        """Notify every subscriber except `origin` (the session that made the change)."""
+        with self.lock:
+            targets = [cb for token, cb in self._subscribers.items() if token != origin]
+        for callback in targets:
+            try:
+                callback()
+            except Exception as ex:
+                print("DEBUG: store subscriber failed:", ex)
+
+    @property
+    def sessions(self):
+        return len(self._subscribers)
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(state_file, **options):
+    """The SharedStore for `state_file`, created on first use (options apply then)."""
+    key = str(Path(state_file).resolve())
+    with _stores_lock:
+        store = _stores.get(key)
+        if store is None:
+            store = _stores[key] = SharedStore(state_file, **options)
+        return store
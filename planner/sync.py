@@ -0,0 +1,547 @@
+"""Cloud sync: backends (Supabase or a local file) and the delta protocol.
+
+Full mode keeps the old behaviour: the whole tree is one `user_states`
+row. Delta mode stores one row per goal in `goal_nodes`:
+
+    {"id", "parent_id", "position", "name", "completed", "deadline",
+     "weight", "manual_weights", "last_modified", "deleted"}
+
+Every push sends only goals whose `last_modified` is newer than the
+previous push, every pull asks the backend only for rows it stored after
+the last pulled cursor, so the traffic follows the edit rate instead of
+the tree size. Deletes are sent as tombstones (`deleted: true`), one per
+removed goal. A node that is newer on both sides keeps the later
+`last_modified` (last writer wins per node).
+
+A tombstone removes the goals of its subtree that are not newer than
+the delete; a goal edited after it stays, with the ancestors that hold
+it, as `merge_trees` keeps them in full mode. Since every goal has its
+own tombstone, a parent brought back by a newer edit on another device
+comes back on both sides with the same children: the ones edited after
+the delete. Goals the deleting side never had (added elsewhere before
+the delete) get tombstones from whichever side removes them.
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+
+from planner.codec import from_payload, to_payload
+from planner.model import Goal, json_default, parse_datetime
+from planner.tree import iter_goals
+
+ROW_FIELDS = ("name", "completed", "deadline", "weight", "manual_weights", "last_modified")
+
+
+def _payload_size(payload):
+    return len(json.dumps(payload, ensure_ascii=False, default=json_default))
+
+
+class SupabaseBackend:
+    PAGE_SIZE = 1000  # PostgREST returns at most this many rows per request
+
+    def __init__(self, client, user_id):
+        self.client = client
+        self.user_id = user_id
+
+    def get_state(self):
+        r = self.client.table('user_states').select('state').eq('user_id', self.user_id).execute()
+        return r.data[0]['state'] if r.data else None
+
+    def put_state(self, state):
+        self.client.table('user_states').upsert({
+            'user_id': self.user_id,
+            'state': state,
+            'updated_at': datetime.now().isoformat()
+        }).execute()
+
+    def get_rows(self, cursor):
+        """Rows stored after `cursor` (the server side `updated_at`) and the new cursor."""
+        rows = []
+        start = 0
+        while True:
+            q = self.client.table('goal_nodes').select('*').eq('user_id', self.user_id)
+            if cursor:
+                q = q.gt('updated_at', cursor)
+            r = q.order('updated_at').range(start, start + self.PAGE_SIZE - 1).execute()
+            rows.extend(r.data or [])
+            if len(r.data or []) < self.PAGE_SIZE:
+                break
+            start += self.PAGE_SIZE
+        if rows:
+            cursor = rows[-1]['updated_at']
+        return rows, cursor
+
+    def put_rows(self, rows):
+        for i in range(0, len(rows), self.PAGE_SIZE):
+            chunk = [dict(row, user_id=self.user_id) for row in rows[i:i + self.PAGE_SIZE]]
+            self.client.table('goal_nodes').upsert(chunk).execute()
+
+
+class LocalBackend:
+    """Stand-in for Supabase that keeps everything in one JSON file.
+
+    Several app instances pointed at the same file behave like devices
+    sharing one account, which is enough to try sync without a server.
+    With `path=None` the data only lives in memory (benchmarks).
+    """
+
+    def __init__(self, path=None, user_id='default'):
+        self.path = path
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        self._memory = None
+
+    def _read(self):
+        if self.path is None:
+            if self._memory is not None:
+                return self._memory
+        elif os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        return {"rev": 0, "states": {}, "nodes": {}}
+
+    def _write(self, data):
+        if self.path is None:
+            self._memory = data
+            return
+        tmp = str(self.path) + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    def get_state(self):
+        with self._lock:
+            return self._read()["states"].get(self.user_id)
+
+    def put_state(self, state):
+        with self._lock:
+            data = self._read()
+            data["states"][self.user_id] = state
+            self._write(data)
+
+    def get_rows(self, cursor):
+        since = cursor or 0
+        with self._lock:
+            nodes = self._read()["nodes"].get(self.user_id, {})
+        rows = sorted((r for r in nodes.values() if r["rev"] > since), key=lambda r: r["rev"])
+        if rows:
+            cursor = rows[-1]["rev"]
+        return rows, cursor
+
+    def put_rows(self, rows):
+        with self._lock:
+            data = self._read()
+            nodes = data["nodes"].setdefault(self.user_id, {})
+            for row in rows:
+                data["rev"] += 1
+                nodes[row["id"]] = dict(row, rev=data["rev"])
+            self._write(data)
+
+
+class SyncClient:
+    """Talks to one backend; all calls return None/False on errors."""
+
+    def __init__(self, backend=None, compact=False):
+        self.backend = backend
+        self.compact = compact  # push the tree in the compact format (planner.codec)
+        self.bytes_sent = 0
+        self.bytes_received = 0
+
+    @property
+    def enabled(self):
+        return self.backend is not None
+
+    def push_state(self, goals):
+        return self.push_payload(to_payload(goals, self.compact))
+
+    def push_payload(self, state):
+        """Upload an already serialized tree (see codec.to_payload)."""
+        if not self.enabled:
+            return False
+        try:
+            self.backend.put_state(state)
+            self.bytes_sent += _payload_size(state)
+            return True
+        except Exception as ex:
+            print('DEBUG: push_state error:', ex)
+            return False
+
+    def pull_state(self):
+        """Remote goals ([] when nothing is stored yet) or None on errors."""
+        if not self.enabled:
+            return None
+        try:
+            state = self.backend.get_state()
+            if state is None:
+                return []
+            self.bytes_received += _payload_size(state)
+            return from_payload(state)
+        except Exception as ex:
+            print('DEBUG: pull_state error:', ex)
+        return None
+
+    def push_rows(self, rows):
+        if not self.enabled:
+            return False
+        if not rows:
+            return True
+        try:
+            self.backend.put_rows(rows)
+            self.bytes_sent += _payload_size(rows)
+            return True
+        except Exception as ex:
+            print('DEBUG: push_rows error:', ex)
+            return False
+
+    def pull_rows(self, cursor):
+        """(rows, new_cursor) or None on error."""
+        if not self.enabled:
+            return None
+        try:
+            rows, cursor = self.backend.get_rows(cursor)
+            self.bytes_received += _payload_size(rows)
+            return rows, cursor
+        except Exception as ex:
+            print('DEBUG: pull_rows error:', ex)
+            return None
+
+
+def create_sync_client(data_dir, compact=False):
+    """SyncClient configured from the environment.
+
+    SYNC_BACKEND=local keeps the "cloud" in a file (SYNC_LOCAL_PATH, by
+    default sync_local.json in the data dir); otherwise SUPABASE_URL and
+    SUPABASE_KEY select Supabase. USER_ID names the account in both.
+    """
+    user_id = os.environ.get('USER_ID', 'default')
+    if os.environ.get('SYNC_BACKEND') == 'local':
+        path = os.environ.get('SYNC_LOCAL_PATH') or str(data_dir / "sync_local.json")
+        print("DEBUG: sync: локальный бэкенд", path)
+        return SyncClient(LocalBackend(path, user_id), compact)
+    try:
+        from supabase import create_client
+        url = os.environ.get('SUPABASE_URL')
+        key = os.environ.get('SUPABASE_KEY')
+        if url and key:
+            backend = SupabaseBackend(create_client(url, key), user_id)
+            print("DEBUG: Supabase подключён через ENV")
+            return SyncClient(backend, compact)
+        print("DEBUG: Supabase ENV не заданы")
+    except Exception as ex:
+        print('DEBUG: Supabase не доступен:', ex)
+    return SyncClient(None)
+
+
+# --- delta protocol -------------------------------------------------------
+
+def goal_row(goal, parent, position):
+    return {
+        "id": goal.id,
+        "parent_id": parent.id if parent is not None else None,
+        "position": position,
+        "name": goal.name,
+        "completed": goal.completed,
+        "deadline": goal.deadline.isoformat() if goal.deadline is not None else None,
+        "weight": goal.weight,
+        "manual_weights": goal.manual_weights,
+        "last_modified": goal.last_modified.isoformat() if goal.last_modified is not None else None,
+        "deleted": False,
+    }
+
+
+def tombstone_row(goal_id, at):
+    return {"id": goal_id, "parent_id": None, "position": 0, "name": None, "completed": False,
+            "deadline": None, "weight": None, "manual_weights": False,
+            "last_modified": at.isoformat(), "deleted": True}
+
+
+def changed_rows(goals, since):
+    """Rows for goals modified after `since` (all goals when it is None).
+
+    Every edit also touches the ancestors' `last_modified`, so a subtree
+    whose root is not newer than `since` has no changes and is skipped.
+    """
+    rows = []
+    stack = [(g, None, i) for i, g in reversed(list(enumerate(goals)))]
+    while stack:
+        goal, parent, pos = stack.pop()
+        lm = goal.last_modified
+        if since is not None and (lm is None or lm <= since):
+            continue
+        rows.append(goal_row(goal, parent, pos))
+        subs = goal.subgoals
+        for i in range(len(subs) - 1, -1, -1):
+            stack.append((subs[i], goal, i))
+    return rows
+
+
+def _newer(goal, at):
+    return goal.last_modified is not None and at is not None and goal.last_modified > at
+
+
+def _detach(goals, index, goal, events):
+    parent = index.parent(goal)
+    siblings = parent.subgoals if parent is not None else goals
+    for i, s in enumerate(siblings):
+        if s is goal:
+            del siblings[i]
+            break
+    events.append(("delete", goal, parent))
+    index.remove(goal)
+
+
+def _deleted_at(goal_id, parent_id, index, deleted):
+    """When the goal or its nearest ancestor in `deleted` was deleted here (or None)."""
+    when = deleted.get(goal_id)
+    if when is not None or parent_id is None:
+        return when
+    when = deleted.get(parent_id)
+    parent = index.get(parent_id)
+    while when is None and parent is not None:
+        parent = index.parent(parent)
+        if parent is not None:
+            when = deleted.get(parent.id)
+    return when
+
+
+def apply_tombstone(goals, index, goal, at, events):
+    """Delete `goal`'s subtree as of `at`: goals not newer than the delete go,
+    newer ones stay together with their ancestors."""
+    order = [g for g, _ in iter_goals([goal])]
+    kept = set()
+    # children come after their parent in pre-order, so walk backwards
+    for g in reversed(order):
+        if g.id in kept or _newer(g, at):
+            kept.add(g.id)
+            parent = index.parent(g)
+            if parent is not None:
+                kept.add(parent.id)
+    if goal.id not in kept:
+        _detach(goals, index, goal, events)
+        return
+    for g in order:
+        if g.id in kept:
+            # the biggest subtrees that go: children of a kept goal
+            for s in [s for s in g.subgoals if s.id not in kept]:
+                _detach(goals, index, s, events)
+
+
+def apply_rows(goals, index, rows, deleted=None):
+    """Apply pulled rows to the tree, keeping the newer side of each node.
+
+    Returns a list of (kind, goal, parent) events - kind is "add",
+    "update" or "delete" - so the caller can update caches and the view.
+    Rows whose parent is not (yet) known wait for the parent row; those
+    left at the end belong to deleted subtrees and are dropped. Tombstones
+    go last, so they are weighed against the newest data (apply_tombstone).
+    `deleted` (id -> time) are local deletes not pushed yet: older rows
+    of those goals and of their subtrees do not bring them back, and the
+    ids of such rows are added to it (they need tombstones of their own:
+    the other side may not have got them yet when it sees ours).
+    """
+    events = []
+    deleted = {} if deleted is None else deleted
+    tombstones = [row for row in rows if row.get("deleted")]
+    pending = [row for row in rows if not row.get("deleted")]
+    while pending:
+        waiting = []
+        for row in pending:
+            goal = index.get(row["id"])
+            remote_lm = parse_datetime(row.get("last_modified"))
+            if goal is not None:
+                if goal.last_modified is not None and (remote_lm is None or remote_lm <= goal.last_modified):
+                    continue
+                for key in ROW_FIELDS:
+                    value = parse_datetime(row.get(key)) if key in ("deadline", "last_modified") else row.get(key)
+                    setattr(goal, key, value)
+                goal.completed = bool(goal.completed)
+                goal.manual_weights = bool(goal.manual_weights)
+                events.append(("update", goal, index.parent(goal)))
+            else:
+                pid = row.get("parent_id")
+                at = _deleted_at(row["id"], pid, index, deleted) if deleted else None
+                if at is not None and (remote_lm is None or remote_lm <= at):
+                    deleted[row["id"]] = at
+                    continue
+                parent = index.get(pid) if pid else None
+                if pid and parent is None:
+                    waiting.append(row)
+                    continue
+                w = row.get("weight")
+                goal = Goal(
+                    row.get("name") or "",
+                    id=row["id"],
+                    completed=bool(row.get("completed")),
+                    deadline=parse_datetime(row.get("deadline")),
+                    weight=float(w) if w is not None else None,
+                    manual_weights=bool(row.get("manual_weights")),
+                    last_modified=remote_lm,
+                )
+                siblings = parent.subgoals if parent is not None else goals
+                pos = row.get("position")
+                if pos is None or pos >= len(siblings):
+                    siblings.append(goal)
+                else:
+                    siblings.insert(max(0, pos), goal)
+                index.add(goal, parent)
+                events.append(("add", goal, parent))
+        if len(waiting) == len(pending):
+            if waiting:
+                print(f"DEBUG: sync: dropped {len(waiting)} rows without a parent")
+            break
+        pending = waiting
+    for row in tombstones:
+        goal = index.get(row["id"])
+        if goal is not None:
+            apply_tombstone(goals, index, goal, parse_datetime(row.get("last_modified")), events)
+    return events
+
+
+class DeltaSync:
+    """Watermarks and pending tombstones of the delta protocol.
+
+    State lives in a small JSON file (`meta_path`): `pushed_at` is the
+    local time of the last successful push, `cursor` the backend position
+    of the last pull, `deleted` tombstones not yet pushed.
+    """
+
+    def __init__(self, client, meta_path):
+        self.client = client
+        self.meta_path = meta_path
+        self._lock = threading.Lock()
+        self.pushed_at = None
+        self.cursor = None
+        self.deleted = {}
+        self._load()
+
+    def _load(self):
+        try:
+            if os.path.exists(self.meta_path):
+                with open(self.meta_path, "r", encoding="utf-8") as f:
+                    meta = json.load(f)
+                self.pushed_at = parse_datetime(meta.get("pushed_at"))
+                self.cursor = meta.get("cursor")
+                self.deleted = dict(meta.get("deleted") or {})
+        except Exception as ex:
+            print("DEBUG: sync meta load failed:", ex)
+
+    def _save(self):
+        meta = {
+            "pushed_at": self.pushed_at.isoformat() if self.pushed_at is not None else None,
+            "cursor": self.cursor,
+            "deleted": self.deleted,
+        }
+        try:
+            tmp = str(self.meta_path) + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(meta, f)
+            os.replace(tmp, self.meta_path)
+        except Exception as ex:
+            print("DEBUG: sync meta save failed:", ex)
+
+    def note_deleted(self, goal_ids, at=None):
+        """Remember removed goals so the next push sends their tombstones."""
+        at = (at or datetime.now()).isoformat()
+        with self._lock:
+            for goal_id in goal_ids:
+                self.deleted[goal_id] = at
+            self._save()
+
+    def begin(self, goals):
+        """Start a round: collect local changes (touches the tree, call it on the UI side)."""
+        rnd = SyncRound()
+        with self._lock:
+            rnd.local = changed_rows(goals, self.pushed_at)
+            rnd.local.extend(tombstone_row(gid, parse_datetime(at)) for gid, at in self.deleted.items())
+            rnd.tombstones = set(self.deleted)
+            rnd.cursor = self.cursor
+        return rnd
+
+    def pull(self, rnd):
+        """Network only, safe to run in a worker thread. False when the backend failed."""
+        pulled = self.client.pull_rows(rnd.cursor)
+        if pulled is None:
+            return False
+        rnd.rows, rnd.cursor = pulled
+        return True
+
+    def merge(self, rnd, goals, index):
+        """Apply the pulled rows to the tree (UI side) and pick what to send back."""
+        with self._lock:
+            deleted = {gid: parse_datetime(at) for gid, at in self.deleted.items() if gid in rnd.tombstones}
+        covered = len(deleted)
+        events = apply_rows(goals, index, rnd.rows, deleted)
+        # our rows (tombstones too) that lost to a newer remote version are
+        # not sent back, nor rows of goals a pulled tombstone removed
+        remote_lm = {r["id"]: parse_datetime(r.get("last_modified")) for r in rnd.rows}
+        for row in rnd.local:
+            theirs = remote_lm.get(row["id"])
+            ours = parse_datetime(row["last_modified"])
+            if theirs is not None and ours is not None and theirs > ours:
+                continue
+            if not row["deleted"] and row["id"] not in index:
+                continue
+            rnd.outgoing.append(row)
+        # goals we never had under goals deleted here, and goals a pulled
+        # tombstone removed under goals it had to keep: tombstones of their own
+        removed = list(deleted.items())[covered:]
+        pulled = {r["id"]: parse_datetime(r.get("last_modified")) for r in rnd.rows if r.get("deleted")}
+        for kind, goal, parent in events:
+            if kind == "delete" and goal.id not in pulled:
+                at = next(pulled[g.id] for g in reversed(index.path(parent)) if g.id in pulled)
+                removed.extend((g.id, at) for g, _ in iter_goals([goal]))
+        if removed:
+            with self._lock:
+                for gid, at in removed:
+                    self.deleted[gid] = at.isoformat()
+                self._save()
+            for gid, at in removed:
+                rnd.tombstones.add(gid)
+                rnd.outgoing.append(tombstone_row(gid, at))
+        return events
+
+    def push(self, rnd):
+        """Network only, safe to run in a worker thread."""
+        return self.client.push_rows(rnd.outgoing)
+
+    def finish(self, rnd):
+        """Move the watermarks once the whole round went through."""
+        with self._lock:
+            self.pushed_at = rnd.started
+            self.cursor = rnd.cursor
+            for gid in rnd.tombstones:
+                self.deleted.pop(gid, None)
+            self._save()
+        return rnd.stats()
+
+    def run(self, goals, index):
+        """One pull + push round in the calling thread. Returns (events, stats) or None when the backend failed."""
+        rnd = self.begin(goals)
+        if not self.pull(rnd):
+            return None
+        events = self.merge(rnd, goals, index)
+        if not self.push(rnd):
+            return None
+        return events, self.finish(rnd)
+
+
+class SyncRound:
+    """State of one delta round between begin() and finish().
+
+    Nothing is stored before finish(), so a round that is abandoned at
+    any step (error, cancel) is simply repeated next time: all steps are
+    idempotent.
+    """
+
+    def __init__(self):
+        self.started = datetime.now()
+        self.local = []
+        self.tombstones = set()
+        self.cursor = None
+        self.rows = []
+        self.outgoing = []
+
+    def stats(self):
+        return {"pulled": len(self.rows), "pushed": len(self.outgoing)}
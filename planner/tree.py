@@ -0,0 +1,12 @@
+"""Helpers for walking the nested goal tree without recursion."""
+
+
+def iter_goals(goals, parent=None):
+    """Yield (goal, parent) pairs in pre-order. Deep trees are fine: no recursion."""
+    stack = [(g, parent) for g in reversed(goals)]
+    while stack:
+        goal, par = stack.pop()
+        yield goal, par
+        subs = goal.subgoals
+        if subs:
+            stack.extend((s, goal) for s in reversed(subs))
@@ -0,0 +1,99 @@
+"""Coalescing of UI refresh requests (one page.update() per user action)."""
+
+import threading
+
+
+class UpdateScheduler:
+    """Collects update requests and calls `flush` once for all of them.
+
+    Requests made inside `batch()` (main.py's `batched` wraps every handler
+    in one) are flushed when the outermost batch ends. Requests outside a batch are flushed on
+    the next tick of `loop` (the Flet session loop), so several calls in
+    one async step also collapse; without a loop they flush immediately.
+    """
+
+    def __init__(self, flush, loop=None):
+        self._flush = flush
+        self.loop = loop
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._pending = False
+        self._scheduled = False
+        self.requested = 0
+        self.flushed = 0
+
+    @property
+    def merged(self):
+        """Requests that did not need a round-trip of their own."""
+        return self.requested - self.flushed
+
+    def stats(self):
+        return {"requested": self.requested, "flushed": self.flushed, "merged": self.merged}
+
+    def request(self):
+        with self._lock:
+            self.requested += 1
+            self._pending = True
+            if getattr(self._local, "depth", 0):
+                return
+            if self.loop is None:
+                schedule = False
+            elif self._scheduled:
+                return
+            else:
+                self._scheduled = schedule = True
+        if not schedule:
+            self.flush()
+            return
+        try:
+            self.loop.call_soon_threadsafe(self._scheduled_flush)
+        except RuntimeError:
+            # loop already closed (session is gone)
+            with self._lock:
+                self._scheduled = False
+            self.flush()
+
+    def call_on_loop(self, fn):
+        """Run `fn` on the session loop (from any thread); without a loop, right away."""
+        loop = self.loop
+        if loop is None:
+            fn()
+            return
+        try:
+            loop.call_soon_threadsafe(fn)
+        except RuntimeError:
+            # loop already closed (session is gone)
+            pass
+
+    def _scheduled_flush(self):
+        with self._lock:
+            self._scheduled = False
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            if not self._pending:
+                return
+            self._pending = False
+            self.flushed += 1
+        self._flush()
+
+    def batch(self):
+        return _Batch(self)
+
+
+class _Batch:
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+
+    def __enter__(self):
+        local = self.scheduler._local
+        local.depth = getattr(local, "depth", 0) + 1
+        return self.scheduler
+
+    def __exit__(self, *exc):
+        local = self.scheduler._local
+        local.depth -= 1
+        if local.depth == 0:
+            self.scheduler.flush()
+        return False
@@ -0,0 +1,32 @@
+"""Sibling weights: implicit equal shares and capped manual weights.
+
+A parent with `manual_weights` off splits its weight equally: every child
+counts with 1/n, derived from the number of children, so adding a child
+does not rewrite its siblings (their stored `weight` is not used). Once a
+weight is set by hand the parent switches to manual weights and the
+stored values count, capped so that the siblings sum to at most 1.
+"""
+
+# the smallest weight a child counts with in its parent's progress
+MIN_WEIGHT = 0.01
+
+
+def stored_weight(goal):
+    """The weight a manual parent counts `goal` with (None counts as 1.0)."""
+    return goal.weight if goal.weight is not None else 1.0
+
+
+def effective_weight(goal, parent):
+    """The weight `goal` counts with under `parent` (None for a top-level goal)."""
+    if parent is None:
+        return goal.weight
+    if not parent.manual_weights and parent.subgoals:
+        return 1.0 / len(parent.subgoals)
+    return stored_weight(goal)
+
+
+def cap_weight(requested, others):
+    """`requested` limited to [0, 1 - others], `others` being the stored
+    weights of the siblings."""
+    allowed = max(0.0, 1.0 - others)
+    return min(max(0.0, float(requested)), allowed)
@@ -0,0 +1,48 @@
+"""Round trips of the compact GPC1 format (planner/codec.py)."""
+
+from datetime import datetime
+
+import pytest
+
+from benchmarks.treegen import make_tree
+from planner.codec import decode, dumps_state, encode, from_payload, is_compact, loads_state, to_payload
+from planner.model import Goal, dumps_goals
+
+
+def sample_tree():
+    at = datetime(2025, 3, 1, 12, 30, 15, 123456)
+    manual = Goal("веса вручную", manual_weights=True, last_modified=at, subgoals=[
+        Goal("", weight=0.7, completed=True, last_modified=at),
+        Goal("漢字 и emoji 🎯", weight=0.3, deadline=datetime(2025, 4, 1, 9, 0), last_modified=at),
+    ])
+    return [
+        Goal("Цель с дедлайном", deadline=datetime(2025, 12, 31, 23, 59, 59, 999999),
+             last_modified=at, subgoals=[manual, Goal("auto", weight=0.5)]),
+        Goal("", id="not-a-uuid"),
+        Goal("no times"),
+    ]
+
+
+def test_round_trip_keeps_every_field():
+    goals = sample_tree()
+    data = encode(goals)
+    assert is_compact(data)
+    assert dumps_goals(decode(data)) == dumps_goals(goals)
+
+
+@pytest.mark.parametrize("compact", [False, True])
+def test_snapshot_and_payload_round_trip(compact):
+    goals = sample_tree()
+    assert dumps_goals(loads_state(dumps_state(goals, compact))) == dumps_goals(goals)
+    assert dumps_goals(from_payload(to_payload(goals, compact))) == dumps_goals(goals)
+
+
+def test_uuid_ids_are_packed():
+    goals = make_tree(500, seed=3)
+    data = encode(goals)
+    assert dumps_goals(decode(data)) == dumps_goals(goals)
+    assert len(data) < len(dumps_state(goals)) / 2
+
+
+def test_empty_tree():
+    assert decode(encode([])) == []
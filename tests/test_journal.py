@@ -0,0 +1,112 @@
+"""Journal storage mode: replay over the snapshot (planner/journal.py)."""
+
+from datetime import datetime
+
+import pytest
+
+from planner.core import Planner
+from planner.index import GoalIndex
+from planner.journal import Journal
+from planner.model import dumps_goals
+from planner.store import SharedStore
+from planner.tree import iter_goals
+
+
+@pytest.fixture
+def open_planner(tmp_path):
+    made = []
+
+    def open_planner(**options):
+        store = SharedStore(tmp_path / "state.json", storage_mode="journal", save_delay=3600, **options)
+        made.append(store)
+        return Planner(store, tmp_path)
+
+    yield open_planner
+    for store in made:
+        store.writer.close()
+
+
+def mutate(planner):
+    """Every kind of journal record: add, update, touch, normalize, delete."""
+    home = planner.add_goal("Дом", deadline=datetime(2025, 6, 1))
+    walls = planner.add_subgoal(home, "Стены")
+    floor = planner.add_subgoal(home, "Пол")
+    paint = planner.add_subgoal(walls, "Покраска")
+    planner.add_subgoal(walls, "Шпаклёвка")
+    planner.set_completed(paint, True)
+    planner.edit(floor, "Ламинат", datetime(2025, 5, 1))
+    planner.set_weight(floor, 0.3)
+    gone = planner.add_goal("Удалить")
+    planner.add_subgoal(gone, "тоже")
+    planner.delete(gone)
+    planner.add_goal("Спорт")
+
+
+def progress(planner):
+    return {g.id: planner.progress(g) for g, _ in iter_goals(planner.goals)}
+
+
+def test_reopen_replays_every_op(open_planner, tmp_path):
+    planner = open_planner()
+    mutate(planner)
+    expected, expected_progress = dumps_goals(planner.goals), progress(planner)
+    planner.store.writer.close()
+    # nothing compacted: the snapshot is still empty, the tree is in the journal
+    assert not (tmp_path / "state.json").exists()
+    reopened = open_planner()
+    assert dumps_goals(reopened.goals) == expected
+    assert progress(reopened) == expected_progress
+
+
+def test_replay_is_idempotent(open_planner, tmp_path):
+    planner = open_planner()
+    mutate(planner)
+    expected = dumps_goals(planner.goals)
+    planner.store.writer.close()
+    goals = open_planner().goals
+    # a crash between the snapshot and the truncation replays the ops again
+    replayed = Journal(tmp_path / "state.journal").replay(goals, GoalIndex(goals))
+    assert replayed > 0
+    assert dumps_goals(goals) == expected
+
+
+def test_torn_last_line_is_ignored(open_planner, tmp_path):
+    planner = open_planner()
+    mutate(planner)
+    expected = dumps_goals(planner.goals)
+    planner.store.writer.close()
+    journal = tmp_path / "state.journal"
+    with journal.open("a", encoding="utf-8") as f:
+        f.write('{"op":"add","parent":null,"goal":{"id":"to')
+    reopened = open_planner()
+    assert dumps_goals(reopened.goals) == expected
+    # the next record starts on its own line instead of joining the torn one
+    reopened.add_goal("после сбоя")
+    expected = dumps_goals(reopened.goals)
+    reopened.store.writer.close()
+    assert dumps_goals(open_planner().goals) == expected
+
+
+def test_compaction_then_replay_gives_the_same_tree(open_planner, tmp_path):
+    planner = open_planner()
+    mutate(planner)
+    planner.store.journal.request_compaction()
+    planner.store.writer.mark_dirty()
+    planner.store.writer.flush()
+    assert (tmp_path / "state.journal").stat().st_size == 0
+    # ops after the snapshot go to the emptied journal
+    planner.set_completed(planner.goals[-1], True)
+    expected, expected_progress = dumps_goals(planner.goals), progress(planner)
+    planner.store.writer.close()
+    reopened = open_planner()
+    assert dumps_goals(reopened.goals) == expected
+    assert progress(reopened) == expected_progress
+
+
+def test_small_journal_compacts_on_every_checkpoint(open_planner, tmp_path):
+    planner = open_planner(journal_max_kb=0)
+    mutate(planner)
+    expected = dumps_goals(planner.goals)
+    planner.store.writer.close()
+    assert (tmp_path / "state.journal").stat().st_size == 0
+    assert dumps_goals(open_planner().goals) == expected
@@ -0,0 +1,165 @@
+"""Three-way merge of the full-state sync (planner/merge.py)."""
+
+from datetime import datetime
+
+from planner.merge import merge_trees
+from planner.model import Goal, goals_from_data, to_serializable
+
+T0 = datetime(2025, 1, 1, 10, 0)
+T1 = datetime(2025, 1, 1, 11, 0)
+T2 = datetime(2025, 1, 1, 12, 0)
+
+
+def base_tree():
+    return [
+        Goal("Ремонт", id="a", last_modified=T0, subgoals=[
+            Goal("Обои", id="a1", weight=0.5, last_modified=T0),
+            Goal("Пол", id="a2", weight=0.5, last_modified=T0),
+        ]),
+        Goal("Спорт", id="b", last_modified=T0),
+    ]
+
+
+def copy(goals):
+    return goals_from_data(to_serializable(goals))
+
+
+def find(goals, goal_id):
+    for g in goals:
+        if g.id == goal_id:
+            return g
+        found = find(g.subgoals, goal_id)
+        if found is not None:
+            return found
+    return None
+
+
+def ids(goals):
+    return [(g.id, ids(g.subgoals)) for g in goals]
+
+
+def sides():
+    base = base_tree()
+    return base, copy(base), copy(base)
+
+
+def test_remote_edit_only():
+    base, local, remote = sides()
+    find(remote, "a1").completed = True
+    find(remote, "a1").last_modified = T1
+    report = merge_trees(base, local, remote)
+    assert find(local, "a1").completed is True
+    assert find(local, "a1").last_modified == T1
+    assert report.conflicts == []
+    assert (report.remote_changes, report.local_changes) == (1, 0)
+
+
+def test_local_edit_only():
+    base, local, remote = sides()
+    find(local, "b").name = "Бег"
+    find(local, "b").last_modified = T1
+    report = merge_trees(base, local, remote)
+    assert find(local, "b").name == "Бег"
+    assert report.conflicts == []
+    assert (report.remote_changes, report.local_changes) == (0, 1)
+
+
+def test_conflict_goes_to_later_last_modified():
+    base, local, remote = sides()
+    find(local, "a2").name = "Ламинат"
+    find(local, "a2").last_modified = T1
+    find(remote, "a2").name = "Плитка"
+    find(remote, "a2").last_modified = T2
+    report = merge_trees(base, local, remote)
+    assert find(local, "a2").name == "Плитка"
+    assert find(local, "a2").last_modified == T2
+    assert report.conflicts == [{"id": "a2", "name": "Ламинат", "field": "name",
+                                 "local": "Ламинат", "remote": "Плитка", "kept": "remote"}]
+
+
+def test_conflict_is_decided_by_the_node_time_not_the_field():
+    # remote renamed the goal later; that wins its deadline conflict too
+    base, local, remote = sides()
+    find(local, "a1").deadline = datetime(2025, 2, 1)
+    find(local, "a1").last_modified = T1
+    find(remote, "a1").deadline = datetime(2025, 3, 1)
+    find(remote, "a1").name = "Обои в спальне"
+    find(remote, "a1").last_modified = T2
+    report = merge_trees(base, local, remote)
+    assert find(local, "a1").deadline == datetime(2025, 3, 1)
+    assert find(local, "a1").name == "Обои в спальне"
+    assert [c["field"] for c in report.conflicts] == ["deadline"]
+
+
+def test_conflict_tie_keeps_local():
+    base, local, remote = sides()
+    find(local, "b").name = "Бег"
+    find(remote, "b").name = "Плавание"
+    find(local, "b").last_modified = find(remote, "b").last_modified = T1
+    report = merge_trees(base, local, remote)
+    assert find(local, "b").name == "Бег"
+    assert report.conflicts[0]["kept"] == "local"
+
+
+def test_remote_delete_against_local_edit_keeps_goal():
+    base, local, remote = sides()
+    find(local, "a1").name = "Обои в зале"
+    find(local, "a1").last_modified = T1
+    remote[0].subgoals = [g for g in remote[0].subgoals if g.id != "a1"]
+    report = merge_trees(base, local, remote)
+    assert find(local, "a1").name == "Обои в зале"
+    assert report.conflicts == [{"id": "a1", "name": "Обои в зале", "field": "deleted",
+                                 "local": "edited", "remote": "deleted", "kept": "local"}]
+
+
+def test_local_delete_against_remote_edit_keeps_goal():
+    base, local, remote = sides()
+    del local[1]
+    find(remote, "b").completed = True
+    find(remote, "b").last_modified = T1
+    report = merge_trees(base, local, remote)
+    assert find(local, "b").completed is True
+    assert report.conflicts[0]["field"] == "deleted"
+    assert report.conflicts[0]["kept"] == "remote"
+
+
+def test_unedited_delete_wins():
+    base, local, remote = sides()
+    del remote[1]
+    report = merge_trees(base, local, remote)
+    assert find(local, "b") is None
+    assert report.conflicts == []
+    assert report.remote_changes == 1
+
+
+def test_deleted_parent_comes_back_for_an_edited_child():
+    base, local, remote = sides()
+    del local[0]
+    find(remote, "a2").completed = True
+    find(remote, "a2").last_modified = T1
+    report = merge_trees(base, local, remote)
+    assert ids(local) == [("b", []), ("a", [("a2", [])])]
+    assert {c["id"]: c["field"] for c in report.conflicts} == {"a2": "deleted", "a": "deleted"}
+
+
+def test_add_on_both_sides():
+    base, local, remote = sides()
+    find(local, "a").subgoals.append(Goal("Потолок", id="l1", weight=0.5, last_modified=T1))
+    find(remote, "a").subgoals.append(Goal("Двери", id="r1", weight=0.5, last_modified=T1))
+    remote.append(Goal("Книги", id="r2", last_modified=T1))
+    report = merge_trees(base, local, remote)
+    assert ids(local) == [("a", [("a1", []), ("a2", []), ("l1", []), ("r1", [])]),
+                          ("b", []), ("r2", [])]
+    assert report.conflicts == []
+    assert report.local_changes == 1
+    assert report.remote_changes == 2
+    # children from both sides under an auto-weighted parent share equally
+    assert [g.weight for g in find(local, "a").subgoals] == [0.25] * 4
+
+
+def test_merge_without_base_adds_everything():
+    local = [Goal("Локальная", id="l", last_modified=T0)]
+    remote = [Goal("Облачная", id="r", last_modified=T0)]
+    report = merge_trees([], local, remote)
+    assert [g.id for g in local] == ["l", "r"]
+    assert (report.local_changes, report.remote_changes) == (1, 1)
@@ -0,0 +1,121 @@
+"""SQLite storage mode and lazy loading (planner/sqlite_store.py, planner/store.py)."""
+
+import pytest
+
+from benchmarks.treegen import make_tree
+from planner.codec import dumps_state
+from planner.core import Planner
+from planner.model import dumps_goals
+from planner.store import SharedStore
+from planner.tree import iter_goals
+from tests.test_journal import mutate
+
+
+@pytest.fixture
+def open_planner(tmp_path):
+    made = []
+
+    def open_planner(**options):
+        store = SharedStore(tmp_path / "state.json", storage_mode="sqlite", save_delay=3600, **options)
+        made.append(store)
+        return Planner(store, tmp_path)
+
+    yield open_planner
+    for store in made:
+        close(store)
+
+
+def close(store):
+    # the store has no close of its own: the app keeps it for the whole process
+    store.writer.close()
+    store.db.close()
+
+
+def progress(planner):
+    return {g.id: planner.progress(g) for g, _ in iter_goals(planner.goals)}
+
+
+@pytest.fixture
+def tree(tmp_path):
+    """A state.json of 3 levels that the first sqlite start migrates."""
+    goals = make_tree(1110, breadth=10, seed=3)
+    (tmp_path / "state.json").write_bytes(dumps_state(goals, False))
+    return goals
+
+
+def test_round_trip_keeps_tree_and_progress(open_planner):
+    planner = open_planner()
+    mutate(planner)
+    expected, expected_progress = dumps_goals(planner.goals), progress(planner)
+    close(planner.store)
+    reopened = open_planner()
+    assert dumps_goals(reopened.goals) == expected
+    assert progress(reopened) == expected_progress
+
+
+def test_migration_from_state_json(open_planner, tree):
+    planner = open_planner()
+    assert planner.store.db.count() == 1110
+    assert dumps_goals(planner.goals) == dumps_goals(tree)
+    # edits after the migration are stored as rows, not in state.json
+    planner.set_completed(planner.goals[0].subgoals[0], True)
+    planner.delete(planner.goals[1])
+    expected = dumps_goals(planner.goals)
+    close(planner.store)
+    assert dumps_goals(open_planner().goals) == expected
+
+
+def test_lazy_start_loads_the_top_level_with_stored_progress(open_planner, tree):
+    full = open_planner()
+    expected = progress(full)
+    close(full.store)
+    planner = open_planner(lazy=True)
+    assert [g.id for g in planner.goals] == [g.id for g in tree]
+    assert all(not g.subgoals for g in planner.goals)
+    assert {g.id: planner.progress(g) for g in planner.goals} == {g.id: expected[g.id] for g in tree}
+    # opening a goal reads its level from the db
+    first = planner.goals[0]
+    planner.store.visit(1, first)
+    assert [g.id for g in first.subgoals] == [g.id for g in tree[0].subgoals]
+    assert planner.progress(first) == expected[first.id]
+
+
+def test_reveal_loads_the_levels_on_the_way(open_planner, tree):
+    planner = open_planner(lazy=True)
+    deep = tree[4].subgoals[0].subgoals[2]
+    path = planner.store.reveal(deep.id)
+    assert [g.id for g in path] == [tree[4].id, tree[4].subgoals[0].id, deep.id]
+    assert path[-1].name == deep.name
+    assert planner.store.reveal("no-such-goal") is None
+
+
+def test_trim_unloads_levels_no_session_shows(open_planner, tree):
+    planner = open_planner(lazy=True, cache_levels=1)
+    store = planner.store
+    a, b, c = planner.goals[:3]
+    expected = planner.progress(a)
+    store.visit(1, a)
+    store.visit(2, b)
+    # both are on a session's path
+    assert a.subgoals and b.subgoals
+    store.visit(1, c)
+    assert not a.subgoals and b.subgoals and c.subgoals
+    assert store.index.get(tree[0].subgoals[0].id) is None
+    assert planner.progress(a) == expected
+    store.visit(1, a)
+    assert [g.id for g in a.subgoals] == [g.id for g in tree[0].subgoals]
+
+
+def test_lazy_edits_reach_the_db_and_the_stored_progress(open_planner, tree):
+    planner = open_planner(lazy=True)
+    path = planner.store.reveal(tree[2].subgoals[3].subgoals[0].id)
+    planner.set_completed(path[-1], not path[-1].completed)
+    added = planner.add_subgoal(path[-2], "новая")
+    top_progress = planner.progress(path[0])
+    close(planner.store)
+    full = open_planner()
+    assert full.store.index.get(added.id).name == "новая"
+    assert full.progress(full.goals[2]) == pytest.approx(top_progress)
+    close(full.store)
+    lazy = open_planner(lazy=True)
+    assert lazy.progress(lazy.goals[2]) == pytest.approx(top_progress)
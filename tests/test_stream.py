@@ -0,0 +1,69 @@
+"""The incremental state.json parser (model.stream_goals) against json.loads."""
+
+import io
+import json
+
+import pytest
+
+from benchmarks.treegen import make_tree
+from planner.codec import read_state
+from planner.model import Goal, dumps_goals, stream_goals, to_serializable
+
+NAMES = [
+    "plain",
+    "{", "}", "[", "]", "{{[", "]]}}", "} ] , {",
+    '"', 'quote " inside', '\\', '\\"', 'ends with \\',
+    "tab\tnew\nline", "\u0000\u001f", "unicode \\u0041 text", "юникод ✓ 🎯",
+    '{"id": "fake", "subgoals": [', "",
+]
+
+
+def tree():
+    goals = []
+    for i, name in enumerate(NAMES):
+        sub = Goal(name + " sub", subgoals=[Goal(name, weight=0.5), Goal("x" * 40, weight=0.5)])
+        goals.append(Goal(name, id=f"g{i}", subgoals=[sub] if i % 2 else []))
+    return goals
+
+
+def parse(text, chunk_size):
+    return list(stream_goals(io.BytesIO(text.encode("utf-8")), chunk_size))
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7, 64, 1 << 20])
+@pytest.mark.parametrize("indent", [None, 2])
+def test_matches_json_loads(chunk_size, indent):
+    text = json.dumps(to_serializable(tree()), ensure_ascii=False, indent=indent)
+    assert to_serializable(parse(text, chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7])
+def test_escaped_ascii_output(chunk_size):
+    # \uXXXX escapes and surrogate pairs split between chunks
+    text = json.dumps(to_serializable(tree()), ensure_ascii=True)
+    assert to_serializable(parse(text, chunk_size)) == json.loads(text)
+
+
+@pytest.mark.parametrize("chunk_size", [1, 2, 7])
+@pytest.mark.parametrize("text", ["[]", "  [ ]  ", "{}", "", "null"])
+def test_empty_and_not_a_list(chunk_size, text):
+    assert parse(text, chunk_size) == []
+
+
+@pytest.mark.parametrize("chunk_size", [1, 7])
+def test_broken_file_keeps_the_goals_before_it(chunk_size):
+    text = dumps_goals(tree()[:3])
+    broken = text[:-1] + ', {"name": "cut'
+    it = stream_goals(io.BytesIO(broken.encode("utf-8")), chunk_size)
+    got = []
+    with pytest.raises(ValueError):
+        for goal in it:
+            got.append(goal)
+    assert [g.name for g in got] == NAMES[:3]
+
+
+def test_read_state_of_a_large_file(tmp_path):
+    goals = make_tree(3000, seed=1)
+    path = tmp_path / "state.json"
+    path.write_text(dumps_goals(goals), encoding="utf-8")
+    assert dumps_goals(list(read_state(path, chunk_size=1000))) == dumps_goals(goals)
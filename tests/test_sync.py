@@ -0,0 +1,166 @@
+"""Delta sync between devices through the offline LocalBackend.
+
+Each device is a Planner with its own state file and sync meta; they
+share one LocalBackend file, like two devices on one account.
+"""
+
+import asyncio
+import itertools
+import os
+import random
+
+import pytest
+
+from planner.core import Planner
+from planner.store import SharedStore
+from planner.tree import iter_goals
+
+
+@pytest.fixture
+def devices(tmp_path, monkeypatch):
+    monkeypatch.setenv("SYNC_BACKEND", "local")
+    monkeypatch.setenv("SYNC_LOCAL_PATH", str(tmp_path / "cloud.json"))
+    made = []
+    names = itertools.count()
+
+    def device():
+        d = tmp_path / f"device_{next(names)}"
+        os.makedirs(d)
+        planner = Planner(SharedStore(d / "state.json", save_delay=3600), d, sync_mode="delta")
+        made.append(planner)
+        return planner
+
+    yield device
+    for planner in made:
+        planner.store.writer.close()
+
+
+def sync(planner):
+    out = asyncio.run(planner.sync_once({"cancelled": False}))
+    assert out["result"] is True, out
+    return out
+
+
+def shape(planner):
+    return sorted((g.id, p.id if p is not None else None, g.name, g.completed)
+                  for g, p in iter_goals(planner.goals))
+
+
+def names(planner):
+    return sorted(g.name for g, _ in iter_goals(planner.goals))
+
+
+def test_edits_reach_the_other_device(devices):
+    a, b = devices(), devices()
+    root = a.add_goal("root")
+    a.add_subgoal(root, "one")
+    sync(a)
+    sync(b)
+    assert shape(a) == shape(b)
+
+    leaf = b.index.get(root.subgoals[0].id)
+    b.set_completed(leaf, True)
+    sync(b)
+    sync(a)
+    assert a.progress(root) == 1.0
+    assert shape(a) == shape(b)
+
+
+def test_delete_keeps_a_subgoal_renamed_after_it(devices):
+    a, b = devices(), devices()
+    root = a.add_goal("root")
+    parent = a.add_subgoal(root, "parent")
+    renamed = a.add_subgoal(parent, "renamed")
+    a.add_subgoal(parent, "untouched")
+    sync(a)
+    sync(b)
+
+    a.delete(a.index.get(parent.id))
+    goal = b.index.get(renamed.id)
+    b.edit(goal, "renamed later", goal.deadline)
+    for planner in (a, b, a, b):
+        sync(planner)
+
+    # the newer subgoal survives the delete together with the parent holding it
+    assert names(a) == names(b) == ["parent", "renamed later", "root"]
+    assert shape(a) == shape(b)
+
+
+def test_revived_parent_comes_back_alike_on_both_sides(devices):
+    a, b = devices(), devices()
+    parent = a.add_goal("parent")
+    for name in ("x", "y"):
+        a.add_subgoal(parent, name)
+    sync(a)
+    sync(b)
+
+    a.delete(parent)
+    goal = b.index.get(parent.id)
+    b.edit(goal, "parent edited later", goal.deadline)
+    # the edit reaches the deleting side first
+    for planner in (b, a, b, a):
+        sync(planner)
+
+    # as merge_trees: the edited goal stays, its untouched subgoals follow the delete
+    assert names(a) == names(b) == ["parent edited later"]
+    assert shape(a) == shape(b)
+
+
+def test_delete_wins_over_an_older_edit(devices):
+    a, b = devices(), devices()
+    parent = a.add_goal("parent")
+    child = a.add_subgoal(parent, "child")
+    sync(a)
+    sync(b)
+
+    goal = b.index.get(child.id)
+    b.edit(goal, "edited before the delete", goal.deadline)
+    a.delete(parent)
+    for planner in (b, a, b, a):
+        sync(planner)
+
+    assert a.goals == [] and b.goals == []
+
+
+def test_subgoal_added_elsewhere_goes_with_its_deleted_parent(devices):
+    a, b = devices(), devices()
+    parent = a.add_goal("parent")
+    sync(a)
+    sync(b)
+
+    b.add_subgoal(b.index.get(parent.id), "added on b")
+    sync(b)
+    # a deletes without having seen the new subgoal
+    a.delete(parent)
+    for planner in (a, b, a, b):
+        sync(planner)
+
+    assert a.goals == [] and b.goals == []
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_random_edits_and_deletes_converge(devices, seed):
+    rnd = random.Random(seed)
+    planners = [devices(), devices()]
+    for i in range(60):
+        planner = rnd.choice(planners)
+        goals = [g for g, _ in iter_goals(planner.goals)]
+        op = rnd.random()
+        if op < 0.15 or not goals:
+            planner.add_goal(f"g{i}")
+        elif op < 0.4:
+            planner.add_subgoal(rnd.choice(goals), f"n{i}")
+        elif op < 0.55:
+            goal = rnd.choice(goals)
+            planner.set_completed(goal, not goal.completed)
+        elif op < 0.7:
+            goal = rnd.choice(goals)
+            planner.edit(goal, f"r{i}", goal.deadline)
+        elif op < 0.8:
+            planner.delete(rnd.choice(goals))
+        else:
+            sync(planner)
+    for _ in range(3):
+        for planner in planners:
+            sync(planner)
+    assert shape(planners[0]) == shape(planners[1])
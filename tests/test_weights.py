@@ -0,0 +1,107 @@
+"""Sibling weights and progress of the Planner against the old main.py rules.
+
+Random sequences of adds (with and without a weight), weight edits,
+toggles and deletes are applied both to plain dicts with the old rules
+(normalize every sibling, re-sum on every cap, recursive progress) and to
+a Planner (planner/core.py); every goal's progress and effective weight
+must agree. The old rules live in benchmarks/legacy_weights.py, with
+the one intended difference (deletes under auto-weighted parents).
+"""
+
+import random
+
+import pytest
+
+from benchmarks.legacy_weights import (
+    iter_dicts, legacy_add, legacy_adjust, legacy_delete, legacy_progress, new_planner,
+)
+from planner.index import GoalIndex
+from planner.progress import ProgressEngine
+
+
+def check(seed, steps, workdir):
+    rnd = random.Random(seed)
+    root_d = {"completed": False, "weight": None, "manual_weights": False, "subgoals": []}
+    model = new_planner(workdir)
+    root = model.add_goal("root")
+    pairs = [(root_d, root, None, None)]  # (dict, goal, parent dict, parent goal)
+    try:
+        for _ in range(steps):
+            op = rnd.random()
+            if op < 0.45 or len(pairs) == 1:
+                # parents with many children exercise the 0.01 floor as well
+                pd, pg, _, _ = rnd.choice(pairs[: max(1, len(pairs) // 4)])
+                w = round(rnd.uniform(0.0, 0.7), 2) if rnd.random() < 0.25 else None
+                pairs.append((legacy_add(pd, w), model.add_subgoal(pg, "x", weight=w), pd, pg))
+            elif op < 0.6:
+                d, g, pd, pg = rnd.choice(pairs[1:])
+                w = round(rnd.uniform(0.0, 1.0), 2)
+                legacy_adjust(pd, d, w)
+                model.edit(g, g.name, g.deadline, w)
+            elif op < 0.9:
+                leaves = [(d, g) for d, g, _, _ in pairs if not d["subgoals"]]
+                d, g = rnd.choice(leaves)
+                d["completed"] = not d["completed"]
+                model.set_completed(g, not g.completed)
+            else:
+                d, g, pd, pg = rnd.choice(pairs[1:])
+                legacy_delete(pd, d)
+                model.delete(g)
+                gone = {id(x) for x in iter_dicts(d)}
+                pairs = [p for p in pairs if id(p[0]) not in gone]
+
+            for d, g, pd, pg in pairs:
+                assert abs(legacy_progress(d) - model.progress(g)) < 1e-9
+                if pd is not None:
+                    assert abs(float(d["weight"] or 0.0) - model.weight(g)) < 1e-9
+        # a fresh engine over the final tree agrees with the incremental one
+        fresh = ProgressEngine(GoalIndex([root]), [root])
+        for _, g, _, _ in pairs:
+            assert abs(fresh.progress(g) - model.progress(g)) < 1e-9
+    finally:
+        model.store.writer.close()
+
+
+@pytest.mark.parametrize("seed", range(200))
+def test_random_sequences_match_old_rules(seed, tmp_path):
+    check(seed, 150, str(tmp_path))
+
+
+def test_delete_under_auto_parent_gives_equal_shares(tmp_path):
+    model = new_planner(str(tmp_path))
+    try:
+        root = model.add_goal("root")
+        subs = [model.add_subgoal(root, f"s{i}") for i in range(4)]
+        model.set_completed(subs[0], True)
+        model.set_completed(subs[1], True)
+        assert model.progress(root) == pytest.approx(0.5)
+
+        model.delete(subs[3])
+        # 1/3 each, not the stale 1/4 of the old code (which gave 0.5 here)
+        for s in subs[:3]:
+            assert model.weight(s) == pytest.approx(1 / 3)
+        assert model.progress(root) == pytest.approx(2 / 3)
+
+        model.delete(subs[0])
+        assert [model.weight(s) for s in subs[1:3]] == pytest.approx([0.5, 0.5])
+        assert model.progress(root) == pytest.approx(0.5)
+        assert not root.manual_weights
+    finally:
+        model.store.writer.close()
+
+
+def test_delete_under_manual_parent_keeps_weights(tmp_path):
+    model = new_planner(str(tmp_path))
+    try:
+        root = model.add_goal("root")
+        a = model.add_subgoal(root, "a", weight=0.5)
+        b = model.add_subgoal(root, "b", weight=0.3)
+        c = model.add_subgoal(root, "c")
+        model.set_completed(b, True)
+        model.delete(a)
+        assert root.manual_weights
+        assert model.weight(b) == pytest.approx(0.3)
+        assert model.weight(c) == pytest.approx(0.2)
+        assert model.progress(root) == pytest.approx(0.3)
+    finally:
+        model.store.writer.close()